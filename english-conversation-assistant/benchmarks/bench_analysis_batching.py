@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Benchmark: análises de mensagem individuais vs micro-batching com várias janelas
+
+Usuários simultâneos pedem análises (caminho assíncrono de generate_response)
+contra o servidor local benchmarks/mock_llm.py. Para cada janela o relatório
+mostra latência p50/p95 por análise, chamadas ao modelo, tamanho médio do lote,
+tokens cobrados por análise e tokens por segundo. Janela 'off' é o caminho sem
+lotes. O cache de análises fica desligado para que todo pedido chame o modelo.
+
+Uso:
+    python benchmarks/bench_analysis_batching.py --requests 200 --concurrency 32 --windows off,5,20,50
+"""
+
+import os
+import sys
+import time
+import argparse
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('OPENAI_API_KEY', 'benchmark')
+os.environ['LLM_CACHE_ENABLED'] = 'false'
+
+from benchmarks.mock_llm import add_latency_arguments, server_from_args
+
+PROFILES = [{'english_level': level} for level in ('beginner', 'intermediate', 'advanced')]
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+def run_window(window, requests: int, concurrency: int) -> dict:
+    from src.services.ai_service import AIConversationService
+    from src.services.analysis_batcher import BatchMetrics
+    from src.services.async_runtime import run_async
+    from src.services.prompt_builder import TokenUsageMetrics
+    import src.services.llm_gateway as gateway_module
+    import src.services.analysis_batcher as batcher_module
+
+    # Contadores próprios por janela
+    usage = TokenUsageMetrics()
+    gateway_module.token_usage = usage
+    batcher_module.batch_metrics = BatchMetrics()
+
+    service = AIConversationService(
+        analysis_batching=window is not None,
+        batch_window_ms=window
+    )
+
+    def analyze(i):
+        start = time.perf_counter()
+        run_async(service._analyze_user_message(
+            f'Last weekend I goed hiking with my friends near the mountain, number {i}.',
+            PROFILES[i % len(PROFILES)]
+        ))
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(analyze, range(requests)))
+    elapsed = time.perf_counter() - start
+
+    by_method = usage.snapshot()['by_method']
+    calls = sum(stats['calls'] for stats in by_method.values())
+    prompt_tokens = sum(stats['prompt_tokens'] for stats in by_method.values())
+    completion_tokens = sum(stats['completion_tokens'] for stats in by_method.values())
+    batches = batcher_module.batch_metrics.snapshot().get('message_analysis', {})
+
+    return {
+        'window': 'off' if window is None else f'{window:g} ms',
+        'p50': statistics.median(latencies) * 1000,
+        'p95': percentile(latencies, 95) * 1000,
+        'calls': calls,
+        'batch_size': batches.get('average_batch_size', 1.0),
+        'tokens_per_item': (prompt_tokens + completion_tokens) / requests,
+        'tokens_per_second': (prompt_tokens + completion_tokens) / elapsed,
+        'items_per_second': requests / elapsed
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--windows', default='off,5,20,50', help="janelas em ms separadas por vírgula ('off' = sem lotes)")
+    add_latency_arguments(parser)
+    args = parser.parse_args()
+
+    server = server_from_args(args).start()
+    os.environ['OPENAI_API_BASE'] = server.url
+
+    print(f"{args.requests} analyses, concurrency {args.concurrency}, "
+          f"ttft {args.ttft * 1000:.0f} ms, {args.per_token * 1000:.1f} ms/token\n")
+    print(f"{'window':>8} {'p50 ms':>8} {'p95 ms':>8} {'calls':>6} {'batch':>6} "
+          f"{'tok/item':>9} {'tok/s':>8} {'items/s':>8}")
+
+    for raw in args.windows.split(','):
+        window = None if raw.strip() == 'off' else float(raw)
+        r = run_window(window, args.requests, args.concurrency)
+        print(f"{r['window']:>8} {r['p50']:>8.0f} {r['p95']:>8.0f} {r['calls']:>6} {r['batch_size']:>6.1f} "
+              f"{r['tokens_per_item']:>9.0f} {r['tokens_per_second']:>8.0f} {r['items_per_second']:>8.1f}")
+
+    server.stop()
+
+if __name__ == '__main__':
+    main()
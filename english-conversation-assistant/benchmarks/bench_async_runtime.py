@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Benchmark: run_async antigo (um event loop por thread) vs runtime assíncrono compartilhado
+
+Simula N aprendizes concorrentes. Cada turno roda em uma thread nova, como faz o
+servidor WSGI com threads (werkzeug threaded=True), e dispara em paralelo duas
+chamadas simuladas ao modelo (resposta + análise).
+
+Uso:
+    python benchmarks/bench_async_runtime.py --learners 50 --turns 5 --latency 0.2
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+import threading
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.services.async_runtime import AsyncRuntime
+
+created_loops = {'legacy': 0}
+
+def legacy_run_async(coro):
+    """Implementação anterior copiada das rotas (cria um loop por thread e nunca o fecha)"""
+    try:
+        loop = asyncio.get_event_loop()
+    except RuntimeError:
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        created_loops['legacy'] += 1
+
+    return loop.run_until_complete(coro)
+
+async def simulated_turn(latency: float):
+    """Resposta e análise disparadas em paralelo, como em generate_response"""
+    async def llm_call():
+        await asyncio.sleep(latency)
+        return 'ok'
+
+    return await asyncio.gather(llm_call(), llm_call())
+
+def count_open_fds() -> int:
+    try:
+        return len(os.listdir('/proc/self/fd'))
+    except OSError:
+        return -1
+
+def run_scenario(name: str, runner, learners: int, turns: int, latency: float,
+                 loops_created) -> dict:
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    fds_before = count_open_fds()
+
+    def handle_request():
+        start = time.perf_counter()
+        try:
+            runner(simulated_turn(latency))
+            with lock:
+                latencies.append(time.perf_counter() - start)
+        except Exception as e:
+            with lock:
+                errors.append(str(e))
+
+    def learner():
+        for _ in range(turns):
+            # Uma thread por requisição, como o servidor de desenvolvimento com threads
+            request_thread = threading.Thread(target=handle_request)
+            request_thread.start()
+            request_thread.join()
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=learner) for _ in range(learners)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    peak_fds = count_open_fds()
+
+    ordered = sorted(latencies)
+    return {
+        'name': name,
+        'requests': len(latencies),
+        'errors': len(errors),
+        'elapsed': elapsed,
+        'rps': len(latencies) / elapsed if elapsed else 0,
+        'p50': statistics.median(ordered) if ordered else 0,
+        'p95': ordered[int(len(ordered) * 0.95) - 1] if ordered else 0,
+        'loops': loops_created(),
+        'extra_fds': peak_fds - fds_before
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--learners', type=int, default=50)
+    parser.add_argument('--turns', type=int, default=5)
+    parser.add_argument('--latency', type=float, default=0.2, help='latência simulada de cada chamada (s)')
+    args = parser.parse_args()
+
+    runtime = AsyncRuntime(name='bench-runtime')
+    runtime.start()
+
+    results = [
+        run_scenario('legacy run_async', legacy_run_async, args.learners, args.turns, args.latency,
+                     lambda: created_loops['legacy']),
+        run_scenario('shared runtime', runtime.run, args.learners, args.turns, args.latency,
+                     lambda: 1)
+    ]
+    runtime.shutdown()
+
+    print(f"{args.learners} learners x {args.turns} turns, simulated LLM latency {args.latency}s\n")
+    print(f"{'mode':<18} {'reqs':>6} {'errors':>7} {'rps':>8} {'p50 (ms)':>9} {'p95 (ms)':>9} {'loops':>6} {'extra fds':>10}")
+    for r in results:
+        print(f"{r['name']:<18} {r['requests']:>6} {r['errors']:>7} {r['rps']:>8.1f} "
+              f"{r['p50'] * 1000:>9.1f} {r['p95'] * 1000:>9.1f} {r['loops']:>6} {r['extra_fds']:>10}")
+
+if __name__ == '__main__':
+    main()
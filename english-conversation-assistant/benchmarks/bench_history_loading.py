@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Benchmark: carregamento do histórico da conversa em send_message
+
+Compara, para conversas de 10, 1.000 e 10.000 mensagens:
+  - legacy: carrega todas as mensagens e chama to_dict() (três json.loads cada)
+  - limit:  consulta com LIMIT projetando apenas sender/content
+  - buffer: turnos seguintes servidos pelo buffer circular em memória
+            (inclui a consulta dos ids das últimas mensagens que valida o buffer)
+
+Uso:
+    python benchmarks/bench_history_loading.py --sizes 10 1000 10000 --repeat 50
+"""
+
+import os
+import sys
+import json
+import time
+import tempfile
+import argparse
+import statistics
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('OPENAI_API_KEY', 'benchmark')
+
+from flask import Flask
+from src.models.user import db, User, Conversation, Message
+from src.routes.conversation import load_conversation_history
+from src.services.history_cache import history_cache
+
+def legacy_load_history(conversation_id: int) -> list:
+    """Implementação anterior: todas as mensagens, convertidas com to_dict()"""
+    messages = Message.query.filter_by(
+        conversation_id=conversation_id
+    ).order_by(Message.timestamp).all()
+
+    return [msg.to_dict() for msg in messages]
+
+def populate(user_id: int, size: int) -> int:
+    conversation = Conversation(user_id=user_id, title=f'{size} messages')
+    db.session.add(conversation)
+    db.session.flush()
+
+    start = datetime.utcnow() - timedelta(seconds=size)
+    analysis = {
+        'grammar_errors': json.dumps([{'error': 'goed', 'correction': 'went', 'explanation': 'irregular verb'}]),
+        'vocabulary_used': json.dumps([{'word': f'word{i}', 'level': 'basic', 'usage': 'correct'} for i in range(8)])
+    }
+
+    db.session.bulk_insert_mappings(Message, [
+        {
+            'conversation_id': conversation.id,
+            'sender': 'user' if i % 2 == 0 else 'assistant',
+            'content': f'Message number {i}, talking about travel and technology plans for the weekend.',
+            'timestamp': start + timedelta(seconds=i),
+            **(analysis if i % 2 == 0 else {})
+        }
+        for i in range(size)
+    ])
+    db.session.commit()
+    return conversation.id
+
+def measure(func, conversation_id: int, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(conversation_id)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 1000, 10000])
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    db_file = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+    db_file.close()
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_file.name}'
+    db.init_app(app)
+
+    def uncached_load(conversation_id):
+        history_cache.invalidate(conversation_id)
+        return load_conversation_history(conversation_id)
+
+    print(f"median of {args.repeat} loads per turn (ms)\n")
+    print(f"{'messages':>9} {'legacy':>10} {'limit':>10} {'buffer':>10}")
+
+    with app.app_context():
+        db.create_all()
+        user = User(username='bench', email='bench@example.com')
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+
+        for size in args.sizes:
+            conversation_id = populate(user_id, size)
+
+            legacy_ms = measure(legacy_load_history, conversation_id, args.repeat)
+            limit_ms = measure(uncached_load, conversation_id, args.repeat)
+            load_conversation_history(conversation_id)
+            buffer_ms = measure(load_conversation_history, conversation_id, args.repeat)
+
+            db.session.expunge_all()
+            print(f"{size:>9} {legacy_ms:>10.3f} {limit_ms:>10.3f} {buffer_ms:>10.4f}")
+
+    os.unlink(db_file.name)
+
+if __name__ == '__main__':
+    main()
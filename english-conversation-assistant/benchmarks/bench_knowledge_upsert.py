@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: update_knowledge_items antigo (uma consulta por palavra/tópico)
+vs consulta em lote + upsert com ON CONFLICT
+
+Mede o número de comandos SQL e a latência por mensagem em um banco SQLite
+temporário, com análises de ~15 palavras e ~3 tópicos por mensagem.
+
+Uso:
+    python benchmarks/bench_knowledge_upsert.py --messages 500
+"""
+
+import os
+import sys
+import time
+import random
+import tempfile
+import argparse
+import statistics
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('OPENAI_API_KEY', 'benchmark')
+
+from flask import Flask
+from sqlalchemy import event
+from src.models.user import db, User, KnowledgeItem
+from src.routes.conversation import update_knowledge_items
+
+VOCABULARY = [f'word{i}' for i in range(300)]
+TOPICS = [f'topic{i}' for i in range(30)]
+
+def legacy_update_knowledge_items(user_id: int, analysis: dict):
+    """Implementação anterior (N+1 consultas), copiada de src/routes/conversation.py"""
+    for vocab_item in analysis.get('vocabulary_used', []):
+        word = vocab_item.get('word', '').lower()
+        if not word:
+            continue
+
+        existing_item = KnowledgeItem.query.filter_by(user_id=user_id, content=word, item_type='word').first()
+
+        if existing_item:
+            existing_item.times_encountered += 1
+            if vocab_item.get('usage') == 'correct':
+                existing_item.times_used_correctly += 1
+            accuracy = existing_item.times_used_correctly / existing_item.times_encountered
+            existing_item.mastery_level = min(accuracy * 1.2, 1.0)
+            existing_item.last_encountered = datetime.utcnow()
+        else:
+            mastery_level = 0.8 if vocab_item.get('usage') == 'correct' else 0.3
+            db.session.add(KnowledgeItem(
+                user_id=user_id,
+                item_type='word',
+                content=word,
+                mastery_level=mastery_level,
+                times_used_correctly=1 if vocab_item.get('usage') == 'correct' else 0,
+                difficulty_level=vocab_item.get('level', 'basic'),
+                topic_category='vocabulary'
+            ))
+
+    for topic in analysis.get('topics_mentioned', []):
+        if not topic:
+            continue
+
+        existing_topic = KnowledgeItem.query.filter_by(user_id=user_id, content=topic.lower(), item_type='topic').first()
+
+        if existing_topic:
+            existing_topic.times_encountered += 1
+            existing_topic.mastery_level = min(existing_topic.mastery_level + 0.1, 1.0)
+            existing_topic.last_encountered = datetime.utcnow()
+        else:
+            db.session.add(KnowledgeItem(
+                user_id=user_id,
+                item_type='topic',
+                content=topic.lower(),
+                mastery_level=0.5,
+                topic_category='conversation_topics'
+            ))
+
+def make_analyses(count: int, seed: int = 42) -> list:
+    rng = random.Random(seed)
+    return [
+        {
+            'vocabulary_used': [
+                {'word': word, 'level': 'basic', 'usage': rng.choice(['correct', 'correct', 'incorrect'])}
+                for word in rng.sample(VOCABULARY, 15)
+            ],
+            'topics_mentioned': rng.sample(TOPICS, 3)
+        }
+        for _ in range(count)
+    ]
+
+def run(name: str, update_func, analyses: list) -> dict:
+    db_file = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+    db_file.close()
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_file.name}'
+    db.init_app(app)
+
+    with app.app_context():
+        db.create_all()
+        user = User(username='bench', email='bench@example.com')
+        db.session.add(user)
+        db.session.commit()
+
+        statements = {'count': 0}
+
+        @event.listens_for(db.engine, 'before_cursor_execute')
+        def count_statement(conn, cursor, statement, parameters, context, executemany):
+            statements['count'] += 1
+
+        latencies = []
+        for analysis in analyses:
+            start = time.perf_counter()
+            update_func(user.id, analysis)
+            db.session.commit()
+            latencies.append(time.perf_counter() - start)
+
+        total_items = KnowledgeItem.query.count()
+
+    os.unlink(db_file.name)
+
+    return {
+        'name': name,
+        'statements_per_message': statements['count'] / len(analyses),
+        'mean_ms': statistics.mean(latencies) * 1000,
+        'p95_ms': sorted(latencies)[int(len(latencies) * 0.95) - 1] * 1000,
+        'items': total_items
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=500)
+    args = parser.parse_args()
+
+    analyses = make_analyses(args.messages)
+    results = [
+        run('legacy (N+1)', legacy_update_knowledge_items, analyses),
+        run('batched upsert', update_knowledge_items, analyses)
+    ]
+
+    print(f"{args.messages} messages, 15 words + 3 topics each\n")
+    print(f"{'mode':<16} {'stmts/msg':>10} {'mean (ms)':>10} {'p95 (ms)':>9} {'items':>6}")
+    for r in results:
+        print(f"{r['name']:<16} {r['statements_per_message']:>10.1f} {r['mean_ms']:>10.2f} "
+              f"{r['p95_ms']:>9.2f} {r['items']:>6}")
+
+if __name__ == '__main__':
+    main()
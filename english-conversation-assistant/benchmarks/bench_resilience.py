@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Benchmark: chamadas ao modelo durante um brownout do upstream
+
+Duas bases do mock (benchmarks/mock_llm.py): a primária entra em brownout
+(atraso maior que o prazo das chamadas) depois de --healthy segundos e volta ao
+normal depois de --brownout segundos. Cada configuração roda a mesma carga com
+um LLMGateway próprio:
+
+- baseline: uma base, sem circuit breaker, sem hedge (comportamento anterior)
+- breaker: uma base com circuit breaker (falha rápido para a análise padrão)
+- failover: duas bases com circuit breaker e hedge após o p95
+
+Cada usuário simulado faz uma chamada, espera --think segundos e repete. O
+relatório mostra latência p50/p95/máxima, chamadas que caíram na análise
+padrão (erro) e os contadores do gateway.
+
+Uso:
+    python benchmarks/bench_resilience.py --duration 20 --concurrency 8 --timeout 3
+"""
+
+import os
+import sys
+import time
+import argparse
+import threading
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('OPENAI_API_KEY', 'benchmark')
+
+from benchmarks.mock_llm import MockLLMServer
+
+MESSAGES = [{'role': 'user', 'content': 'Analyze this English message from a learner: "I goed to the park."'}]
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+def run_config(name: str, args, bases: int, breaker: bool, hedge: bool) -> dict:
+    from src.services.llm_gateway import LLMGateway
+
+    servers = [MockLLMServer(ttft=args.ttft, per_token=args.per_token, distribution='lognormal',
+                             jitter=0.3, seed=i).start() for i in range(bases)]
+    os.environ['OPENAI_API_BASE'] = ','.join(server.url for server in servers)
+    os.environ['LLM_BREAKER_FAILURES'] = '5' if breaker else '1000000'
+    os.environ['LLM_BREAKER_RESET'] = str(args.breaker_reset)
+    os.environ['LLM_HEDGE_METHODS'] = 'message_analysis' if hedge else ''
+    gateway = LLMGateway(request_timeout=args.timeout, max_retries=2, record_path='')
+
+    def brownout():
+        time.sleep(args.healthy)
+        servers[0].stall = args.timeout * 3
+        time.sleep(args.brownout)
+        servers[0].stall = 0.0
+
+    latencies, failures = [], 0
+    lock = threading.Lock()
+    stop_at = time.monotonic() + args.duration
+
+    def worker(_):
+        nonlocal failures
+        while time.monotonic() < stop_at:
+            started = time.perf_counter()
+            try:
+                gateway.create_completion('message_analysis', messages=MESSAGES, max_tokens=200)
+                failed = 0
+            except Exception:
+                failed = 1
+            with lock:
+                latencies.append(time.perf_counter() - started)
+                failures += failed
+            time.sleep(args.think)
+
+    threading.Thread(target=brownout, daemon=True).start()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(worker, range(args.concurrency)))
+
+    stats = gateway.snapshot()['by_method'].get('message_analysis', {})
+    for server in servers:
+        server.stop()
+
+    return {
+        'name': name,
+        'calls': len(latencies),
+        'failed': failures,
+        'p50': statistics.median(latencies) * 1000,
+        'p95': percentile(latencies, 95) * 1000,
+        'max': max(latencies) * 1000,
+        'retries': stats.get('retries', 0),
+        'rejected': stats.get('circuit_rejections', 0),
+        'failovers': stats.get('failovers', 0),
+        'hedges': f"{stats.get('hedge_wins', 0)}/{stats.get('hedges', 0)}"
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--duration', type=float, default=20.0)
+    parser.add_argument('--healthy', type=float, default=4.0, help='segundos antes do brownout')
+    parser.add_argument('--brownout', type=float, default=10.0, help='duração do brownout')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--timeout', type=float, default=3.0, help='prazo de cada chamada')
+    parser.add_argument('--think', type=float, default=0.1, help='pausa de cada usuário entre chamadas')
+    parser.add_argument('--breaker-reset', type=float, default=2.0)
+    parser.add_argument('--ttft', type=float, default=0.2)
+    parser.add_argument('--per-token', type=float, default=0.002)
+    args = parser.parse_args()
+
+    print(f"{args.duration:g}s, concurrency {args.concurrency}, deadline {args.timeout:g}s, "
+          f"brownout {args.healthy:g}s-{args.healthy + args.brownout:g}s\n")
+    print(f"{'config':>9} {'calls':>6} {'failed':>7} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8} "
+          f"{'retries':>8} {'rejected':>9} {'failover':>9} {'hedges':>8}")
+
+    for name, bases, breaker, hedge in (('baseline', 1, False, False), ('breaker', 1, True, False),
+                                        ('failover', 2, True, True)):
+        r = run_config(name, args, bases, breaker, hedge)
+        print(f"{r['name']:>9} {r['calls']:>6} {r['failed']:>7} {r['p50']:>8.0f} {r['p95']:>8.0f} {r['max']:>8.0f} "
+              f"{r['retries']:>8} {r['rejected']:>9} {r['failovers']:>9} {r['hedges']:>8}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Benchmark: resposta e análise em duas chamadas ('separate') vs uma chamada ('combined')
+
+Roda turnos de conversa contra o servidor local benchmarks/mock_llm.py e compara
+latência por turno e tokens cobrados (uso informado pelo servidor). O cache de
+análises fica desligado para que todo turno chame o modelo.
+
+Uso:
+    python benchmarks/bench_response_mode.py --turns 30 --concurrency 4 --ttft 0.2 --per-token 0.01
+"""
+
+import os
+import sys
+import time
+import argparse
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('OPENAI_API_KEY', 'benchmark')
+os.environ['LLM_CACHE_ENABLED'] = 'false'
+
+from benchmarks.mock_llm import MockLLMServer
+
+PROFILE = {
+    'english_level': 'intermediate',
+    'interests': ['travel', 'technology', 'music'],
+    'goals': ['speak more fluently at work'],
+    'learning_style': {'corrections': 'gentle', 'pace': 'relaxed'}
+}
+
+HISTORY = [
+    {'sender': 'user' if i % 2 == 0 else 'assistant',
+     'content': f'Turn {i}: we talked about weekend plans, favourite places to visit and new gadgets.'}
+    for i in range(10)
+]
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+def run_mode(mode: str, turns: int, concurrency: int) -> dict:
+    from src.services.ai_service import AIConversationService
+    from src.services.async_runtime import run_async
+    from src.services.prompt_builder import TokenUsageMetrics
+    import src.services.llm_gateway as gateway_module
+
+    # Contadores próprios por modo
+    usage = TokenUsageMetrics()
+    gateway_module.token_usage = usage
+
+    service = AIConversationService(response_mode=mode)
+
+    def turn(i):
+        start = time.perf_counter()
+        run_async(service.generate_response(
+            f'Last weekend I goed hiking with my friends near the mountain, number {i}.',
+            HISTORY, PROFILE
+        ))
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(turn, range(turns)))
+
+    by_method = usage.snapshot()['by_method']
+    calls = sum(stats['calls'] for stats in by_method.values())
+    prompt_tokens = sum(stats['prompt_tokens'] for stats in by_method.values())
+    completion_tokens = sum(stats['completion_tokens'] for stats in by_method.values())
+
+    return {
+        'mode': mode,
+        'p50': statistics.median(latencies) * 1000,
+        'p95': percentile(latencies, 95) * 1000,
+        'calls': calls / turns,
+        'prompt': prompt_tokens / turns,
+        'completion': completion_tokens / turns
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--turns', type=int, default=30)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--ttft', type=float, default=0.2)
+    parser.add_argument('--per-token', type=float, default=0.01)
+    args = parser.parse_args()
+
+    server = MockLLMServer(ttft=args.ttft, per_token=args.per_token).start()
+    os.environ['OPENAI_API_BASE'] = server.url
+
+    print(f"{args.turns} turns, concurrency {args.concurrency}, "
+          f"ttft {args.ttft * 1000:.0f} ms, {args.per_token * 1000:.0f} ms/token\n")
+    print(f"{'mode':>9} {'p50 ms':>8} {'p95 ms':>8} {'calls':>6} {'prompt tok':>11} {'compl tok':>10} {'total tok':>10}")
+
+    for mode in ('separate', 'combined'):
+        r = run_mode(mode, args.turns, args.concurrency)
+        print(f"{r['mode']:>9} {r['p50']:>8.0f} {r['p95']:>8.0f} {r['calls']:>6.1f} "
+              f"{r['prompt']:>11.0f} {r['completion']:>10.0f} {r['prompt'] + r['completion']:>10.0f}")
+
+    server.stop()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Benchmark: vazão da API com cada servidor de produção contra o mock da OpenAI
+
+Para cada configuração o servidor sobe em um processo próprio com um banco
+SQLite temporário, recebe o fluxo de benchmarks/load_test.py e é desligado
+com SIGTERM (desligamento gracioso). Configurações sem o pacote instalado
+(gunicorn, uvicorn/a2wsgi) são puladas.
+
+- flask-dev: python src/main.py (servidor de desenvolvimento, threaded)
+- gunicorn-1x16 / gunicorn-2x16: gunicorn.conf.py com 1 ou 2 processos gthread de 16 threads
+- uvicorn: src/asgi.py com 1 processo e 16 threads para as rotas
+
+Uso:
+    python benchmarks/bench_servers.py --users 16 --flows 2 --messages 3
+    python benchmarks/bench_servers.py --only gunicorn-2x16,uvicorn --ttft 0.5
+"""
+
+import os
+import sys
+import time
+import signal
+import socket
+import argparse
+import tempfile
+import subprocess
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault('OPENAI_API_KEY', 'benchmark')
+
+import httpx
+from benchmarks.load_test import STEPS, Results, percentile, run_flow
+from benchmarks.mock_llm import add_latency_arguments, server_from_args
+
+SERVERS = {
+    'flask-dev': ((), [sys.executable, 'src/main.py'], {}),
+    'gunicorn-1x16': (('gunicorn',), [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py'],
+                      {'WEB_CONCURRENCY': '1', 'GUNICORN_THREADS': '16'}),
+    'gunicorn-2x16': (('gunicorn',), [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py'],
+                      {'WEB_CONCURRENCY': '2', 'GUNICORN_THREADS': '16'}),
+    'uvicorn': (('uvicorn', 'a2wsgi'), [sys.executable, '-m', 'uvicorn', 'src.asgi:app', '--log-level', 'warning'],
+                {'ASGI_THREADS': '16'})
+}
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def wait_healthy(url: str, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f'{url}/api/health', timeout=1.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f'server at {url} did not become healthy')
+
+def run_server(name: str, llm_url: str, args) -> dict:
+    _, command, extra_env = SERVERS[name]
+    port = free_port()
+    db_file = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+    db_file.close()
+
+    env = dict(os.environ, DATABASE_URL=f'sqlite:///{db_file.name}', OPENAI_API_BASE=llm_url,
+               HOST='127.0.0.1', PORT=str(port), **extra_env)
+    if name == 'uvicorn':
+        command = command + ['--host', '127.0.0.1', '--port', str(port)]
+
+    # Esquema criado antes de subir o servidor, como na implantação
+    subprocess.run([sys.executable, 'migrate.py'], cwd=ROOT, env=env, capture_output=True, check=True)
+
+    process = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f'http://127.0.0.1:{port}'
+    try:
+        wait_healthy(url)
+
+        results = Results()
+        jobs = [(user, flow) for flow in range(args.flows) for user in range(args.users)]
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.users) as pool:
+            for future in [pool.submit(run_flow, url, user, flow, args, results) for user, flow in jobs]:
+                future.result()
+        elapsed = time.perf_counter() - start
+
+        stopping = time.perf_counter()
+        process.send_signal(signal.SIGTERM)
+        process.wait(timeout=60)
+        shutdown = time.perf_counter() - stopping
+    finally:
+        if process.poll() is None:
+            process.kill()
+        os.unlink(db_file.name)
+
+    latencies = [value for step in STEPS for value in results.latencies.get(step, [])]
+    return {
+        'name': name,
+        'requests': len(latencies),
+        'errors': sum(results.errors.values()),
+        'rps': len(latencies) / elapsed,
+        'p50': percentile(latencies, 50) * 1000,
+        'p95': percentile(latencies, 95) * 1000,
+        'message_p95': percentile(results.latencies['send_message'], 95) * 1000,
+        'shutdown': shutdown
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=16)
+    parser.add_argument('--flows', type=int, default=2)
+    parser.add_argument('--messages', type=int, default=3)
+    parser.add_argument('--only', default='', help='configurações a rodar, separadas por vírgula')
+    parser.add_argument('--timeout', type=float, default=120.0)
+    add_latency_arguments(parser)
+    args = parser.parse_args()
+    args.stream = False
+
+    llm_server = server_from_args(args).start()
+    names = args.only.split(',') if args.only else list(SERVERS)
+
+    print(f"{args.users} users x {args.flows} flows x {args.messages} messages, "
+          f"ttft {args.ttft * 1000:.0f} ms, {args.per_token * 1000:.1f} ms/token, {os.cpu_count()} CPU(s)\n")
+    print(f"{'server':<14} {'requests':>8} {'errors':>7} {'req/s':>7} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'msg p95':>8} {'stop s':>7}")
+
+    for name in names:
+        missing = [package for package in SERVERS[name][0] if importlib.util.find_spec(package) is None]
+        if missing:
+            print(f"{name:<14} skipped ({', '.join(missing)} not installed)")
+            continue
+        r = run_server(name, llm_server.url, args)
+        print(f"{r['name']:<14} {r['requests']:>8} {r['errors']:>7} {r['rps']:>7.2f} {r['p50']:>8.0f} "
+              f"{r['p95']:>8.0f} {r['message_p95']:>8.0f} {r['shutdown']:>7.1f}")
+
+    llm_server.stop()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Benchmark: tempo de partida de um worker (importação, criação da aplicação, primeira resposta)
+
+Cada rodada é um processo Python novo que importa src.main, chama create_app()
+e responde a primeira requisição pelo test client: /api/health e depois uma
+rota que usa o serviço de IA (/api/metrics/llm-gateway não chama o modelo).
+Por fim llm_setup mede o que foi adiado para o primeiro uso do modelo (serviço de
+IA e cliente OpenAI). O relatório mostra a mediana e o máximo de cada fase, o
+tempo total do processo e quais módulos pesados (openai, httpx, pydantic,
+tiktoken) estavam carregados antes desse primeiro uso.
+
+O banco é uma cópia temporária já migrada (python migrate.py), como em um
+worker novo de uma implantação em andamento.
+
+Uso:
+    python benchmarks/bench_startup.py --runs 10
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ('openai', 'httpx', 'pydantic', 'tiktoken')
+
+CHILD = """
+import sys, time, json
+started = time.perf_counter()
+import src.main
+imported = time.perf_counter()
+app = src.main.create_app(start_background=False)
+created = time.perf_counter()
+client = app.test_client()
+assert client.get('/api/health').status_code == 200
+health = time.perf_counter()
+assert client.get('/api/metrics/llm-gateway').status_code == 200
+first_service = time.perf_counter()
+modules = [name for name in %r if name in sys.modules]
+from src.routes.conversation import get_ai_service
+from src.services.llm_gateway import llm_gateway
+get_ai_service() and llm_gateway.client
+llm_setup = time.perf_counter()
+print(json.dumps({
+    'import': imported - started,
+    'create_app': created - imported,
+    'first_request': health - created,
+    'first_service_request': first_service - health,
+    'llm_setup': llm_setup - first_service,
+    'modules': modules
+}))
+"""
+
+def run_once(env: dict) -> dict:
+    started = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, '-c', CHILD % (HEAVY_MODULES,)], cwd=ROOT, env=env,
+        capture_output=True, text=True, check=True
+    ).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    result['process'] = time.perf_counter() - started
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=10)
+    args = parser.parse_args()
+
+    db_file = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+    db_file.close()
+    env = dict(os.environ, DATABASE_URL=f'sqlite:///{db_file.name}', OPENAI_API_KEY='benchmark')
+
+    try:
+        subprocess.run([sys.executable, 'migrate.py'], cwd=ROOT, env=env, capture_output=True, check=True)
+        runs = [run_once(env) for _ in range(args.runs)]
+    finally:
+        os.unlink(db_file.name)
+
+    print(f"{args.runs} cold starts\n")
+    print(f"{'phase':<24} {'median ms':>10} {'max ms':>8}")
+    for phase in ('import', 'create_app', 'first_request', 'first_service_request', 'llm_setup', 'process'):
+        values = [run[phase] for run in runs]
+        print(f"{phase:<24} {statistics.median(values) * 1000:>10.0f} {max(values) * 1000:>8.0f}")
+    print(f"\nheavy modules loaded before the first model use: {', '.join(runs[-1]['modules']) or 'none'}")
+
+if __name__ == '__main__':
+    main()
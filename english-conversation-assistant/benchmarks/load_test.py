@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Teste de carga ponta a ponta da API com o servidor mock da OpenAI
+
+Cada usuário virtual repete o fluxo:
+    cria usuário → inicia conversa → N× envia mensagem → insights → speech-feedback
+e o relatório mostra latência p50/p95/p99 por etapa e requisições por segundo.
+
+Por padrão o mock (benchmarks/mock_llm.py) e a aplicação sobem neste processo, com
+um banco SQLite temporário. Com --url o teste usa uma aplicação já em execução,
+que deve ter OPENAI_API_BASE apontando para um mock iniciado à parte.
+
+Uso:
+    python benchmarks/load_test.py --users 20 --flows 2 --messages 5
+    python benchmarks/load_test.py --users 20 --ttft 0.3 --distribution lognormal --jitter 0.5 --stream
+    python benchmarks/load_test.py --url http://127.0.0.1:5001 --users 50
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('OPENAI_API_KEY', 'benchmark')
+
+import httpx
+from benchmarks.mock_llm import add_latency_arguments, server_from_args
+
+STEPS = ('create_user', 'start_conversation', 'send_message', 'insights', 'speech_feedback')
+
+MESSAGES = [
+    "Last weekend I goed hiking with my friends near the mountain.",
+    "I want to travel to Portugal next year because I love the food.",
+    "Yesterday I have watched a very interesting movie about space.",
+    "My job is software developer and I work from home most days.",
+    "Do you think it is difficult to learn how to play the guitar?",
+]
+
+class Results:
+    """
+    Latências e erros por etapa do fluxo
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def record(self, step: str, seconds: float, ok: bool):
+        with self._lock:
+            self.latencies[step].append(seconds)
+            if not ok:
+                self.errors[step] += 1
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered))) - 1))]
+
+def call(client: httpx.Client, results: Results, step: str, method: str, path: str, **kwargs):
+    start = time.perf_counter()
+    try:
+        response = client.request(method, path, **kwargs)
+        ok = response.status_code < 400
+    except httpx.HTTPError:
+        response, ok = None, False
+    results.record(step, time.perf_counter() - start, ok)
+    return response if ok else None
+
+def run_flow(base_url: str, user_index: int, flow_index: int, args, results: Results):
+    """
+    Um fluxo completo de um usuário virtual
+    """
+    with httpx.Client(base_url=base_url, timeout=args.timeout) as client:
+        suffix = f"{user_index}-{flow_index}-{time.time_ns()}"
+        response = call(client, results, 'create_user', 'POST', '/api/users', json={
+            'username': f'load-{suffix}',
+            'email': f'load-{suffix}@example.com',
+            'english_level': 'intermediate',
+            'interests': ['travel', 'music', 'technology']
+        })
+        if response is None:
+            return
+        user_id = response.json()['id']
+
+        response = call(client, results, 'start_conversation', 'POST', f'/api/users/{user_id}/conversations')
+        if response is None:
+            return
+        conversation_id = response.json()['conversation']['id']
+
+        path = f'/api/conversations/{conversation_id}/messages'
+        if args.stream:
+            path += '/stream'
+        for i in range(args.messages):
+            content = f"{MESSAGES[i % len(MESSAGES)]} ({suffix} #{i})"
+            call(client, results, 'send_message', 'POST', path, json={'content': content})
+
+        call(client, results, 'insights', 'GET', f'/api/users/{user_id}/insights')
+        call(client, results, 'speech_feedback', 'POST', f'/api/users/{user_id}/speech-feedback', json={
+            'text': f"I think three things through thoroughly before I travel ({suffix})"
+        })
+
+def start_local_app(llm_url: str):
+    """
+    Sobe a aplicação neste processo com banco temporário; retorna (url, servidor, arquivo do banco)
+    """
+    db_file = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+    db_file.close()
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_file.name}'
+    os.environ['OPENAI_API_BASE'] = llm_url
+
+    from werkzeug.serving import WSGIRequestHandler, make_server
+    from src.main import create_app
+    app = create_app(init_schema=True)
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, name='load-test-app', daemon=True).start()
+    return f'http://127.0.0.1:{server.server_port}', server, db_file.name
+
+def print_report(results: Results, elapsed: float, args, llm_stats=None):
+    total = sum(len(values) for values in results.latencies.values())
+    total_errors = sum(results.errors.values())
+
+    print(f"\n{args.users} users x {args.flows} flows x {args.messages} messages"
+          f"{' (streaming)' if args.stream else ''} in {elapsed:.1f} s\n")
+    print(f"{'step':<20} {'count':>6} {'errors':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+
+    all_latencies = []
+    for step in STEPS:
+        values = results.latencies.get(step)
+        if not values:
+            continue
+        all_latencies.extend(values)
+        print(f"{step:<20} {len(values):>6} {results.errors[step]:>7} "
+              f"{percentile(values, 50) * 1000:>8.0f} {percentile(values, 95) * 1000:>8.0f} "
+              f"{percentile(values, 99) * 1000:>8.0f}")
+
+    if all_latencies:
+        print(f"{'all':<20} {total:>6} {total_errors:>7} "
+              f"{percentile(all_latencies, 50) * 1000:>8.0f} {percentile(all_latencies, 95) * 1000:>8.0f} "
+              f"{percentile(all_latencies, 99) * 1000:>8.0f}")
+
+    print(f"\nrequests/s: {total / elapsed:.2f}   flows/s: {args.users * args.flows / elapsed:.2f}")
+    if llm_stats:
+        print(f"LLM calls: {llm_stats['requests']} {llm_stats['by_kind']}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='aplicação já em execução (ex: http://127.0.0.1:5001)')
+    parser.add_argument('--users', type=int, default=10, help='usuários virtuais simultâneos')
+    parser.add_argument('--flows', type=int, default=1, help='fluxos por usuário virtual')
+    parser.add_argument('--messages', type=int, default=5, help='mensagens por conversa')
+    parser.add_argument('--stream', action='store_true', help='envia mensagens pelo endpoint SSE')
+    parser.add_argument('--timeout', type=float, default=120.0)
+    add_latency_arguments(parser)
+    args = parser.parse_args()
+
+    llm_server = app_server = db_path = None
+    base_url = args.url
+    if base_url is None:
+        llm_server = server_from_args(args).start()
+        base_url, app_server, db_path = start_local_app(llm_server.url)
+
+    results = Results()
+    jobs = [(user, flow) for flow in range(args.flows) for user in range(args.users)]
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.users) as pool:
+        for future in [pool.submit(run_flow, base_url, user, flow, args, results) for user, flow in jobs]:
+            future.result()
+    elapsed = time.perf_counter() - start
+
+    print_report(results, elapsed, args, llm_server.stats() if llm_server else None)
+
+    if app_server is not None:
+        app_server.shutdown()
+        llm_server.stop()
+        os.unlink(db_path)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,475 @@
+#!/usr/bin/env python3
+"""
+Servidor local compatível com a API de chat da OpenAI (POST /v1/chat/completions)
+
+Permite testes de carga sem gastar créditos: os dois serviços criam o cliente a
+partir de OPENAI_API_BASE, então basta apontar a variável para este servidor.
+
+- Conteúdo fixo no formato de cada prompt de ai_service.py e speech_service.py
+  (reconhecido pelo início do template), inclusive o modo combinado e os lotes
+  de análises (uma análise por id do prompt)
+- Respostas normais e em streaming (SSE, com o chunk de usage quando pedido)
+- Latência = tempo até o primeiro token (distribuição configurável) + tempo por token,
+  escalada pela velocidade relativa do modelo pedido (MODEL_SPEED, --model-speed)
+- Modelos indisponíveis (404) para testar o fallback do roteamento
+- Brownout: atraso extra em todas as respostas (stall, alterável com o servidor rodando)
+- Taxa de erros 500 opcional
+- GET /stats com o número de chamadas por tipo de prompt
+
+Uso direto:
+    python benchmarks/mock_llm.py --port 8089 --ttft 0.3 --distribution lognormal --jitter 0.5
+    OPENAI_API_BASE=http://127.0.0.1:8089/v1 python src/main.py
+"""
+
+import os
+import re
+import sys
+import json
+import math
+import time
+import random
+import argparse
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('OPENAI_API_KEY', 'benchmark')
+
+from src.services.ai_service import (
+    COMBINED_SYSTEM_PROMPT, MESSAGE_ANALYSIS_PROMPT, MESSAGE_ANALYSIS_BATCH_PROMPT, CONVERSATION_SUMMARY_PROMPT,
+    CONVERSATION_STARTER_PROMPT, PROGRESS_INSIGHTS_PROMPT
+)
+from src.services.speech_service import (
+    PRONUNCIATION_ANALYSIS_PROMPT, SPEECH_PATTERNS_PROMPT, PRONUNCIATION_EXERCISES_PROMPT
+)
+
+DISTRIBUTIONS = ('fixed', 'uniform', 'normal', 'lognormal', 'exponential')
+
+# Latência relativa ao gpt-4 (1.0); modelos desconhecidos usam 1.0
+MODEL_SPEED = {
+    'gpt-4': 1.0,
+    'gpt-4-turbo': 0.6,
+    'gpt-4o': 0.4,
+    'gpt-4o-mini': 0.25,
+    'gpt-3.5-turbo': 0.25
+}
+
+REPLY = (
+    "That sounds like a wonderful weekend! I love that you went hiking with your friends. "
+    "What was the most beautiful thing you saw on the trail? And by the way, great job "
+    "using the past tense so naturally!"
+)
+
+STARTER = "Hey there! I'd love to hear about the last trip you took. Where did you go and what did you enjoy most?"
+
+SUMMARY = (
+    "The learner talked about a hiking weekend with friends and their plans to travel to Portugal. "
+    "They asked how to describe landscapes and keep mixing up irregular past tense verbs such as 'go'."
+)
+
+ANALYSIS = {
+    "grammar_errors": [
+        {"error": "I goed", "correction": "I went", "explanation": "'go' has an irregular past tense"}
+    ],
+    "vocabulary_used": [
+        {"word": "weekend", "level": "basic", "usage": "correct"},
+        {"word": "hiking", "level": "intermediate", "usage": "correct"},
+        {"word": "friends", "level": "basic", "usage": "correct"},
+        {"word": "mountain", "level": "basic", "usage": "correct"}
+    ],
+    "fluency_indicators": {
+        "sentence_complexity": "moderate",
+        "coherence": "good",
+        "natural_flow": "natural"
+    },
+    "confidence_score": 0.8,
+    "positive_aspects": ["Clear description of events", "Good use of time expressions"],
+    "suggestions": ["Review irregular past tense verbs"],
+    "topics_mentioned": ["travel", "hobbies"]
+}
+
+INSIGHTS = {
+    "overall_progress": "Steady progress with longer and more natural sentences this week.",
+    "strengths": ["Rich travel vocabulary", "Consistent daily practice"],
+    "areas_for_improvement": ["Irregular past tense verbs"],
+    "achievements": ["Five conversations in a row", "First complex sentence"],
+    "next_goals": ["Tell a short story in the past tense"],
+    "motivation_message": "You're building real fluency, keep going!",
+    "learning_recommendations": ["Practice a list of 10 irregular verbs", "Describe your day out loud"]
+}
+
+PRONUNCIATION = {
+    "overall_score": 0.75,
+    "difficult_words": [
+        {
+            "word": "three",
+            "phonetic": "/θriː/",
+            "difficulty": "hard",
+            "common_mistakes": ["pronouncing th as t"],
+            "tips": "Place the tongue between the teeth"
+        }
+    ],
+    "sound_focus_areas": [
+        {
+            "sound": "/θ/",
+            "description": "voiceless th as in think",
+            "practice_words": ["think", "three", "thank"],
+            "tip": "Blow air gently over the tongue"
+        }
+    ],
+    "rhythm_and_stress": {
+        "sentence_stress": "Content words are stressed correctly",
+        "word_stress": ["photography"],
+        "intonation_tips": "Let your voice fall at the end of statements"
+    },
+    "encouragement": "Your pronunciation is getting clearer every session!"
+}
+
+SPEECH_PATTERNS = {
+    "fluency_indicators": {
+        "sentence_length_avg": "12 words",
+        "complexity_level": "moderate",
+        "hesitation_markers": ["um"],
+        "confidence_indicators": ["I think", "definitely"]
+    },
+    "pronunciation_progress": {
+        "improved_sounds": ["/r/"],
+        "challenging_sounds": ["/θ/"],
+        "consistency": "mostly consistent"
+    },
+    "vocabulary_usage": {
+        "advanced_words": ["breathtaking"],
+        "repetitive_patterns": ["very good"],
+        "variety_score": 0.7
+    },
+    "grammar_patterns": {
+        "common_structures": ["simple past", "present perfect"],
+        "error_patterns": ["irregular past tense"],
+        "improvement_areas": ["articles"]
+    },
+    "recommendations": ["Record and compare th sounds", "Replace 'very good' with stronger adjectives"],
+    "encouragement": "Your speech is becoming more varied and confident!"
+}
+
+EXERCISES = {
+    "warm_up_exercises": [
+        {"title": "Tongue stretch", "description": "Stretch the tongue out and back", "examples": ["th-th-th"]}
+    ],
+    "sound_specific_drills": [
+        {
+            "target_sound": "/θ/",
+            "minimal_pairs": [["think", "sink"], ["thank", "tank"]],
+            "practice_sentences": ["I think three thin thieves thanked Thomas"],
+            "tongue_twisters": ["Thirty-three thousand thoughts"]
+        }
+    ],
+    "rhythm_exercises": [
+        {"type": "stress pattern practice", "sentences": ["I LOVE to TRAVEL"], "instructions": "Clap on the capitals"}
+    ],
+    "daily_practice_plan": {
+        "duration": "10 minutes",
+        "sequence": ["warm-up", "minimal pairs", "sentences"],
+        "progress_tracking": "Record yourself every Friday"
+    },
+    "motivation": "Small daily practice adds up quickly!"
+}
+
+def _prefix(template) -> str:
+    return template.text[:48]
+
+# (tipo, início do prompt, conteúdo); o prompt combinado é reconhecido pela mensagem de sistema
+CANNED = [
+    ('message_analysis', _prefix(MESSAGE_ANALYSIS_PROMPT), json.dumps(ANALYSIS, indent=2)),
+    ('conversation_summary', _prefix(CONVERSATION_SUMMARY_PROMPT), SUMMARY),
+    ('conversation_starter', _prefix(CONVERSATION_STARTER_PROMPT), STARTER),
+    ('progress_insights', _prefix(PROGRESS_INSIGHTS_PROMPT), json.dumps(INSIGHTS, indent=2)),
+    ('pronunciation_analysis', _prefix(PRONUNCIATION_ANALYSIS_PROMPT), json.dumps(PRONUNCIATION, indent=2)),
+    ('speech_patterns', _prefix(SPEECH_PATTERNS_PROMPT), json.dumps(SPEECH_PATTERNS, indent=2)),
+    ('pronunciation_exercises', _prefix(PRONUNCIATION_EXERCISES_PROMPT), json.dumps(EXERCISES, indent=2)),
+]
+
+COMBINED = json.dumps({"reply": REPLY, "analysis": ANALYSIS}, indent=2)
+
+def count_tokens(text: str) -> int:
+    return math.ceil(len(text or '') / 4)
+
+def split_tokens(text: str) -> list:
+    """
+    Divide o texto em pedaços de ~4 caracteres, como tokens de streaming
+    """
+    return [text[i:i + 4] for i in range(0, len(text), 4)]
+
+def completion_for(messages: list):
+    """
+    Escolhe (tipo, conteúdo) da resposta a partir do prompt recebido
+    """
+    if messages and messages[0].get('content') == COMBINED_SYSTEM_PROMPT.render():
+        return 'reply_with_analysis', COMBINED
+
+    last_user = next((m.get('content', '') for m in reversed(messages) if m.get('role') == 'user'), '')
+    if last_user.startswith(_prefix(MESSAGE_ANALYSIS_BATCH_PROMPT)):
+        ids = [int(i) for i in re.findall(r'"id": (\d+)', last_user.split('Return a JSON object')[0])]
+        return 'message_analysis_batch', json.dumps({'analyses': [{'id': i, **ANALYSIS} for i in ids]}, indent=2)
+
+    for kind, prefix, content in CANNED:
+        if last_user.startswith(prefix):
+            return kind, content
+
+    return 'reply', REPLY
+
+class LatencyModel:
+    """
+    Sorteia o tempo até o primeiro token; o tempo por token é fixo
+
+    fixed: sempre ttft | uniform: ttft ± jitter | normal: média ttft, desvio jitter
+    lognormal: média ttft, sigma jitter (cauda longa) | exponential: média ttft
+    """
+
+    def __init__(self, ttft: float = 0.2, per_token: float = 0.01, distribution: str = 'fixed',
+                 jitter: float = 0.0, seed=None):
+        if distribution not in DISTRIBUTIONS:
+            raise ValueError(f"distribution must be one of {DISTRIBUTIONS}")
+
+        self.ttft = ttft
+        self.per_token = per_token
+        self.distribution = distribution
+        self.jitter = jitter
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def first_token_delay(self) -> float:
+        with self._lock:
+            if self.distribution == 'uniform':
+                delay = self._random.uniform(self.ttft - self.jitter, self.ttft + self.jitter)
+            elif self.distribution == 'normal':
+                delay = self._random.gauss(self.ttft, self.jitter)
+            elif self.distribution == 'lognormal' and self.ttft > 0:
+                mu = math.log(self.ttft) - self.jitter ** 2 / 2
+                delay = self._random.lognormvariate(mu, self.jitter)
+            elif self.distribution == 'exponential' and self.ttft > 0:
+                delay = self._random.expovariate(1 / self.ttft)
+            else:
+                delay = self.ttft
+        return max(0.0, delay)
+
+class QuietHTTPServer(ThreadingHTTPServer):
+    """
+    Ignora clientes que desistem antes da resposta (prazo esgotado, hedge descartado)
+    """
+
+    def handle_error(self, request, client_address):
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+class MockLLMServer:
+    """
+    Servidor em thread própria; url aponta para a base da API (.../v1)
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, ttft: float = 0.2, per_token: float = 0.01,
+                 distribution: str = 'fixed', jitter: float = 0.0, error_rate: float = 0.0, seed=None,
+                 model_speed=None, unavailable_models=(), stall: float = 0.0):
+        self.latency = LatencyModel(ttft, per_token, distribution, jitter, seed)
+        self.error_rate = error_rate
+        self.stall = stall
+        self.model_speed = dict(MODEL_SPEED, **(model_speed or {}))
+        self.unavailable_models = set(unavailable_models)
+        self.calls = Counter()
+        self.models = Counter()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = QuietHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}/v1'
+
+    @property
+    def requests(self) -> int:
+        with self._lock:
+            return sum(self.calls.values())
+
+    def start(self) -> 'MockLLMServer':
+        self._thread = threading.Thread(target=self._server.serve_forever, name='mock-llm', daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'requests': sum(self.calls.values()), 'by_kind': dict(self.calls), 'by_model': dict(self.models)}
+
+    def _should_fail(self) -> bool:
+        with self._lock:
+            return self.error_rate > 0 and self._random.random() < self.error_rate
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                if self.path.rstrip('/') != '/stats':
+                    self.send_error(404)
+                    return
+                self._send_json(200, server.stats())
+
+            def do_POST(self):
+                if not self.path.endswith('/chat/completions'):
+                    self.send_error(404)
+                    return
+
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                messages = body.get('messages', [])
+                kind, content = completion_for(messages)
+                model = body.get('model', 'mock')
+                speed = server.model_speed.get(model, 1.0)
+
+                with server._lock:
+                    server.calls[kind] += 1
+                    server.models[model] += 1
+
+                if model in server.unavailable_models:
+                    self._send_json(404, {'error': {
+                        'message': f'The model `{model}` does not exist', 'type': 'invalid_request_error',
+                        'code': 'model_not_found'
+                    }})
+                    return
+
+                if server.stall:
+                    time.sleep(server.stall)
+
+                if server._should_fail():
+                    time.sleep(server.latency.first_token_delay() * speed)
+                    self._send_json(500, {'error': {'message': 'mock upstream error', 'type': 'server_error'}})
+                    return
+
+                max_tokens = body.get('max_tokens') or 4096
+                tokens = split_tokens(content)[:max_tokens]
+                usage = {
+                    'prompt_tokens': sum(4 + count_tokens(m.get('content', '')) for m in messages) + 3,
+                    'completion_tokens': len(tokens)
+                }
+                usage['total_tokens'] = usage['prompt_tokens'] + usage['completion_tokens']
+                finish_reason = 'length' if len(tokens) < len(split_tokens(content)) else 'stop'
+
+                time.sleep(server.latency.first_token_delay() * speed)
+
+                if body.get('stream'):
+                    include_usage = (body.get('stream_options') or {}).get('include_usage', False)
+                    self._stream(body, tokens, finish_reason, usage if include_usage else None, speed)
+                    return
+
+                time.sleep(server.latency.per_token * speed * len(tokens))
+                self._send_json(200, {
+                    'id': 'chatcmpl-mock',
+                    'object': 'chat.completion',
+                    'created': int(time.time()),
+                    'model': body.get('model', 'mock'),
+                    'choices': [{
+                        'index': 0,
+                        'message': {'role': 'assistant', 'content': ''.join(tokens)},
+                        'finish_reason': finish_reason
+                    }],
+                    'usage': usage
+                })
+
+            def _stream(self, body: dict, tokens: list, finish_reason: str, usage, speed: float = 1.0):
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Cache-Control', 'no-cache')
+                self.send_header('Connection', 'close')
+                self.end_headers()
+                self.close_connection = True
+
+                def chunk(choices, chunk_usage=None):
+                    payload = {
+                        'id': 'chatcmpl-mock',
+                        'object': 'chat.completion.chunk',
+                        'created': int(time.time()),
+                        'model': body.get('model', 'mock'),
+                        'choices': choices
+                    }
+                    if chunk_usage is not None:
+                        payload['usage'] = chunk_usage
+                    self.wfile.write(f"data: {json.dumps(payload)}\n\n".encode())
+                    self.wfile.flush()
+
+                for i, token in enumerate(tokens):
+                    delta = {'content': token}
+                    if i == 0:
+                        delta['role'] = 'assistant'
+                    chunk([{'index': 0, 'delta': delta, 'finish_reason': None}])
+                    time.sleep(server.latency.per_token * speed)
+
+                chunk([{'index': 0, 'delta': {}, 'finish_reason': finish_reason}])
+                if usage is not None:
+                    chunk([], usage)
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+
+            def _send_json(self, status: int, data: dict):
+                payload = json.dumps(data).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+def add_latency_arguments(parser: argparse.ArgumentParser):
+    """
+    Opções de latência/erros compartilhadas com os scripts de benchmark
+    """
+    parser.add_argument('--ttft', type=float, default=0.2, help='segundos até o primeiro token (média)')
+    parser.add_argument('--per-token', type=float, default=0.01, help='segundos por token gerado')
+    parser.add_argument('--distribution', choices=DISTRIBUTIONS, default='fixed')
+    parser.add_argument('--jitter', type=float, default=0.0, help='dispersão da distribuição escolhida')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fração de respostas 500')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--model-speed', default='', help="latência relativa por modelo, ex: 'gpt-4o-mini=0.25'")
+    parser.add_argument('--unavailable-models', default='', help='modelos que respondem 404, separados por vírgula')
+    parser.add_argument('--stall', type=float, default=0.0, help='segundos extras antes de cada resposta (brownout)')
+
+def server_from_args(args, host: str = '127.0.0.1', port: int = 0) -> MockLLMServer:
+    model_speed = {}
+    for part in args.model_speed.split(','):
+        if '=' in part:
+            model, factor = part.split('=', 1)
+            model_speed[model.strip()] = float(factor)
+    unavailable = [model.strip() for model in args.unavailable_models.split(',') if model.strip()]
+
+    return MockLLMServer(host, port, args.ttft, args.per_token, args.distribution,
+                         args.jitter, args.error_rate, args.seed, model_speed, unavailable, args.stall)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8089)
+    add_latency_arguments(parser)
+    args = parser.parse_args()
+
+    server = server_from_args(args, args.host, args.port)
+    print(f"Mock LLM listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Replay offline de prompts gravados com várias tabelas de roteamento de modelos
+
+Os prompts vêm de um arquivo gravado pelo gateway (LLM_RECORD_PROMPTS=prompts.jsonl);
+sem --prompts o script grava antes uma carga de exemplo chamando os serviços
+contra o mock. Cada configuração reenvia as mesmas chamadas por um LLMGateway
+próprio contra benchmarks/mock_llm.py, que aplica a velocidade relativa de cada
+modelo. O relatório mostra latência p50/p95, chamadas e tokens por modelo,
+custo estimado (tabela PRICES, US$ por 1M tokens) e fallbacks.
+
+Configurações: 'all-standard' (padrão atual), 'analysis-fast' (jobs de JSON no
+nível fast com fallback para standard), 'all-fast' e as dadas em --config.
+
+Uso:
+    python benchmarks/replay_routing.py --concurrency 16
+    python benchmarks/replay_routing.py --prompts prompts.jsonl --config "mini=reply=fast>standard"
+    python benchmarks/replay_routing.py --unavailable-models gpt-4o-mini   # mostra o fallback
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('OPENAI_API_KEY', 'benchmark')
+os.environ['LLM_CACHE_ENABLED'] = 'false'
+
+from benchmarks.mock_llm import add_latency_arguments, server_from_args
+
+# US$ por 1M tokens (prompt, resposta)
+PRICES = {
+    'gpt-4': (30.0, 60.0),
+    'gpt-4-turbo': (10.0, 30.0),
+    'gpt-4o': (2.5, 10.0),
+    'gpt-4o-mini': (0.15, 0.60),
+    'gpt-3.5-turbo': (0.5, 1.5)
+}
+
+ANALYSIS_METHODS = (
+    'message_analysis', 'message_analysis_batch', 'pronunciation_analysis',
+    'pronunciation_exercises', 'speech_patterns', 'conversation_starter'
+)
+
+CONFIGS = {
+    'all-standard': '',
+    'analysis-fast': ','.join(f'{method}=fast>standard' for method in ANALYSIS_METHODS),
+    'all-fast': '*=fast>standard'
+}
+
+HISTORY = [
+    {'sender': 'user', 'content': 'I goed to the park yesterday with my dog.'},
+    {'sender': 'assistant', 'content': 'That sounds fun! What did you do there?'},
+    {'sender': 'user', 'content': 'We was playing with a ball and then we eat ice cream.'}
+]
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+def record_sample_workload(path: str, rounds: int):
+    """
+    Grava uma carga de exemplo passando pelos métodos reais dos serviços
+    """
+    from src.services.ai_service import AIConversationService
+    from src.services.speech_service import SpeechAnalysisService
+    from src.services.async_runtime import run_async
+    from src.services.llm_gateway import llm_gateway
+
+    llm_gateway.record_path = path
+    ai = AIConversationService(response_mode='separate', analysis_batching=False)
+    speech = SpeechAnalysisService()
+    levels = ('beginner', 'intermediate', 'advanced')
+
+    for i in range(rounds):
+        profile = {'english_level': levels[i % len(levels)], 'interests': 'travel, music'}
+        message = f'Last weekend I goed hiking with my friends near the mountain, number {i}.'
+        run_async(ai.generate_response(message, HISTORY, profile))
+        speech.analyze_pronunciation(message, profile['english_level'])
+        if i % 2 == 0:
+            speech.analyze_speech_patterns(HISTORY)
+            speech.generate_pronunciation_exercises(['th', 'r'], profile['english_level'])
+            run_async(ai.generate_conversation_starter(profile))
+        if i % 4 == 0:
+            ''.join(ai.stream_response(message, HISTORY, profile))
+
+    llm_gateway.record_path = None
+
+def load_prompts(path: str) -> list:
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def router_for(raw: str):
+    from src.services.model_routing import ModelRouter, parse_chain, parse_routes
+
+    routes = parse_routes(raw)
+    default_route = routes.pop('*', None) or parse_chain('standard')
+    return ModelRouter(routes=routes, default_route=default_route)
+
+def replay(name: str, raw_routes: str, prompts: list, concurrency: int) -> dict:
+    from src.services.llm_gateway import LLMGateway
+    from src.services.prompt_builder import TokenUsageMetrics
+    import src.services.llm_gateway as gateway_module
+
+    gateway_module.token_usage = TokenUsageMetrics()
+    gateway = LLMGateway(router=router_for(raw_routes), record_path='')
+
+    def call(entry):
+        params = dict(entry['params'])
+        started = time.perf_counter()
+        if params.pop('stream', False):
+            params['stream_options'] = {'include_usage': True}
+            usage = None
+            model = None
+            for chunk in gateway.stream_completion(entry['method'], **params):
+                model = chunk.model
+                usage = chunk.usage or usage
+            prompt, completion = (usage.prompt_tokens, usage.completion_tokens) if usage else (0, 0)
+        else:
+            response = gateway.create_completion(entry['method'], **params)
+            model = response.model
+            prompt, completion = response.usage.prompt_tokens, response.usage.completion_tokens
+        return time.perf_counter() - started, model, prompt, completion
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(call, prompts))
+
+    latencies = [latency for latency, _, _, _ in results]
+    calls, tokens, cost = Counter(), Counter(), 0.0
+    for _, model, prompt, completion in results:
+        calls[model] += 1
+        tokens[model] += prompt + completion
+        prompt_price, completion_price = PRICES.get(model, (0.0, 0.0))
+        cost += (prompt * prompt_price + completion * completion_price) / 1_000_000
+
+    by_method = gateway.snapshot()['by_method']
+    return {
+        'name': name,
+        'p50': statistics.median(latencies) * 1000,
+        'p95': percentile(latencies, 95) * 1000,
+        'calls': dict(calls),
+        'tokens': dict(tokens),
+        'cost': cost,
+        'fallbacks': sum(stats['fallbacks'] for stats in by_method.values())
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--prompts', help='arquivo JSONL gravado com LLM_RECORD_PROMPTS')
+    parser.add_argument('--rounds', type=int, default=12, help='rodadas da carga de exemplo (sem --prompts)')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--config', action='append', default=[],
+                        help="nome=ROTAS no formato de LLM_MODEL_ROUTES ('*' define a rota padrão)")
+    parser.add_argument('--only', default='', help='configurações a rodar, separadas por vírgula')
+    add_latency_arguments(parser)
+    args = parser.parse_args()
+
+    server = server_from_args(args).start()
+    os.environ['OPENAI_API_BASE'] = server.url
+
+    configs = dict(CONFIGS)
+    for raw in args.config:
+        name, routes = raw.split('=', 1)
+        configs[name.strip()] = routes
+    if args.only:
+        configs = {name: configs[name] for name in args.only.split(',')}
+
+    path = args.prompts
+    if not path:
+        path = os.path.join(tempfile.mkdtemp(), 'prompts.jsonl')
+        record_sample_workload(path, args.rounds)
+    prompts = load_prompts(path)
+
+    methods = Counter(entry['method'] for entry in prompts)
+    print(f"{len(prompts)} recorded calls from {path}, concurrency {args.concurrency}")
+    print('  ' + ', '.join(f'{method} {count}' for method, count in methods.most_common()) + '\n')
+
+    baseline = None
+    for name, routes in configs.items():
+        r = replay(name, routes, prompts, args.concurrency)
+        baseline = baseline or r
+        change = (r['cost'] / baseline['cost'] - 1) * 100 if baseline['cost'] else 0.0
+        print(f"{r['name']}: p50 {r['p50']:.0f} ms, p95 {r['p95']:.0f} ms, "
+              f"cost ${r['cost']:.4f} ({change:+.0f}% vs {baseline['name']}), fallbacks {r['fallbacks']}")
+        for model, count in sorted(r['calls'].items()):
+            print(f"    {model:<14} {count:>5} calls {r['tokens'][model]:>9} tokens")
+
+    server.stop()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""
+Configuração do gunicorn para produção (workers gthread com a aplicação pré-carregada)
+
+Uso (na pasta english-conversation-assistant):
+    python migrate.py          # esquema atualizado na implantação, não na partida dos workers
+    gunicorn -c gunicorn.conf.py
+
+Variáveis de ambiente:
+    HOST / PORT           endereço (0.0.0.0:5001)
+    WEB_CONCURRENCY       processos (padrão: número de CPUs)
+    GUNICORN_THREADS      threads por processo (16); as requisições passam a maior
+                          parte do tempo esperando o modelo, então threads rendem
+                          mais que processos
+    GUNICORN_TIMEOUT      segundos sem resposta antes de reiniciar um worker (120, cobre o SSE)
+    GRACEFUL_TIMEOUT      prazo para terminar requisições e drenar chamadas ao desligar (30)
+    DRAIN_TIMEOUT         parte desse prazo para tarefas e chamadas em segundo plano (20)
+    WARM_SERVICES         prepara serviços e cliente dos modelos em segundo plano após o fork (true)
+
+Com preload a aplicação (rotas e configuração) é carregada uma vez no
+processo mestre; os serviços de IA e de fala são criados na primeira requisição
+de cada worker. O que não sobrevive ao fork é criado em cada worker: os
+workers da fila de tarefas e as conexões do banco. O cliente dos modelos e o
+event loop compartilhado já são criados no primeiro uso. Tarefas persistidas
+(PERSISTENT_JOBS) são retomadas só pelo primeiro worker.
+
+No SIGTERM cada worker para de aceitar conexões, termina as requisições em
+andamento e, em worker_exit, drena a fila de tarefas e as chamadas aos modelos.
+"""
+
+import os
+import multiprocessing
+
+wsgi_app = 'src.main:create_app(start_background=False)'
+bind = f"{os.getenv('HOST', '0.0.0.0')}:{os.getenv('PORT', '5001')}"
+
+worker_class = 'gthread'
+workers = int(os.getenv('WEB_CONCURRENCY', str(multiprocessing.cpu_count())))
+threads = int(os.getenv('GUNICORN_THREADS', '16'))
+preload_app = True
+
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '120'))
+graceful_timeout = int(os.getenv('GRACEFUL_TIMEOUT', '30'))
+keepalive = 5
+
+accesslog = os.getenv('GUNICORN_ACCESS_LOG')
+errorlog = '-'
+
+def post_fork(server, worker):
+    from src.main import start_warmup
+    from src.models.user import db
+    from src.services.job_queue import job_queue
+
+    # Conexões abertas pelo mestre (ex: AUTO_MIGRATE) não são reaproveitadas no worker
+    with job_queue.app.app_context():
+        db.engine.dispose(close=False)
+
+    job_queue.start(recover=worker.age == 1)
+    start_warmup()
+
+def worker_exit(server, worker):
+    from src.main import shutdown_app
+
+    shutdown_app()
@@ -8,14 +8,16 @@ import sys
 sys.path.append('src')
 
 from src.models.user import db, User, Conversation, Message
-from src.main import app
+from src.models.migrations import upgrade_schema
+from src.main import create_app
 
 def init_database():
     """Inicializa o banco de dados com todas as tabelas"""
+    app = create_app(start_background=False, init_schema=False)
     with app.app_context():
         # Remove todas as tabelas existentes e recria
         db.drop_all()
-        db.create_all()
+        upgrade_schema()
         
         # Cria usuário padrão para testes
         default_user = User(
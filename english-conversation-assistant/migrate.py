@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+"""
+Script para criar as tabelas que faltam e aplicar migrações pendentes (sem apagar dados)
+
+A aplicação não altera o esquema ao iniciar (exceto com AUTO_MIGRATE=true);
+rode este script na implantação, antes de subir os workers.
+
+Uso:
+    python migrate.py            # aplica migrações pendentes
+    python migrate.py --status   # apenas lista o estado das migrações
+"""
+
+import sys
+sys.path.append('src')
+
+from src.models.migrations import upgrade_schema, migration_status
+from src.main import create_app
+
+def migrate(status_only: bool = False):
+    """Aplica as migrações pendentes e mostra o estado final"""
+    app = create_app(start_background=False, init_schema=False)
+    with app.app_context():
+        if not status_only:
+            applied = upgrade_schema()
+            if not applied:
+                print("✅ Database already up to date")
+        
+        for migration in migration_status():
+            mark = '✅' if migration['applied'] else '⏳'
+            print(f"{mark} {migration['version']:04d} {migration['name']}")
+
+if __name__ == '__main__':
+    migrate(status_only='--status' in sys.argv)
@@ -0,0 +1,55 @@
+"""
+Entrada ASGI: a aplicação sob um servidor ASGI (uvicorn)
+
+Uso (na pasta english-conversation-assistant):
+    python migrate.py
+    uvicorn src.asgi:app --host 0.0.0.0 --port 5001 --workers 2
+
+Requer a2wsgi e uvicorn (em requirements.txt). As conexões (keep-alive,
+clientes lentos, SSE) ficam no event loop do servidor; as rotas continuam
+síncronas e rodam em um pool de ASGI_THREADS threads (16), enquanto as chamadas
+assíncronas aos modelos seguem no loop compartilhado (async_runtime).
+
+O lifespan inicia a fila de tarefas e, no desligamento, drena tarefas e chamadas
+aos modelos em andamento (DRAIN_TIMEOUT). Com --workers cada processo retoma as
+tarefas persistidas (PERSISTENT_JOBS); para isso prefira gunicorn.conf.py.
+"""
+
+import os
+import asyncio
+
+try:
+    from a2wsgi import WSGIMiddleware
+except ImportError as e:
+    raise ImportError("A entrada ASGI requer o pacote a2wsgi (pip install -r requirements.txt)") from e
+
+from src.main import create_app, shutdown_app, start_warmup
+from src.services.job_queue import job_queue
+
+class LifespanMiddleware:
+    """
+    Trata os eventos de lifespan e repassa o resto para a aplicação
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'lifespan':
+            await self.app(scope, receive, send)
+            return
+
+        loop = asyncio.get_running_loop()
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                job_queue.start()
+                start_warmup()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await loop.run_in_executor(None, shutdown_app)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+flask_app = create_app(start_background=False)
+app = LifespanMiddleware(WSGIMiddleware(flask_app, workers=int(os.getenv('ASGI_THREADS', '16'))))
@@ -1,56 +1,132 @@
 import os
 import sys
+import threading
 # DON'T CHANGE THIS !!!
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
+from typing import Optional
 from flask import Flask, send_from_directory
 from flask_cors import CORS
 from src.models.user import db
+from src.models.migrations import upgrade_schema
 from src.routes.user import user_bp
-from src.routes.conversation import conversation_bp
-
-app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
-app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
-
-# Configurar CORS para permitir requisições do frontend
-CORS(app, origins="*")
-
-from src.routes.speech import speech_bp
-
-# Registrar blueprints
-app.register_blueprint(user_bp, url_prefix='/api')
-app.register_blueprint(conversation_bp, url_prefix='/api')
-app.register_blueprint(speech_bp, url_prefix='/api')
-
-# Configuração do banco de dados
-app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db.init_app(app)
-
-# Criar tabelas
-with app.app_context():
-    db.create_all()
-
-@app.route('/', defaults={'path': ''})
-@app.route('/<path:path>')
-def serve(path):
-    static_folder_path = app.static_folder
-    if static_folder_path is None:
-            return "Static folder not configured", 404
-
-    if path != "" and os.path.exists(os.path.join(static_folder_path, path)):
-        return send_from_directory(static_folder_path, path)
-    else:
-        index_path = os.path.join(static_folder_path, 'index.html')
-        if os.path.exists(index_path):
-            return send_from_directory(static_folder_path, 'index.html')
+from src.routes.conversation import conversation_bp, get_ai_service
+from src.routes.speech import speech_bp, get_speech_service
+from src.routes.metrics import metrics_bp
+from src.services.async_runtime import async_runtime
+from src.services.job_queue import job_queue
+from src.services.llm_gateway import llm_gateway
+
+def create_app(start_background: bool = True, init_schema: Optional[bool] = None) -> Flask:
+    """
+    Cria e configura a aplicação
+    start_background=False deixa os workers da fila de tarefas parados; o servidor
+    os inicia em cada processo depois do fork (ver gunicorn.conf.py)
+    init_schema cria tabelas e aplica migrações na partida (padrão: AUTO_MIGRATE, desligado);
+    em produção o esquema é atualizado antes, por migrate.py
+    Os serviços de IA e de fala são criados na primeira requisição que os usa
+    """
+    app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
+    app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
+
+    # Configurar CORS para permitir requisições do frontend
+    CORS(app, origins="*")
+
+    # Registrar blueprints
+    app.register_blueprint(user_bp, url_prefix='/api')
+    app.register_blueprint(conversation_bp, url_prefix='/api')
+    app.register_blueprint(speech_bp, url_prefix='/api')
+    app.register_blueprint(metrics_bp, url_prefix='/api')
+
+    # Configuração do banco de dados
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv(
+        'DATABASE_URL',
+        f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
+    )
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+
+    # Criar tabelas e aplicar migrações pendentes só quando pedido (não a cada worker novo)
+    if init_schema is None:
+        init_schema = os.getenv('AUTO_MIGRATE', 'false').lower() == 'true'
+    if init_schema:
+        with app.app_context():
+            upgrade_schema()
+
+    # Fila de tarefas em segundo plano
+    job_queue.init_app(app, start=start_background)
+
+    @app.route('/', defaults={'path': ''})
+    @app.route('/<path:path>')
+    def serve(path):
+        static_folder_path = app.static_folder
+        if static_folder_path is None:
+                return "Static folder not configured", 404
+
+        if path != "" and os.path.exists(os.path.join(static_folder_path, path)):
+            return send_from_directory(static_folder_path, path)
         else:
-            return "index.html not found", 404
+            index_path = os.path.join(static_folder_path, 'index.html')
+            if os.path.exists(index_path):
+                return send_from_directory(static_folder_path, 'index.html')
+            else:
+                return "index.html not found", 404
+
+    # Rota de health check
+    @app.route('/api/health')
+    def health_check():
+        return {'status': 'healthy', 'service': 'English Conversation Assistant'}
+
+    return app
+
+def warm_services():
+    """
+    Cria os serviços de IA e de fala e o cliente dos modelos antes da primeira requisição que os usa
+    """
+    try:
+        get_ai_service()
+        get_speech_service()
+        llm_gateway.client
+    except Exception as e:
+        print(f"Erro ao preparar os serviços: {e}")
+
+def start_warmup():
+    """
+    Prepara os serviços em segundo plano (WARM_SERVICES, ligado por padrão), depois
+    que o worker já atende; assim a partida continua rápida e a primeira chamada ao
+    modelo não paga a importação do cliente
+    """
+    if os.getenv('WARM_SERVICES', 'true').lower() == 'true':
+        threading.Thread(target=warm_services, name='warm-services', daemon=True).start()
+
+def shutdown_app(timeout: Optional[float] = None):
+    """
+    Desligamento gracioso: termina as tarefas enfileiradas, as corrotinas do
+    loop compartilhado e espera as chamadas aos modelos em andamento
+    """
+    timeout = timeout if timeout is not None else float(os.getenv('DRAIN_TIMEOUT', '20'))
+
+    job_queue.shutdown(wait=True, timeout=timeout)
+    async_runtime.shutdown(timeout=timeout)
+    if not llm_gateway.drain(timeout):
+        print(f"Desligamento com chamadas aos modelos ainda em andamento após {timeout}s")
 
-# Rota de health check
-@app.route('/api/health')
-def health_check():
-    return {'status': 'healthy', 'service': 'English Conversation Assistant'}
+def __getattr__(name):
+    """
+    src.main.app continua disponível (scripts e servidores que importam a aplicação pronta);
+    é criada no primeiro acesso, não na importação do módulo
+    """
+    if name == 'app':
+        global app
+        app = create_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5001, debug=True)
+    # Servidor de desenvolvimento; em produção use gunicorn (gunicorn.conf.py) ou src/asgi.py
+    create_app(init_schema=True).run(
+        host=os.getenv('HOST', '0.0.0.0'),
+        port=int(os.getenv('PORT', '5001')),
+        debug=os.getenv('FLASK_DEBUG', 'false').lower() == 'true',
+        threaded=True
+    )
@@ -0,0 +1,220 @@
+"""
+Migrações incrementais do esquema do banco
+
+db.create_all() só cria tabelas que ainda não existem; índices e colunas novos
+em tabelas já existentes são aplicados por estas migrações. Cada migração roda
+uma única vez, em transação própria, e fica registrada em schema_migrations.
+Use comandos idempotentes (IF NOT EXISTS / verificação de colunas), já que em
+bancos novos o create_all já terá criado parte dos objetos.
+
+O esquema é atualizado por upgrade_schema(), chamado por migrate.py (etapa de
+implantação, antes de subir os workers) e não na partida da aplicação, a menos
+que AUTO_MIGRATE=true.
+"""
+
+import json
+from datetime import datetime
+from typing import Dict, List
+from src.models.user import db, SchemaMigration, Message, Conversation, KnowledgeStats, \
+    ConversationStarter, UserInsights, PronunciationScore, PronunciationStats
+
+def create_index(conn, name: str, table: str, columns: str, unique: bool = False):
+    """
+    Cria um índice se ele ainda não existir
+    """
+    unique_sql = 'UNIQUE ' if unique else ''
+    conn.execute(db.text(f"CREATE {unique_sql}INDEX IF NOT EXISTS {name} ON {table} ({columns})"))
+
+def column_exists(conn, table: str, column: str) -> bool:
+    """
+    Verifica se a coluna existe na tabela (SQLite)
+    """
+    rows = conn.execute(db.text(f"PRAGMA table_info({table})")).fetchall()
+    return any(row[1] == column for row in rows)
+
+def add_column(conn, table: str, column: str, ddl: str):
+    """
+    Adiciona uma coluna se ela ainda não existir
+    """
+    if not column_exists(conn, table, column):
+        conn.execute(db.text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+
+def migration_0001_knowledge_item_unique_index(conn):
+    """
+    Índice único de knowledge_item usado pelo upsert em lote
+    Itens duplicados são unidos no mais antigo antes da criação: contadores somados,
+    maior domínio e último encontro mais recente; depois os demais são removidos
+    """
+    conn.execute(db.text(
+        "UPDATE knowledge_item SET "
+        "times_encountered = merged.times_encountered, "
+        "times_used_correctly = merged.times_used_correctly, "
+        "mastery_level = merged.mastery_level, "
+        "last_encountered = merged.last_encountered "
+        "FROM (SELECT MIN(id) AS keep_id, "
+        "SUM(COALESCE(times_encountered, 0)) AS times_encountered, "
+        "SUM(COALESCE(times_used_correctly, 0)) AS times_used_correctly, "
+        "MAX(COALESCE(mastery_level, 0)) AS mastery_level, "
+        "MAX(last_encountered) AS last_encountered "
+        "FROM knowledge_item GROUP BY user_id, item_type, content HAVING COUNT(*) > 1) AS merged "
+        "WHERE knowledge_item.id = merged.keep_id"
+    ))
+    conn.execute(db.text(
+        "DELETE FROM knowledge_item WHERE id NOT IN ("
+        "SELECT MIN(id) FROM knowledge_item GROUP BY user_id, item_type, content)"
+    ))
+    create_index(conn, 'uq_knowledge_item_user_type_content', 'knowledge_item',
+                 'user_id, item_type, content', unique=True)
+
+def migration_0002_hot_path_indexes(conn):
+    """
+    Índices compostos para as consultas de histórico, conversas, progresso e conhecimento
+    """
+    create_index(conn, 'ix_message_conversation_timestamp', 'message', 'conversation_id, timestamp')
+    create_index(conn, 'ix_message_conversation_sender_timestamp', 'message',
+                 'conversation_id, sender, timestamp')
+    create_index(conn, 'ix_conversation_user_started_at', 'conversation', 'user_id, started_at')
+    create_index(conn, 'ix_conversation_user_active', 'conversation', 'user_id, is_active')
+    create_index(conn, 'ix_user_progress_user_date', 'user_progress', 'user_id, date DESC')
+    create_index(conn, 'ix_knowledge_item_user_mastery', 'knowledge_item', 'user_id, mastery_level DESC')
+
+def migration_0003_conversation_summary(conn):
+    """
+    Colunas do resumo acumulado da conversa
+    """
+    add_column(conn, 'conversation', 'summary', 'TEXT')
+    add_column(conn, 'conversation', 'summarized_until_id', 'INTEGER')
+    add_column(conn, 'conversation', 'summary_updated_at', 'DATETIME')
+
+def migration_0004_pronunciation_scores(conn):
+    """
+    Série de notas e agregados de pronúncia a partir dos feedbacks já gravados nas mensagens
+    """
+    PronunciationScore.__table__.create(conn, checkfirst=True)
+    PronunciationStats.__table__.create(conn, checkfirst=True)
+    
+    rows = conn.execute(
+        db.select(
+            Message.id, Conversation.user_id, Message.timestamp, Message.content,
+            Message.confidence_score, Message.pronunciation_feedback
+        ).join(
+            Conversation, Conversation.id == Message.conversation_id
+        ).where(
+            Message.pronunciation_feedback.isnot(None),
+            Message.id.notin_(db.select(PronunciationScore.message_id))
+        ).order_by(Conversation.user_id, Message.timestamp, Message.id)
+    ).fetchall()
+    
+    users = set()
+    for message_id, user_id, timestamp, content, confidence, feedback_json in rows:
+        try:
+            feedback = json.loads(feedback_json)
+            score = float(feedback.get('overall_score', 0.7))
+        except (ValueError, TypeError, AttributeError):
+            continue
+        
+        conn.execute(PronunciationScore.__table__.insert().values(
+            user_id=user_id,
+            message_id=message_id,
+            recorded_at=timestamp,
+            overall_score=score,
+            difficult_sounds=len(feedback.get('sound_focus_areas', [])),
+            confidence_score=confidence,
+            text_length=len(content or ''),
+            improvements=feedback.get('encouragement', '')
+        ))
+        users.add(user_id)
+    
+    # Agregados recalculados a partir da série para os usuários com notas novas
+    for user_id in users:
+        conn.execute(PronunciationStats.refresh_statement(user_id))
+
+def migration_0005_knowledge_stats(conn):
+    """
+    Agregados por (usuário, tipo) a partir dos itens de conhecimento existentes
+    """
+    KnowledgeStats.__table__.create(conn, checkfirst=True)
+    conn.execute(db.text(
+        "INSERT OR REPLACE INTO knowledge_stats "
+        "(user_id, item_type, item_count, mastery_sum, well_mastered, updated_at) "
+        "SELECT user_id, item_type, COUNT(*), SUM(COALESCE(mastery_level, 0)), "
+        "SUM(CASE WHEN mastery_level >= :well_mastered THEN 1 ELSE 0 END), :now "
+        "FROM knowledge_item GROUP BY user_id, item_type"
+    ), {'well_mastered': KnowledgeStats.WELL_MASTERED, 'now': datetime.utcnow()})
+
+def migration_0006_user_data_version(conn):
+    """
+    Versão dos dados do usuário usada na invalidação dos insights em cache
+    """
+    add_column(conn, 'user', 'data_version', 'INTEGER DEFAULT 0')
+    UserInsights.__table__.create(conn, checkfirst=True)
+
+def migration_0007_conversation_starter_pool(conn):
+    """
+    Pool de aberturas de conversa pré-geradas por usuário
+    """
+    ConversationStarter.__table__.create(conn, checkfirst=True)
+    create_index(conn, 'ix_conversation_starter_user_id', 'conversation_starter', 'user_id, id')
+
+# (versão, nome, função) em ordem de aplicação
+MIGRATIONS = [
+    (1, 'knowledge_item_unique_index', migration_0001_knowledge_item_unique_index),
+    (2, 'hot_path_indexes', migration_0002_hot_path_indexes),
+    (3, 'conversation_summary', migration_0003_conversation_summary),
+    (4, 'pronunciation_scores', migration_0004_pronunciation_scores),
+    (5, 'knowledge_stats', migration_0005_knowledge_stats),
+    (6, 'user_data_version', migration_0006_user_data_version),
+    (7, 'conversation_starter_pool', migration_0007_conversation_starter_pool),
+]
+
+def get_applied_versions() -> set:
+    """
+    Versões já aplicadas neste banco
+    """
+    SchemaMigration.__table__.create(db.engine, checkfirst=True)
+
+    with db.engine.connect() as conn:
+        rows = conn.execute(db.select(SchemaMigration.version)).fetchall()
+    return {row[0] for row in rows}
+
+def apply_migrations() -> List[Dict]:
+    """
+    Aplica as migrações pendentes (requer contexto da aplicação)
+    Retorna a lista de migrações aplicadas nesta execução
+    """
+    applied_versions = get_applied_versions()
+    applied_now = []
+
+    for version, name, migration in MIGRATIONS:
+        if version in applied_versions:
+            continue
+
+        with db.engine.begin() as conn:
+            migration(conn)
+            conn.execute(SchemaMigration.__table__.insert().values(
+                version=version,
+                name=name,
+                applied_at=datetime.utcnow()
+            ))
+
+        applied_now.append({'version': version, 'name': name})
+        print(f"✅ Migration {version:04d} applied: {name}")
+
+    return applied_now
+
+def upgrade_schema() -> List[Dict]:
+    """
+    Cria as tabelas que faltam e aplica as migrações pendentes (requer contexto da aplicação)
+    """
+    db.create_all()
+    return apply_migrations()
+
+def migration_status() -> List[Dict]:
+    """
+    Estado de cada migração conhecida
+    """
+    applied_versions = get_applied_versions()
+    return [
+        {'version': version, 'name': name, 'applied': version in applied_versions}
+        for version, name, _ in MIGRATIONS
+    ]
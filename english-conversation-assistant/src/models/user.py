@@ -1,4 +1,5 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from datetime import datetime
 import json
 
@@ -16,10 +17,21 @@ class User(db.Model):
     interests = db.Column(db.Text)  # JSON com tópicos de interesse
     goals = db.Column(db.Text)  # JSON com objetivos de aprendizagem
     
+    # Incrementado sempre que progresso/conhecimento mudam (invalida os insights em cache)
+    data_version = db.Column(db.Integer, default=0)
+    
     # Relacionamentos
     conversations = db.relationship('Conversation', backref='user', lazy=True, cascade='all, delete-orphan')
     progress_records = db.relationship('UserProgress', backref='user', lazy=True, cascade='all, delete-orphan')
     knowledge_items = db.relationship('KnowledgeItem', backref='user', lazy=True, cascade='all, delete-orphan')
+    knowledge_stats = db.relationship('KnowledgeStats', backref='user', lazy=True, cascade='all, delete-orphan')
+    conversation_starters = db.relationship('ConversationStarter', backref='user', lazy=True,
+                                            cascade='all, delete-orphan')
+    insights_cache = db.relationship('UserInsights', backref='user', lazy=True, uselist=False,
+                                     cascade='all, delete-orphan')
+    pronunciation_scores = db.relationship('PronunciationScore', backref='user', lazy=True, cascade='all, delete-orphan')
+    pronunciation_stats = db.relationship('PronunciationStats', backref='user', lazy=True, uselist=False,
+                                          cascade='all, delete-orphan')
 
     def __repr__(self):
         return f'<User {self.username}>'
@@ -44,9 +56,20 @@ class Conversation(db.Model):
     ended_at = db.Column(db.DateTime)
     is_active = db.Column(db.Boolean, default=True)
     
+    # Resumo acumulado das mensagens antigas (atualizado em segundo plano)
+    summary = db.Column(db.Text)
+    summarized_until_id = db.Column(db.Integer)  # id da última mensagem incluída no resumo
+    summary_updated_at = db.Column(db.DateTime)
+    
     # Relacionamentos
     messages = db.relationship('Message', backref='conversation', lazy=True, cascade='all, delete-orphan')
     
+    # Conversas do usuário por data e conversas ativas
+    __table_args__ = (
+        db.Index('ix_conversation_user_started_at', 'user_id', 'started_at'),
+        db.Index('ix_conversation_user_active', 'user_id', 'is_active'),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -55,7 +78,8 @@ class Conversation(db.Model):
             'started_at': self.started_at.isoformat() if self.started_at else None,
             'ended_at': self.ended_at.isoformat() if self.ended_at else None,
             'is_active': self.is_active,
-            'message_count': len(self.messages)
+            'message_count': len(self.messages),
+            'summary': self.summary
         }
 
 class Message(db.Model):
@@ -71,6 +95,12 @@ class Message(db.Model):
     pronunciation_feedback = db.Column(db.Text)  # JSON com feedback de pronúncia
     confidence_score = db.Column(db.Float)  # Pontuação de confiança (0-1)
     
+    # Histórico em ordem cronológica e mensagens do usuário nas conversas recentes
+    __table_args__ = (
+        db.Index('ix_message_conversation_timestamp', 'conversation_id', 'timestamp'),
+        db.Index('ix_message_conversation_sender_timestamp', 'conversation_id', 'sender', 'timestamp'),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -101,6 +131,11 @@ class UserProgress(db.Model):
     conversation_duration = db.Column(db.Integer, default=0)  # em minutos
     topics_discussed = db.Column(db.Text)  # JSON com tópicos
     
+    # Registros do usuário do mais recente para o mais antigo
+    __table_args__ = (
+        db.Index('ix_user_progress_user_date', 'user_id', db.text('date DESC')),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -136,6 +171,13 @@ class KnowledgeItem(db.Model):
     topic_category = db.Column(db.String(100))
     difficulty_level = db.Column(db.String(20))  # easy, medium, hard
     
+    # Um item por (usuário, tipo, conteúdo): permite upsert em lote com ON CONFLICT
+    # Nuvem de conhecimento ordenada por domínio
+    __table_args__ = (
+        db.Index('uq_knowledge_item_user_type_content', 'user_id', 'item_type', 'content', unique=True),
+        db.Index('ix_knowledge_item_user_mastery', 'user_id', db.text('mastery_level DESC')),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -151,3 +193,201 @@ class KnowledgeItem(db.Model):
             'topic_category': self.topic_category,
             'difficulty_level': self.difficulty_level
         }
+
+class KnowledgeStats(db.Model):
+    # Domínio a partir do qual um item conta como bem dominado
+    WELL_MASTERED = 0.8
+    
+    # Agregados dos itens de conhecimento por (usuário, tipo), mantidos por update_knowledge_items
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    item_type = db.Column(db.String(50), primary_key=True)
+    item_count = db.Column(db.Integer, default=0)
+    mastery_sum = db.Column(db.Float, default=0.0)
+    well_mastered = db.Column(db.Integer, default=0)  # itens com domínio >= WELL_MASTERED
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    @classmethod
+    def summarize(cls, user_id: int) -> dict:
+        """
+        Resumo do conhecimento do usuário (total, por tipo, domínio médio e bem dominados)
+        Lê uma linha por tipo de item em vez de carregar todos os itens
+        """
+        rows = cls.query.filter(cls.user_id == user_id, cls.item_count > 0).all()
+        total = sum(row.item_count for row in rows)
+        if not total:
+            return {}
+        
+        return {
+            'total_items': total,
+            'by_type': {row.item_type: row.item_count for row in rows},
+            'average_mastery': sum(row.mastery_sum for row in rows) / total,
+            'well_mastered': sum(row.well_mastered for row in rows)
+        }
+
+class ConversationStarter(db.Model):
+    # Aberturas de conversa geradas em segundo plano, consumidas por start_conversation
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    content = db.Column(db.Text, nullable=False)
+    profile_key = db.Column(db.String(64), nullable=False)  # hash de nível + interesses usados na geração
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # Pool do usuário em ordem de geração
+    __table_args__ = (
+        db.Index('ix_conversation_starter_user_id', 'user_id', 'id'),
+    )
+
+class UserInsights(db.Model):
+    # Últimos insights gerados e a versão dos dados do usuário usada para gerá-los
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    insights = db.Column(db.Text, nullable=False)  # JSON
+    data_version = db.Column(db.Integer, default=0)
+    generated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class PronunciationScore(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    message_id = db.Column(db.Integer, db.ForeignKey('message.id'), nullable=False, unique=True)
+    recorded_at = db.Column(db.DateTime, default=datetime.utcnow)  # horário da mensagem avaliada
+    
+    # Valores extraídos do feedback de pronúncia (evita json.loads na leitura)
+    overall_score = db.Column(db.Float, nullable=False)
+    difficult_sounds = db.Column(db.Integer, default=0)
+    confidence_score = db.Column(db.Float)
+    text_length = db.Column(db.Integer, default=0)
+    improvements = db.Column(db.Text)
+    
+    # Série temporal do usuário (paginação e filtro por data)
+    __table_args__ = (
+        db.Index('ix_pronunciation_score_user_recorded_at', 'user_id', 'recorded_at'),
+    )
+    
+    def to_dict(self):
+        return {
+            'message_id': self.message_id,
+            'date': self.recorded_at.isoformat() if self.recorded_at else None,
+            'overall_score': self.overall_score,
+            'difficult_sounds': self.difficult_sounds or 0,
+            'confidence_score': self.confidence_score if self.confidence_score is not None else 0.7,
+            'text_length': self.text_length or 0,
+            'improvements': self.improvements or ''
+        }
+
+class PronunciationStats(db.Model):
+    # Tamanho das janelas inicial e recente usadas na tendência
+    WINDOW = 5
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    total_sessions = db.Column(db.Integer, default=0)
+    score_sum = db.Column(db.Float, default=0.0)
+    early_scores = db.Column(db.Text)  # JSON [[message_id, nota], ...] das primeiras notas
+    recent_scores = db.Column(db.Text)  # JSON [[message_id, nota], ...] das últimas notas
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    @classmethod
+    def refresh_statement(cls, user_id: int):
+        """
+        Upsert que recalcula os agregados do usuário a partir de pronunciation_score
+        Roda na transação que gravou a nota, que já tem o lock de escrita: notas gravadas
+        em paralelo não se perdem, ao contrário de ler e regravar o JSON das janelas
+        As janelas (primeiras e últimas WINDOW notas, em ordem cronológica) vêm do índice
+        (user_id, recorded_at)
+        """
+        scores = PronunciationScore.__table__
+        user_scores = db.select(scores.c.id).where(scores.c.user_id == user_id)
+        
+        def window(first_ids):
+            ordered = db.select(scores.c.message_id, scores.c.overall_score).where(
+                scores.c.id.in_(first_ids.limit(cls.WINDOW))
+            ).order_by(scores.c.recorded_at, scores.c.id).subquery()
+            return db.select(
+                db.func.json_group_array(db.func.json_array(ordered.c.message_id, ordered.c.overall_score))
+            ).scalar_subquery()
+        
+        totals = db.select(
+            db.func.count().label('total_sessions'),
+            db.func.coalesce(db.func.sum(scores.c.overall_score), 0.0).label('score_sum')
+        ).where(scores.c.user_id == user_id).subquery()
+        
+        stmt = sqlite_insert(cls.__table__).from_select(
+            ['user_id', 'total_sessions', 'score_sum', 'early_scores', 'recent_scores', 'updated_at'],
+            db.select(
+                db.literal(user_id),
+                totals.c.total_sessions,
+                totals.c.score_sum,
+                window(user_scores.order_by(scores.c.recorded_at, scores.c.id)),
+                window(user_scores.order_by(scores.c.recorded_at.desc(), scores.c.id.desc())),
+                db.literal(datetime.utcnow())
+            ).where(db.true())  # WHERE evita a ambiguidade de INSERT ... SELECT ... ON CONFLICT no SQLite
+        )
+        return stmt.on_conflict_do_update(
+            index_elements=['user_id'],
+            set_={
+                'total_sessions': stmt.excluded.total_sessions,
+                'score_sum': stmt.excluded.score_sum,
+                'early_scores': stmt.excluded.early_scores,
+                'recent_scores': stmt.excluded.recent_scores,
+                'updated_at': stmt.excluded.updated_at
+            }
+        )
+    
+    def summary(self) -> dict:
+        """
+        Total, média e tendência (últimas notas vs primeiras notas)
+        """
+        total = self.total_sessions or 0
+        early = json.loads(self.early_scores) if self.early_scores else []
+        recent = json.loads(self.recent_scores) if self.recent_scores else []
+        
+        if total >= 2:
+            recent_avg = sum(score for _, score in recent) / len(recent)
+            early_avg = sum(score for _, score in early) / len(early)
+            trend = 'improving' if recent_avg > early_avg else 'stable'
+        else:
+            trend = 'starting'
+        
+        return {
+            'total_sessions': total,
+            'trend': trend,
+            'average_score': self.score_sum / total if total else 0.7
+        }
+
+class BackgroundJob(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    
+    # Identificação da tarefa (idempotência por tipo + chave)
+    job_type = db.Column(db.String(50), nullable=False)  # 'message_analysis', ...
+    job_key = db.Column(db.String(100), nullable=False)  # ex: id da mensagem
+    payload = db.Column(db.Text)  # JSON com os parâmetros da tarefa
+    
+    # Estado da execução
+    status = db.Column(db.String(20), default='pending')  # pending, running, done, failed
+    attempts = db.Column(db.Integer, default=0)
+    last_error = db.Column(db.Text)
+    result = db.Column(db.Text)  # JSON com o resultado
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.UniqueConstraint('job_type', 'job_key', name='uq_background_job_type_key'),
+    )
+    
+    def to_dict(self):
+        return {
+            'job_type': self.job_type,
+            'job_key': self.job_key,
+            'payload': json.loads(self.payload) if self.payload else {},
+            'status': self.status,
+            'attempts': self.attempts or 0,
+            'error': self.last_error,
+            'result': json.loads(self.result) if self.result else None,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+class SchemaMigration(db.Model):
+    __tablename__ = 'schema_migrations'
+    
+    version = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(200), nullable=False)
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -1,91 +1,68 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, stream_with_context
 from datetime import datetime, date
+import os
 import json
-from src.models.user import db, User, Conversation, Message, UserProgress, KnowledgeItem
-from src.services.ai_service import AIConversationService
+import time
+import asyncio
+import hashlib
+import threading
+from typing import Optional
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from src.models.user import db, User, Conversation, Message, UserProgress, KnowledgeItem, KnowledgeStats, \
+    ConversationStarter, UserInsights
+from src.services.async_runtime import run_async
+from src.services.job_queue import job_queue
+from src.services.history_cache import history_cache, HISTORY_WINDOW, HISTORY_MAX_MESSAGES
 
 conversation_bp = Blueprint('conversation', __name__)
-ai_service = AIConversationService()
 
-def run_async(coro):
-    """Helper para executar código assíncrono em contexto síncrono"""
-    import asyncio
-    try:
-        loop = asyncio.get_event_loop()
-    except RuntimeError:
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-    
-    return loop.run_until_complete(coro)
+_ai_service = None
+_ai_service_lock = threading.Lock()
 
-@conversation_bp.route('/users', methods=['POST'])
-def create_user():
+def get_ai_service():
     """
-    Cria um novo usuário
+    Serviço de IA criado no primeiro uso; importar as rotas não carrega o serviço
+    nem suas dependências (pydantic, schemas, cliente dos modelos)
     """
-    try:
-        data = request.get_json()
-        
-        # Verifica se usuário já existe
-        existing_user = User.query.filter_by(username=data['username']).first()
-        if existing_user:
-            return jsonify({'error': 'Username already exists'}), 400
-        
-        # Cria novo usuário
-        user = User(
-            username=data['username'],
-            email=data['email'],
-            english_level=data.get('english_level', 'beginner'),
-            learning_style=json.dumps(data.get('learning_style', {})),
-            interests=json.dumps(data.get('interests', [])),
-            goals=json.dumps(data.get('goals', []))
-        )
-        
-        db.session.add(user)
-        db.session.commit()
-        
-        return jsonify(user.to_dict()), 201
-        
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({'error': str(e)}), 500
+    global _ai_service
+    if _ai_service is None:
+        with _ai_service_lock:
+            if _ai_service is None:
+                from src.services.ai_service import AIConversationService
+                _ai_service = AIConversationService()
+    return _ai_service
 
-@conversation_bp.route('/users/<int:user_id>', methods=['GET'])
-def get_user(user_id):
-    """
-    Obtém dados do usuário
-    """
-    try:
-        user = User.query.get_or_404(user_id)
-        return jsonify(user.to_dict())
-        
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+# Tarefa em segundo plano que analisa a mensagem e atualiza conhecimento/progresso
+MESSAGE_ANALYSIS_JOB = 'message_analysis'
 
-@conversation_bp.route('/users/<int:user_id>', methods=['PUT'])
-def update_user(user_id):
-    """
-    Atualiza perfil do usuário
-    """
-    try:
-        user = User.query.get_or_404(user_id)
-        data = request.get_json()
-        
-        if 'english_level' in data:
-            user.english_level = data['english_level']
-        if 'learning_style' in data:
-            user.learning_style = json.dumps(data['learning_style'])
-        if 'interests' in data:
-            user.interests = json.dumps(data['interests'])
-        if 'goals' in data:
-            user.goals = json.dumps(data['goals'])
-        
-        db.session.commit()
-        return jsonify(user.to_dict())
-        
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({'error': str(e)}), 500
+# Quando ativado, send_message não espera a análise (pode ser sobrescrito por requisição)
+DEFER_MESSAGE_ANALYSIS = os.getenv('DEFER_MESSAGE_ANALYSIS', 'false').lower() == 'true'
+
+# Prazo da análise no streaming, contado do início (o mesmo das chamadas aos modelos);
+# esgotado, a resposta termina e a análise fica para a fila em segundo plano
+STREAM_ANALYSIS_TIMEOUT = float(os.getenv('STREAM_ANALYSIS_TIMEOUT', os.getenv('LLM_REQUEST_TIMEOUT', '60')))
+
+# Tarefa em segundo plano que incorpora mensagens antigas ao resumo da conversa
+CONVERSATION_SUMMARY_JOB = 'conversation_summary'
+
+# Mensagens ainda não resumidas que disparam a atualização do resumo
+# (as HISTORY_WINDOW mais recentes continuam indo literalmente no prompt)
+# Até HISTORY_MAX_MESSAGES, para que toda mensagem não resumida caiba no histórico lido
+SUMMARY_THRESHOLD = min(max(int(os.getenv('SUMMARY_THRESHOLD', '20')), HISTORY_WINDOW + 1), HISTORY_MAX_MESSAGES)
+
+# Máximo de mensagens incorporadas ao resumo por chamada ao modelo
+SUMMARY_MAX_BATCH = int(os.getenv('SUMMARY_MAX_BATCH', '100'))
+
+# Tarefa em segundo plano que regenera os insights quando os dados do usuário mudam
+INSIGHTS_REFRESH_JOB = 'insights_refresh'
+
+# Tarefa em segundo plano que completa o pool de aberturas de conversa do usuário
+STARTER_POOL_JOB = 'starter_pool_refill'
+
+# Tamanho do pool de aberturas e nível abaixo do qual ele é completado
+STARTER_POOL_SIZE = int(os.getenv('STARTER_POOL_SIZE', '5'))
+STARTER_POOL_LOW_WATER = int(os.getenv('STARTER_POOL_LOW_WATER', '2'))
 
 @conversation_bp.route('/users/<int:user_id>/conversations', methods=['POST'])
 def start_conversation(user_id):
@@ -114,14 +91,16 @@ def start_conversation(user_id):
         db.session.add(conversation)
         db.session.commit()
         
-        # Gera mensagem de abertura
-        recent_topics = get_recent_topics(user_id)
-        starter_message = run_async(
-            ai_service.generate_conversation_starter(
-                user.to_dict(), 
-                recent_topics
+        # Abertura pré-gerada do pool; o modelo só é chamado se o pool estiver vazio
+        starter_message = pop_conversation_starter(user)
+        if starter_message is None:
+            recent_topics = get_recent_topics(user_id)
+            starter_message = run_async(
+                get_ai_service().generate_conversation_starter(
+                    user.to_dict(), 
+                    recent_topics
+                )
             )
-        )
         
         # Adiciona mensagem do assistente
         assistant_message = Message(
@@ -133,6 +112,11 @@ def start_conversation(user_id):
         db.session.add(assistant_message)
         db.session.commit()
         
+        history_cache.set(
+            conversation.id,
+            [{'id': assistant_message.id, 'sender': 'assistant', 'content': starter_message}]
+        )
+        
         return jsonify({
             'conversation': conversation.to_dict(),
             'starter_message': assistant_message.to_dict()
@@ -152,6 +136,9 @@ def send_message(conversation_id):
         data = request.get_json()
         user_message_content = data['content']
         
+        # Obtém as mensagens ainda não resumidas da conversa (antes da mensagem atual)
+        conversation_history = load_conversation_history(conversation_id, conversation.summarized_until_id)
+        
         # Salva mensagem do usuário
         user_message = Message(
             conversation_id=conversation_id,
@@ -159,32 +146,66 @@ def send_message(conversation_id):
             content=user_message_content
         )
         
+        # Grava antes de chamar o modelo: uma transação aberta durante a chamada
+        # seguraria o lock de escrita do SQLite e travaria as outras requisições
         db.session.add(user_message)
-        db.session.flush()  # Para obter o ID
-        
-        # Obtém histórico da conversa
-        conversation_history = []
-        messages = Message.query.filter_by(
-            conversation_id=conversation_id
-        ).order_by(Message.timestamp).all()
-        
-        for msg in messages:
-            conversation_history.append(msg.to_dict())
+        db.session.commit()
+        history_cache.append(conversation_id, user_message.id, 'user', user_message_content)
         
         # Gera resposta do assistente
         user = User.query.get(conversation.user_id)
+        
+        # Modo adiado: a análise, o conhecimento e o progresso ficam para a fila em segundo plano
+        if data.get('defer_analysis', DEFER_MESSAGE_ANALYSIS):
+            
+            analysis_job = job_queue.enqueue(
+                MESSAGE_ANALYSIS_JOB,
+                user_message.id,
+                {'message_id': user_message.id, 'user_id': user.id}
+            )
+            
+            try:
+                assistant_response = run_async(
+                    get_ai_service().generate_reply(
+                        user_message_content,
+                        conversation_history,
+                        user.to_dict(),
+                        conversation.summary
+                    )
+                )
+            except Exception as e:
+                print(f"Erro ao gerar resposta: {e}")
+                assistant_response = get_ai_service().fallback_reply
+            
+            assistant_message = Message(
+                conversation_id=conversation_id,
+                sender='assistant',
+                content=assistant_response
+            )
+            
+            db.session.add(assistant_message)
+            db.session.commit()
+            history_cache.append(conversation_id, assistant_message.id, 'assistant', assistant_response)
+            schedule_conversation_summary(conversation_id)
+            
+            return jsonify({
+                'user_message': user_message.to_dict(),
+                'assistant_message': assistant_message.to_dict(),
+                'analysis': None,
+                'analysis_status': analysis_job['status']
+            })
+        
         assistant_response, analysis = run_async(
-            ai_service.generate_response(
+            get_ai_service().generate_response(
                 user_message_content,
                 conversation_history,
-                user.to_dict()
+                user.to_dict(),
+                conversation.summary
             )
         )
         
         # Atualiza análise da mensagem do usuário
-        user_message.grammar_errors = json.dumps(analysis.get('grammar_errors', []))
-        user_message.vocabulary_used = json.dumps(analysis.get('vocabulary_used', []))
-        user_message.confidence_score = analysis.get('confidence_score', 0.7)
+        apply_message_analysis(user_message, user.id, analysis)
         
         # Salva mensagem do assistente
         assistant_message = Message(
@@ -194,15 +215,11 @@ def send_message(conversation_id):
         )
         
         db.session.add(assistant_message)
-        
-        # Atualiza itens de conhecimento
-        update_knowledge_items(user.id, analysis)
-        
-        # Atualiza progresso diário
-        update_daily_progress(user.id, analysis)
-        
         db.session.commit()
         
+        history_cache.append(conversation_id, assistant_message.id, 'assistant', assistant_response)
+        schedule_conversation_summary(conversation_id)
+        
         return jsonify({
             'user_message': user_message.to_dict(),
             'assistant_message': assistant_message.to_dict(),
@@ -213,6 +230,109 @@ def send_message(conversation_id):
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+@conversation_bp.route('/conversations/<int:conversation_id>/messages/stream', methods=['POST'])
+def stream_message(conversation_id):
+    """
+    Envia mensagem na conversa e transmite a resposta token a token (Server-Sent Events)
+    Eventos: token (trecho da resposta), message (mensagem salva), analysis (análise final), done
+    e error (falha; uma resposta interrompida no meio não é salva)
+    Se a análise não termina em STREAM_ANALYSIS_TIMEOUT, done chega sem o evento analysis e com
+    analysis_status; a análise é aplicada pela fila (consultar /messages/<id>/analysis)
+    """
+    try:
+        conversation = Conversation.query.get_or_404(conversation_id)
+        data = request.get_json()
+        user_message_content = data['content']
+        
+        # Obtém as mensagens ainda não resumidas da conversa (antes da mensagem atual)
+        conversation_history = load_conversation_history(conversation_id, conversation.summarized_until_id)
+        
+        # Salva mensagem do usuário
+        user_message = Message(
+            conversation_id=conversation_id,
+            sender='user',
+            content=user_message_content
+        )
+        
+        db.session.add(user_message)
+        db.session.flush()  # Para obter o ID
+        
+        user = User.query.get(conversation.user_id)
+        user_profile = user.to_dict()
+        user_id = user.id
+        conversation_summary = conversation.summary
+        
+        db.session.commit()
+        history_cache.append(conversation_id, user_message.id, 'user', user_message_content)
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+    
+    # A análise roda em paralelo enquanto a resposta é transmitida
+    analysis_future = get_ai_service().start_message_analysis(user_message_content, user_profile)
+    analysis_deadline = time.monotonic() + STREAM_ANALYSIS_TIMEOUT
+    user_message_id = user_message.id
+    
+    def generate():
+        try:
+            yield format_sse('user_message', user_message.to_dict())
+            
+            # Transmite a resposta conforme os tokens chegam (falha após resposta parcial vira evento error)
+            response_parts = []
+            for delta in get_ai_service().stream_response(
+                user_message_content,
+                conversation_history,
+                user_profile,
+                conversation_summary
+            ):
+                response_parts.append(delta)
+                yield format_sse('token', {'content': delta})
+            
+            # Salva a mensagem do assistente quando o streaming termina
+            assistant_response = ''.join(response_parts)
+            assistant_message = Message(
+                conversation_id=conversation_id,
+                sender='assistant',
+                content=assistant_response
+            )
+            
+            db.session.add(assistant_message)
+            db.session.commit()
+            history_cache.append(conversation_id, assistant_message.id, 'assistant', assistant_response)
+            schedule_conversation_summary(conversation_id)
+            
+            yield format_sse('message', assistant_message.to_dict())
+            
+            # Análise enviada como evento final
+            try:
+                analysis = analysis_future.result(timeout=max(0.0, analysis_deadline - time.monotonic()))
+            except FutureTimeoutError:
+                print(f"Análise da mensagem {user_message_id} passou do prazo, enviada para a fila")
+                analysis_job = job_queue.enqueue(
+                    MESSAGE_ANALYSIS_JOB,
+                    user_message_id,
+                    {'message_id': user_message_id, 'user_id': user_id}
+                )
+                yield format_sse('done', {'analysis_status': analysis_job['status']})
+                return
+            
+            apply_message_analysis(Message.query.get(user_message_id), user_id, analysis)
+            db.session.commit()
+            
+            yield format_sse('analysis', analysis)
+            yield format_sse('done', {})
+            
+        except Exception as e:
+            db.session.rollback()
+            yield format_sse('error', {'error': str(e)})
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 @conversation_bp.route('/users/<int:user_id>/conversations', methods=['GET'])
 def get_user_conversations(user_id):
     """
@@ -243,6 +363,47 @@ def get_conversation_messages(conversation_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@conversation_bp.route('/messages/<int:message_id>/analysis', methods=['GET'])
+def get_message_analysis(message_id):
+    """
+    Obtém o estado da análise de uma mensagem (para consulta periódica do frontend)
+    """
+    try:
+        message = Message.query.get_or_404(message_id)
+        job = job_queue.get_status(MESSAGE_ANALYSIS_JOB, message_id)
+        
+        if job and job['status'] == 'done' and job['result'] is not None:
+            return jsonify({'status': 'done', 'analysis': job['result']})
+        
+        if message.vocabulary_used is not None:
+            return jsonify({
+                'status': 'done',
+                'analysis': {
+                    'grammar_errors': json.loads(message.grammar_errors) if message.grammar_errors else [],
+                    'vocabulary_used': json.loads(message.vocabulary_used),
+                    'confidence_score': message.confidence_score
+                }
+            })
+        
+        if not job:
+            # Só mensagens do usuário são analisadas
+            if message.sender != 'user':
+                return jsonify({'status': 'not_found', 'analysis': None}), 404
+            
+            # A tarefa pode estar na fila de outro worker (sem PERSISTENT_JOBS cada processo
+            # só conhece as suas); a mensagem ainda sem análise continua pendente
+            return jsonify({'status': 'pending', 'analysis': None})
+        
+        return jsonify({
+            'status': job['status'],
+            'analysis': None,
+            'attempts': job['attempts'],
+            'error': job['error']
+        })
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @conversation_bp.route('/users/<int:user_id>/progress', methods=['GET'])
 def get_user_progress(user_id):
     """
@@ -281,30 +442,255 @@ def get_user_knowledge(user_id):
 def get_user_insights(user_id):
     """
     Gera insights sobre o progresso do usuário
+    Insights em cache são servidos enquanto a versão dos dados do usuário não muda;
+    quando ela muda, a versão anterior é servida e a atualização roda em segundo plano
+    (cabeçalho X-Insights-Cache: fresh, stale ou miss)
     """
     try:
-        # Busca dados de progresso e conhecimento
-        progress_records = UserProgress.query.filter_by(
-            user_id=user_id
-        ).order_by(UserProgress.date.desc()).limit(14).all()
-        
-        knowledge_items = KnowledgeItem.query.filter_by(
-            user_id=user_id
-        ).all()
+        user = User.query.get_or_404(user_id)
+        data_version = user.data_version or 0
+        cached = db.session.get(UserInsights, user_id)
         
-        # Gera insights
-        insights = run_async(
-            ai_service.generate_progress_insights(
-                [record.to_dict() for record in progress_records],
-                [item.to_dict() for item in knowledge_items]
-            )
-        )
+        if cached:
+            if cached.data_version == data_version:
+                status = 'fresh'
+            else:
+                status = 'stale'
+                job_queue.enqueue(INSIGHTS_REFRESH_JOB, user_id, {'user_id': user_id}, rerun_if_done=True)
+            insights = json.loads(cached.insights)
+        else:
+            status = 'miss'
+            insights = refresh_user_insights(user_id, data_version)
         
-        return jsonify(insights)
+        response = jsonify(insights)
+        response.headers['X-Insights-Cache'] = status
+        return response
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def refresh_user_insights(user_id: int, data_version: int) -> dict:
+    """
+    Gera os insights do usuário e os grava em cache com a versão dos dados lida antes da geração
+    (se os dados mudarem durante a chamada, a próxima leitura agenda outra atualização)
+    """
+    # Busca dados de progresso e conhecimento
+    progress_records = UserProgress.query.filter_by(
+        user_id=user_id
+    ).order_by(UserProgress.date.desc()).limit(14).all()
+    
+    # Resumo do conhecimento a partir dos agregados por tipo
+    knowledge_summary = KnowledgeStats.summarize(user_id)
+    
+    # Gera insights
+    insights, ok = run_async(
+        get_ai_service().generate_progress_insights(
+            [record.to_dict() for record in progress_records],
+            knowledge_summary
+        )
+    )
+    
+    # Insights padrão (falha na chamada ao modelo) não entram no cache
+    if not ok:
+        return insights
+    
+    stmt = sqlite_insert(UserInsights.__table__).values(
+        user_id=user_id,
+        insights=json.dumps(insights),
+        data_version=data_version,
+        generated_at=datetime.utcnow()
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['user_id'],
+        set_={
+            'insights': stmt.excluded.insights,
+            'data_version': stmt.excluded.data_version,
+            'generated_at': stmt.excluded.generated_at
+        },
+        # Uma geração mais lenta não sobrescreve insights de dados mais novos
+        where=UserInsights.__table__.c.data_version <= stmt.excluded.data_version
+    )
+    db.session.execute(stmt)
+    db.session.commit()
+    
+    return insights
+
+def run_insights_refresh_job(payload: dict) -> dict:
+    """
+    Tarefa em segundo plano: regenera os insights se a versão em cache estiver desatualizada
+    """
+    user = User.query.get(payload['user_id'])
+    if not user:
+        return None
+    
+    data_version = user.data_version or 0
+    cached = db.session.get(UserInsights, user.id)
+    if cached and cached.data_version == data_version:
+        return {'data_version': data_version, 'refreshed': False}
+    
+    refresh_user_insights(user.id, data_version)
+    return {'data_version': data_version, 'refreshed': True}
+
+job_queue.register_handler(INSIGHTS_REFRESH_JOB, run_insights_refresh_job)
+
+def starter_profile_key(user: User) -> str:
+    """
+    Hash dos campos do perfil usados no prompt das aberturas (nível e interesses)
+    """
+    interests = json.loads(user.interests) if user.interests else []
+    raw = json.dumps([user.english_level or 'beginner', interests], ensure_ascii=False)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+def pop_conversation_starter(user: User):
+    """
+    Retira a abertura mais antiga do pool do usuário (None se o pool estiver vazio)
+    e agenda a reposição quando o pool fica abaixo de STARTER_POOL_LOW_WATER
+    """
+    profile_key = starter_profile_key(user)
+    
+    # Outra requisição pode retirar a mesma abertura: o DELETE decide quem fica com ela
+    for _ in range(3):
+        starter = ConversationStarter.query.filter_by(
+            user_id=user.id,
+            profile_key=profile_key
+        ).order_by(ConversationStarter.id).first()
+        if starter is None:
+            break
+        
+        deleted = ConversationStarter.query.filter_by(id=starter.id).delete()
+        db.session.commit()
+        if deleted:
+            remaining = ConversationStarter.query.filter_by(user_id=user.id, profile_key=profile_key).count()
+            if remaining < STARTER_POOL_LOW_WATER:
+                schedule_starter_refill(user.id)
+            return starter.content
+    
+    schedule_starter_refill(user.id)
+    return None
+
+def schedule_starter_refill(user_id: int):
+    """
+    Agenda a reposição do pool de aberturas (pedidos repetidos são agrupados)
+    """
+    if STARTER_POOL_SIZE <= 0:
+        return
+    
+    job_queue.enqueue(STARTER_POOL_JOB, user_id, {'user_id': user_id}, rerun_if_done=True)
+
+def run_starter_pool_job(payload: dict) -> dict:
+    """
+    Tarefa em segundo plano: completa o pool de aberturas do usuário até STARTER_POOL_SIZE
+    Aberturas de perfis anteriores são descartadas
+    """
+    user = User.query.get(payload['user_id'])
+    if not user:
+        return None
+    
+    profile_key = starter_profile_key(user)
+    ConversationStarter.query.filter(
+        ConversationStarter.user_id == user.id,
+        ConversationStarter.profile_key != profile_key
+    ).delete()
+    
+    missing = STARTER_POOL_SIZE - ConversationStarter.query.filter_by(
+        user_id=user.id,
+        profile_key=profile_key
+    ).count()
+    profile = user.to_dict()
+    recent_topics = get_recent_topics(user.id)
+    
+    # Libera a escrita no banco antes das chamadas ao modelo
+    db.session.commit()
+    if missing <= 0:
+        return {'generated': 0}
+    
+    async def generate_all():
+        return await asyncio.gather(*[
+            get_ai_service().generate_conversation_starter(profile, recent_topics)
+            for _ in range(missing)
+        ])
+    
+    # Aberturas padrão (falha na chamada ao modelo) e repetidas não entram no pool
+    from src.services.ai_service import DEFAULT_CONVERSATION_STARTER
+    starters = []
+    for starter in run_async(generate_all()):
+        if starter and starter != DEFAULT_CONVERSATION_STARTER and starter not in starters:
+            starters.append(starter)
+    
+    db.session.add_all([
+        ConversationStarter(user_id=user.id, content=starter, profile_key=profile_key)
+        for starter in starters
+    ])
+    db.session.commit()
+    
+    return {'generated': len(starters)}
+
+job_queue.register_handler(STARTER_POOL_JOB, run_starter_pool_job)
+
+def bump_data_version(user_id: int):
+    """
+    Marca que progresso/conhecimento do usuário mudaram (incremento atômico na transação atual)
+    """
+    db.session.execute(
+        db.update(User).where(User.id == user_id).values(
+            data_version=db.func.coalesce(User.data_version, 0) + 1
+        )
+    )
+
+def format_sse(event: str, data) -> str:
+    """
+    Formata um evento no padrão Server-Sent Events
+    """
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def load_conversation_history(conversation_id: int, summarized_until_id: Optional[int] = None,
+                              limit: int = HISTORY_MAX_MESSAGES) -> list:
+    """
+    Obtém as mensagens da conversa ainda não incorporadas ao resumo (id > summarized_until_id),
+    até limit, em ordem cronológica (apenas sender/content); o orçamento de tokens do prompt
+    descarta as mais antigas se não couberem
+    Usa o buffer em memória quando ele ainda contém as últimas mensagens do banco;
+    caso contrário faz uma consulta com LIMIT
+    Os turnos seguintes não leem o conteúdo das mensagens do banco, mas ainda fazem uma
+    consulta por turno: os ids das últimas mensagens, só no índice (conversation_id, timestamp).
+    O buffer é por processo e outro worker pode ter gravado na conversa, então ele não é
+    servido sem essa conferência
+    """
+    window = max(limit, history_cache.window)
+    
+    # Só os ids, lidos do índice (conversation_id, timestamp), para validar o buffer
+    latest_ids = [row.id for row in db.session.query(
+        Message.id
+    ).filter(
+        Message.conversation_id == conversation_id
+    ).order_by(
+        Message.timestamp.desc(),
+        Message.id.desc()
+    ).limit(window)]
+    latest_ids.reverse()
+    
+    messages = history_cache.get(conversation_id, latest_ids)
+    if messages is None:
+        rows = db.session.query(
+            Message.id,
+            Message.sender,
+            Message.content
+        ).filter(
+            Message.conversation_id == conversation_id
+        ).order_by(
+            Message.timestamp.desc(),
+            Message.id.desc()
+        ).limit(window).all()
+        
+        messages = [{'id': row.id, 'sender': row.sender, 'content': row.content} for row in reversed(rows)]
+        history_cache.set(conversation_id, messages)
+    
+    return [
+        {'sender': msg['sender'], 'content': msg['content']}
+        for msg in messages[-limit:]
+        if msg['id'] > (summarized_until_id or 0)
+    ]
+
 def get_recent_topics(user_id: int, days: int = 7) -> list:
     """
     Obtém tópicos recentes discutidos pelo usuário
@@ -331,81 +717,237 @@ def get_recent_topics(user_id: int, days: int = 7) -> list:
         print(f"Erro ao buscar tópicos recentes: {e}")
         return []
 
+def apply_message_analysis(user_message: Message, user_id: int, analysis: dict):
+    """
+    Grava a análise na mensagem do usuário e atualiza conhecimento e progresso diário
+    """
+    user_message.grammar_errors = json.dumps(analysis.get('grammar_errors', []))
+    user_message.vocabulary_used = json.dumps(analysis.get('vocabulary_used', []))
+    user_message.confidence_score = analysis.get('confidence_score', 0.7)
+    
+    # Atualiza itens de conhecimento
+    update_knowledge_items(user_id, analysis)
+    
+    # Atualiza progresso diário
+    update_daily_progress(user_id, analysis)
+
+def run_message_analysis_job(payload: dict) -> dict:
+    """
+    Tarefa em segundo plano: analisa a mensagem do usuário e atualiza conhecimento e progresso
+    Idempotente: mensagens já analisadas não são processadas de novo
+    """
+    user_message = Message.query.get(payload['message_id'])
+    if not user_message:
+        return None
+    
+    if user_message.vocabulary_used is not None:
+        return None
+    
+    user = User.query.get(payload['user_id'])
+    analysis = get_ai_service().analyze_message(user_message.content, user.to_dict())
+    
+    apply_message_analysis(user_message, user.id, analysis)
+    db.session.commit()
+    
+    return analysis
+
+job_queue.register_handler(MESSAGE_ANALYSIS_JOB, run_message_analysis_job)
+
+def schedule_conversation_summary(conversation_id: int):
+    """
+    Agenda a atualização do resumo da conversa (pedidos repetidos são agrupados)
+    """
+    job_queue.enqueue(
+        CONVERSATION_SUMMARY_JOB,
+        conversation_id,
+        {'conversation_id': conversation_id},
+        rerun_if_done=True
+    )
+
+def run_conversation_summary_job(payload: dict) -> dict:
+    """
+    Tarefa em segundo plano: incorpora ao resumo as mensagens que saíram da janela recente
+    Só roda quando há pelo menos SUMMARY_THRESHOLD mensagens ainda não resumidas
+    """
+    conversation = Conversation.query.get(payload['conversation_id'])
+    if not conversation:
+        return None
+    
+    folded = 0
+    while True:
+        rows = db.session.query(
+            Message.id,
+            Message.sender,
+            Message.content
+        ).filter(
+            Message.conversation_id == conversation.id,
+            Message.id > (conversation.summarized_until_id or 0)
+        ).order_by(Message.id).limit(SUMMARY_MAX_BATCH + HISTORY_WINDOW).all()
+        
+        if len(rows) < SUMMARY_THRESHOLD:
+            break
+        
+        # Mantém fora do resumo as mensagens que ainda vão literalmente no prompt
+        to_fold = rows[:-HISTORY_WINDOW]
+        conversation.summary = get_ai_service().summarize_conversation(
+            conversation.summary,
+            [{'sender': row.sender, 'content': row.content} for row in to_fold]
+        )
+        conversation.summarized_until_id = to_fold[-1].id
+        conversation.summary_updated_at = datetime.utcnow()
+        db.session.commit()
+        
+        folded += len(to_fold)
+    
+    return {'messages_summarized': folded, 'summarized_until_id': conversation.summarized_until_id}
+
+job_queue.register_handler(CONVERSATION_SUMMARY_JOB, run_conversation_summary_job)
+
 def update_knowledge_items(user_id: int, analysis: dict):
     """
     Atualiza itens de conhecimento baseado na análise
+    Um único upsert (ON CONFLICT) grava todos os itens; os contadores e o domínio são
+    incrementados no próprio SQL, para que análises concorrentes não percam atualizações
+    Os agregados por tipo (KnowledgeStats) são recalculados na mesma transação
     """
     try:
-        vocabulary_used = analysis.get('vocabulary_used', [])
+        # Ocorrências na ordem da análise: (tipo, conteúdo, dados do vocabulário)
+        occurrences = []
         
-        for vocab_item in vocabulary_used:
+        for vocab_item in analysis.get('vocabulary_used', []):
             word = vocab_item.get('word', '').lower()
-            if not word:
-                continue
-            
-            # Busca item existente
-            existing_item = KnowledgeItem.query.filter_by(
-                user_id=user_id,
-                content=word,
-                item_type='word'
-            ).first()
-            
-            if existing_item:
-                # Atualiza item existente
-                existing_item.times_encountered += 1
-                if vocab_item.get('usage') == 'correct':
-                    existing_item.times_used_correctly += 1
-                
-                # Recalcula nível de domínio
-                accuracy = existing_item.times_used_correctly / existing_item.times_encountered
-                existing_item.mastery_level = min(accuracy * 1.2, 1.0)  # Boost para encorajar
-                existing_item.last_encountered = datetime.utcnow()
-                
-            else:
-                # Cria novo item
-                mastery_level = 0.8 if vocab_item.get('usage') == 'correct' else 0.3
-                
-                new_item = KnowledgeItem(
-                    user_id=user_id,
-                    item_type='word',
-                    content=word,
-                    mastery_level=mastery_level,
-                    times_used_correctly=1 if vocab_item.get('usage') == 'correct' else 0,
-                    difficulty_level=vocab_item.get('level', 'basic'),
-                    topic_category='vocabulary'
-                )
-                
-                db.session.add(new_item)
+            if word:
+                occurrences.append(('word', word, vocab_item))
         
         # Adiciona tópicos mencionados
-        topics_mentioned = analysis.get('topics_mentioned', [])
-        for topic in topics_mentioned:
-            if not topic:
-                continue
-                
-            existing_topic = KnowledgeItem.query.filter_by(
-                user_id=user_id,
-                content=topic.lower(),
-                item_type='topic'
-            ).first()
+        for topic in analysis.get('topics_mentioned', []):
+            if topic:
+                occurrences.append(('topic', topic.lower(), None))
+        
+        if not occurrences:
+            return
+        
+        # Agrupa as ocorrências desta análise por item; os valores iniciais só valem para itens novos
+        items = {}
+        for item_type, content, vocab_item in occurrences:
+            item = items.get((item_type, content))
             
-            if existing_topic:
-                existing_topic.times_encountered += 1
-                existing_topic.mastery_level = min(existing_topic.mastery_level + 0.1, 1.0)
-                existing_topic.last_encountered = datetime.utcnow()
+            if item_type == 'word':
+                used_correctly = vocab_item.get('usage') == 'correct'
+                
+                if item:
+                    item['times_encountered'] += 1
+                    if used_correctly:
+                        item['times_used_correctly'] += 1
+                    
+                    # Recalcula nível de domínio
+                    accuracy = item['times_used_correctly'] / item['times_encountered']
+                    item['mastery_level'] = min(accuracy * 1.2, 1.0)  # Boost para encorajar
+                else:
+                    items[(item_type, content)] = {
+                        'mastery_level': 0.8 if used_correctly else 0.3,
+                        'times_encountered': 1,
+                        'times_used_correctly': 1 if used_correctly else 0,
+                        'difficulty_level': vocab_item.get('level', 'basic'),
+                        'topic_category': 'vocabulary'
+                    }
             else:
-                new_topic = KnowledgeItem(
-                    user_id=user_id,
-                    item_type='topic',
-                    content=topic.lower(),
-                    mastery_level=0.5,
-                    topic_category='conversation_topics'
-                )
-                db.session.add(new_topic)
+                if item:
+                    item['times_encountered'] += 1
+                    item['mastery_level'] = min(item['mastery_level'] + 0.1, 1.0)
+                else:
+                    items[(item_type, content)] = {
+                        'mastery_level': 0.5,
+                        'times_encountered': 1,
+                        'times_used_correctly': 0,
+                        'difficulty_level': None,
+                        'topic_category': 'conversation_topics'
+                    }
+        
+        now = datetime.utcnow()
+        rows = [
+            {
+                'user_id': user_id,
+                'item_type': item_type,
+                'content': content,
+                'mastery_level': item['mastery_level'],
+                'times_encountered': item['times_encountered'],
+                'times_used_correctly': item['times_used_correctly'],
+                'last_encountered': now,
+                'difficulty_level': item.get('difficulty_level'),
+                'topic_category': item.get('topic_category')
+            }
+            for (item_type, content), item in items.items()
+        ]
+        
+        # Upsert em lote apoiado no índice único (user_id, item_type, content)
+        # Em item existente, excluded traz apenas o que esta análise acrescenta
+        table = KnowledgeItem.__table__
+        stmt = sqlite_insert(table)
+        times_encountered = db.func.coalesce(table.c.times_encountered, 0) + stmt.excluded.times_encountered
+        times_used_correctly = db.func.coalesce(table.c.times_used_correctly, 0) + stmt.excluded.times_used_correctly
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['user_id', 'item_type', 'content'],
+            set_={
+                # Palavras: precisão com boost; tópicos: +0.1 por menção (limitado a 1.0)
+                'mastery_level': db.case(
+                    (table.c.item_type == 'word',
+                     db.func.min(times_used_correctly * 1.2 / times_encountered, 1.0)),
+                    else_=db.func.min(
+                        db.func.coalesce(table.c.mastery_level, 0.0) + 0.1 * stmt.excluded.times_encountered,
+                        1.0
+                    )
+                ),
+                'times_encountered': times_encountered,
+                'times_used_correctly': times_used_correctly,
+                'last_encountered': stmt.excluded.last_encountered
+            }
+        )
+        db.session.execute(stmt, rows)
+        
+        update_knowledge_stats(user_id, {item_type for item_type, _ in items}, now)
+        bump_data_version(user_id)
         
     except Exception as e:
         print(f"Erro ao atualizar itens de conhecimento: {e}")
 
+def update_knowledge_stats(user_id: int, item_types: set, now: datetime):
+    """
+    Recalcula os agregados por tipo a partir dos itens de conhecimento, na mesma transação do upsert
+    O upsert dos itens já tem o lock de escrita, então a contagem enxerga o estado gravado por
+    análises concorrentes (diferenças calculadas antes do upsert seriam contadas em dobro)
+    Lê só os itens do usuário nos tipos afetados, pelo índice (user_id, item_type, content)
+    """
+    table = KnowledgeStats.__table__
+    items = KnowledgeItem.__table__
+    
+    select = db.select(
+        items.c.user_id,
+        items.c.item_type,
+        db.func.count(),
+        db.func.sum(db.func.coalesce(items.c.mastery_level, 0.0)),
+        db.func.sum(db.case((items.c.mastery_level >= KnowledgeStats.WELL_MASTERED, 1), else_=0)),
+        db.literal(now)
+    ).where(
+        items.c.user_id == user_id,
+        items.c.item_type.in_(item_types)
+    ).group_by(items.c.user_id, items.c.item_type)
+    
+    stmt = sqlite_insert(table).from_select(
+        ['user_id', 'item_type', 'item_count', 'mastery_sum', 'well_mastered', 'updated_at'],
+        select
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['user_id', 'item_type'],
+        set_={
+            'item_count': stmt.excluded.item_count,
+            'mastery_sum': stmt.excluded.mastery_sum,
+            'well_mastered': stmt.excluded.well_mastered,
+            'updated_at': stmt.excluded.updated_at
+        }
+    )
+    db.session.execute(stmt)
+
 def update_daily_progress(user_id: int, analysis: dict):
     """
     Atualiza progresso diário do usuário
@@ -421,9 +963,15 @@ def update_daily_progress(user_id: int, analysis: dict):
         
         if not progress_record:
             # Cria novo registro
+            # Métricas iniciadas explicitamente: os defaults das colunas só valem no INSERT
             progress_record = UserProgress(
                 user_id=user_id,
-                date=today
+                date=today,
+                vocabulary_score=0.0,
+                grammar_score=0.0,
+                fluency_score=0.0,
+                confidence_score=0.0,
+                messages_sent=0
             )
             db.session.add(progress_record)
         
@@ -462,6 +1010,8 @@ def update_daily_progress(user_id: int, analysis: dict):
             unique_topics = list(set(current_topics))
             progress_record.topics_discussed = json.dumps(unique_topics)
         
+        bump_data_version(user_id)
+        
     except Exception as e:
         print(f"Erro ao atualizar progresso diário: {e}")
 
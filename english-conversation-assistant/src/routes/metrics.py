@@ -0,0 +1,65 @@
+from flask import Blueprint, jsonify
+from src.services.llm_cache import llm_cache
+from src.services.analysis_batcher import batch_metrics
+from src.services.llm_gateway import llm_gateway
+from src.services.prompt_builder import token_usage
+from src.services.response_parser import parse_metrics
+
+metrics_bp = Blueprint('metrics', __name__)
+
+@metrics_bp.route('/metrics/llm-cache', methods=['GET'])
+def get_llm_cache_metrics():
+    """
+    Contadores do cache de respostas dos modelos (acertos, erros, evicções)
+    """
+    try:
+        return jsonify(llm_cache.stats())
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@metrics_bp.route('/metrics/llm-tokens', methods=['GET'])
+def get_llm_token_metrics():
+    """
+    Tokens de prompt e de resposta por método (uso informado pela API ou estimado)
+    'tokenizer' indica como as estimativas são contadas: tiktoken ou aproximada (~4 caracteres por token)
+    """
+    try:
+        return jsonify(token_usage.snapshot())
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@metrics_bp.route('/metrics/llm-parsing', methods=['GET'])
+def get_llm_parsing_metrics():
+    """
+    Resultado do parse das respostas em JSON por método (taxa de falhas, tokens desperdiçados)
+    """
+    try:
+        return jsonify(parse_metrics.snapshot())
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@metrics_bp.route('/metrics/llm-batching', methods=['GET'])
+def get_llm_batching_metrics():
+    """
+    Lotes de análises enviados (tamanho médio, espera na fila, recusas por excesso de pedidos)
+    """
+    try:
+        return jsonify(batch_metrics.snapshot())
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@metrics_bp.route('/metrics/llm-gateway', methods=['GET'])
+def get_llm_gateway_metrics():
+    """
+    Chamadas em andamento, espera por vaga vs tempo no upstream, erros, prazos esgotados e hedges por método;
+    estado do circuit breaker de cada base de API
+    """
+    try:
+        return jsonify(llm_gateway.snapshot())
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
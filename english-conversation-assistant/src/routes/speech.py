@@ -1,22 +1,28 @@
 from flask import Blueprint, request, jsonify
-from datetime import datetime
+from datetime import datetime, timedelta
+from typing import Optional
 import json
-from src.models.user import db, User, Message, Conversation
-from src.services.speech_service import SpeechAnalysisService
+import threading
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from src.models.user import db, User, Message, Conversation, PronunciationScore, PronunciationStats
+from src.services.async_runtime import run_async
 
 speech_bp = Blueprint('speech', __name__)
-speech_service = SpeechAnalysisService()
 
-def run_async(coro):
-    """Helper para executar código assíncrono em contexto síncrono"""
-    import asyncio
-    try:
-        loop = asyncio.get_event_loop()
-    except RuntimeError:
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-    
-    return loop.run_until_complete(coro)
+_speech_service = None
+_speech_service_lock = threading.Lock()
+
+def get_speech_service():
+    """
+    Serviço de análise de fala criado no primeiro uso (não na importação das rotas)
+    """
+    global _speech_service
+    if _speech_service is None:
+        with _speech_service_lock:
+            if _speech_service is None:
+                from src.services.speech_service import SpeechAnalysisService
+                _speech_service = SpeechAnalysisService()
+    return _speech_service
 
 @speech_bp.route('/users/<int:user_id>/pronunciation-analysis', methods=['POST'])
 def analyze_pronunciation(user_id):
@@ -31,12 +37,23 @@ def analyze_pronunciation(user_id):
         if not text:
             return jsonify({'error': 'Text is required'}), 400
         
+        # Mensagem da conversa à qual o feedback se refere (opcional)
+        message = None
+        if data.get('message_id') is not None:
+            message = find_user_message(user_id, data['message_id'])
+            if not message:
+                return jsonify({'error': 'Message not found'}), 404
+        
         # Analisa pronúncia
-        analysis = speech_service.analyze_pronunciation(
+        analysis = get_speech_service().analyze_pronunciation(
             text, 
-            user.english_level
+            user.english_level,
+            bypass_cache=data.get('bypass_cache', False)
         )
         
+        if message:
+            store_pronunciation_feedback(user_id, message, analysis)
+        
         return jsonify(analysis)
         
     except Exception as e:
@@ -48,25 +65,16 @@ def get_speech_patterns(user_id):
     Analisa padrões de fala baseado no histórico de conversas
     """
     try:
-        user = User.query.get_or_404(user_id)
+        User.query.get_or_404(user_id)
         
-        # Busca conversas recentes do usuário
-        recent_conversations = Conversation.query.filter_by(
-            user_id=user_id
-        ).order_by(Conversation.started_at.desc()).limit(5).all()
-        
-        # Coleta mensagens das conversas recentes
-        conversation_history = []
-        for conv in recent_conversations:
-            messages = Message.query.filter_by(
-                conversation_id=conv.id
-            ).order_by(Message.timestamp).all()
-            
-            for msg in messages:
-                conversation_history.append(msg.to_dict())
+        # Últimas mensagens do usuário nas conversas recentes (uma única consulta)
+        conversation_history = load_recent_user_messages(user_id)
         
         # Analisa padrões de fala
-        patterns = speech_service.analyze_speech_patterns(conversation_history)
+        patterns = get_speech_service().analyze_speech_patterns(
+            conversation_history,
+            bypass_cache=request.args.get('bypass_cache', 'false').lower() == 'true'
+        )
         
         return jsonify(patterns)
         
@@ -85,9 +93,10 @@ def get_pronunciation_exercises(user_id):
         difficult_sounds = data.get('difficult_sounds', [])
         
         # Gera exercícios personalizados
-        exercises = speech_service.generate_pronunciation_exercises(
+        exercises = get_speech_service().generate_pronunciation_exercises(
             difficult_sounds,
-            user.english_level
+            user.english_level,
+            bypass_cache=data.get('bypass_cache', False)
         )
         
         return jsonify(exercises)
@@ -110,27 +119,34 @@ def provide_speech_feedback(user_id):
         if not text:
             return jsonify({'error': 'Text is required'}), 400
         
-        # Combina análise de pronúncia com contexto
-        pronunciation_analysis = speech_service.analyze_pronunciation(
-            text, 
-            user.english_level
-        )
+        # Mensagem da conversa à qual o feedback se refere (opcional)
+        message = None
+        if data.get('message_id') is not None:
+            message = find_user_message(user_id, data['message_id'])
+            if not message:
+                return jsonify({'error': 'Message not found'}), 404
         
         # Busca histórico recente para análise de padrões
-        recent_messages = Message.query.filter(
-            Message.conversation_id.in_(
-                db.session.query(Conversation.id).filter_by(user_id=user_id)
-            ),
-            Message.sender == 'user'
-        ).order_by(Message.timestamp.desc()).limit(10).all()
+        conversation_history = load_recent_user_messages(user_id)
         
-        conversation_history = [msg.to_dict() for msg in recent_messages]
-        speech_patterns = speech_service.analyze_speech_patterns(conversation_history)
+        # Análise de pronúncia e de padrões de fala em paralelo, cada uma com tempo limite
+        pronunciation_analysis, speech_patterns, timed_out = run_async(
+            get_speech_service().analyze_speech_feedback(
+                text,
+                user.english_level,
+                conversation_history
+            )
+        )
+        
+        # Análise padrão (tempo esgotado) não entra na série de notas
+        if message and 'pronunciation' not in timed_out:
+            store_pronunciation_feedback(user_id, message, pronunciation_analysis)
         
         # Combina análises para feedback completo
         feedback = {
             'pronunciation': pronunciation_analysis,
             'speech_patterns': speech_patterns,
+            'degraded_analyses': timed_out,
             'overall_assessment': {
                 'strengths': pronunciation_analysis.get('encouragement', ''),
                 'focus_areas': [
@@ -155,55 +171,125 @@ def provide_speech_feedback(user_id):
 def get_pronunciation_progress(user_id):
     """
     Obtém progresso de pronúncia ao longo do tempo
+    Lê a série de notas pré-calculadas (paginada, com filtro opcional por data)
+    e os agregados mantidos a cada feedback gravado
+    Parâmetros: page, per_page (máx. 200), start_date e end_date (AAAA-MM-DD, inclusivos)
+    As páginas vão das notas mais recentes para as mais antigas (a página 1 traz as últimas
+    per_page); dentro da página progress_data segue em ordem cronológica, como antes da paginação
     """
     try:
         user = User.query.get_or_404(user_id)
         
-        # Busca mensagens com feedback de pronúncia
-        messages_with_feedback = Message.query.filter(
-            Message.conversation_id.in_(
-                db.session.query(Conversation.id).filter_by(user_id=user_id)
-            ),
-            Message.sender == 'user',
-            Message.pronunciation_feedback.isnot(None)
-        ).order_by(Message.timestamp).all()
-        
-        progress_data = []
-        for msg in messages_with_feedback:
-            try:
-                feedback = json.loads(msg.pronunciation_feedback)
-                progress_data.append({
-                    'date': msg.timestamp.isoformat(),
-                    'overall_score': feedback.get('overall_score', 0.7),
-                    'difficult_sounds': len(feedback.get('sound_focus_areas', [])),
-                    'confidence_score': msg.confidence_score or 0.7,
-                    'text_length': len(msg.content),
-                    'improvements': feedback.get('encouragement', '')
-                })
-            except (json.JSONDecodeError, AttributeError):
-                continue
-        
-        # Calcula tendências
-        if len(progress_data) >= 2:
-            recent_avg = sum(item['overall_score'] for item in progress_data[-5:]) / min(5, len(progress_data))
-            early_avg = sum(item['overall_score'] for item in progress_data[:5]) / min(5, len(progress_data))
-            trend = 'improving' if recent_avg > early_avg else 'stable'
-        else:
-            trend = 'starting'
+        try:
+            page = max(1, int(request.args.get('page', 1)))
+            per_page = min(200, max(1, int(request.args.get('per_page', 50))))
+            start_date = parse_date_arg('start_date')
+            end_date = parse_date_arg('end_date')
+        except ValueError as e:
+            return jsonify({'error': f'Invalid query parameter: {e}'}), 400
+        
+        query = PronunciationScore.query.filter(PronunciationScore.user_id == user_id)
+        if start_date:
+            query = query.filter(PronunciationScore.recorded_at >= start_date)
+        if end_date:
+            query = query.filter(PronunciationScore.recorded_at < end_date + timedelta(days=1))
+        
+        # Uma linha a mais indica se há próxima página, sem COUNT sobre a série inteira
+        scores = query.order_by(
+            PronunciationScore.recorded_at.desc(), PronunciationScore.id.desc()
+        ).offset((page - 1) * per_page).limit(per_page + 1).all()
+        
+        has_more = len(scores) > per_page
+        progress_data = [score.to_dict() for score in reversed(scores[:per_page])]
+        
+        stats = db.session.get(PronunciationStats, user_id)
+        summary = stats.summary() if stats else PronunciationStats().summary()
         
         return jsonify({
             'progress_data': progress_data,
+            'pagination': {
+                'page': page,
+                'per_page': per_page,
+                'has_more': has_more
+            },
             'summary': {
-                'total_sessions': len(progress_data),
-                'trend': trend,
-                'current_level': user.english_level,
-                'average_score': sum(item['overall_score'] for item in progress_data) / len(progress_data) if progress_data else 0.7
+                **summary,
+                'current_level': user.english_level
             }
         })
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def parse_date_arg(name: str) -> Optional[datetime]:
+    """
+    Lê um parâmetro de data (AAAA-MM-DD) da query string
+    """
+    value = request.args.get(name)
+    return datetime.strptime(value, '%Y-%m-%d') if value else None
+
+def find_user_message(user_id: int, message_id) -> Optional[Message]:
+    """
+    Mensagem enviada pelo usuário (None se não existir ou pertencer a outro usuário)
+    """
+    return Message.query.join(
+        Conversation, Message.conversation_id == Conversation.id
+    ).filter(
+        Message.id == message_id,
+        Message.sender == 'user',
+        Conversation.user_id == user_id
+    ).first()
+
+def store_pronunciation_feedback(user_id: int, message: Message, analysis: dict):
+    """
+    Grava o feedback de pronúncia na mensagem, a nota na série temporal do usuário
+    e recalcula os agregados em SQL na mesma transação
+    """
+    try:
+        message.pronunciation_feedback = json.dumps(analysis)
+        
+        # Upsert pela mensagem: um novo feedback da mesma mensagem substitui a nota
+        values = {
+            'overall_score': float(analysis.get('overall_score', 0.7)),
+            'difficult_sounds': len(analysis.get('sound_focus_areas', [])),
+            'confidence_score': message.confidence_score,
+            'text_length': len(message.content),
+            'improvements': analysis.get('encouragement', '')
+        }
+        stmt = sqlite_insert(PronunciationScore).values(
+            user_id=user_id,
+            message_id=message.id,
+            recorded_at=message.timestamp,
+            **values
+        )
+        db.session.execute(stmt.on_conflict_do_update(index_elements=['message_id'], set_=values))
+        
+        db.session.execute(PronunciationStats.refresh_statement(user_id))
+        db.session.commit()
+        
+    except Exception as e:
+        db.session.rollback()
+        print(f"Erro ao gravar feedback de pronúncia: {e}")
+
+def load_recent_user_messages(user_id: int, limit: int = 10, conversations: int = 5) -> list:
+    """
+    Últimas mensagens enviadas pelo usuário nas suas conversas mais recentes
+    Uma consulta com join, projetando apenas o conteúdo; retorna em ordem cronológica
+    """
+    recent_conversations = db.session.query(Conversation.id).filter(
+        Conversation.user_id == user_id
+    ).order_by(Conversation.started_at.desc()).limit(conversations)
+    
+    rows = db.session.query(Message.content).join(
+        Conversation, Message.conversation_id == Conversation.id
+    ).filter(
+        Conversation.user_id == user_id,
+        Conversation.id.in_(recent_conversations),
+        Message.sender == 'user'
+    ).order_by(Message.timestamp.desc(), Message.id.desc()).limit(limit).all()
+    
+    return [{'sender': 'user', 'content': row.content} for row in reversed(rows)]
+
 def generate_personalized_tips(pronunciation_analysis: dict, speech_patterns: dict, user_level: str) -> list:
     """
     Gera dicas personalizadas baseadas nas análises
@@ -1,5 +1,7 @@
+import json
 from flask import Blueprint, jsonify, request
-from src.models.user import User, db
+from src.models.user import User, ConversationStarter, db
+from src.routes.conversation import schedule_starter_refill, starter_profile_key
 
 user_bp = Blueprint('user', __name__)
 
@@ -12,9 +14,19 @@ def get_users():
 def create_user():
     
     data = request.json
-    user = User(username=data['username'], email=data['email'])
+    user = User(
+        username=data['username'],
+        email=data['email'],
+        english_level=data.get('english_level', 'beginner'),
+        learning_style=json.dumps(data.get('learning_style', {})),
+        interests=json.dumps(data.get('interests', [])),
+        goals=json.dumps(data.get('goals', []))
+    )
     db.session.add(user)
     db.session.commit()
+    
+    # Pool de aberturas de conversa gerado em segundo plano
+    schedule_starter_refill(user.id)
     return jsonify(user.to_dict()), 201
 
 @user_bp.route('/users/<int:user_id>', methods=['GET'])
@@ -26,9 +38,28 @@ def get_user(user_id):
 def update_user(user_id):
     user = User.query.get_or_404(user_id)
     data = request.json
+    previous_profile_key = starter_profile_key(user)
+    
     user.username = data.get('username', user.username)
     user.email = data.get('email', user.email)
+    if 'english_level' in data:
+        user.english_level = data['english_level']
+    if 'learning_style' in data:
+        user.learning_style = json.dumps(data['learning_style'])
+    if 'interests' in data:
+        user.interests = json.dumps(data['interests'])
+    if 'goals' in data:
+        user.goals = json.dumps(data['goals'])
+    
+    # Aberturas geradas para o perfil anterior deixam de servir
+    profile_changed = starter_profile_key(user) != previous_profile_key
+    if profile_changed:
+        ConversationStarter.query.filter_by(user_id=user_id).delete()
+    
     db.session.commit()
+    
+    if profile_changed:
+        schedule_starter_refill(user_id)
     return jsonify(user.to_dict())
 
 @user_bp.route('/users/<int:user_id>', methods=['DELETE'])
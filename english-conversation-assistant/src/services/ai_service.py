@@ -1,139 +1,555 @@
 import os
 import json
-import re
-from typing import Dict, List, Tuple, Optional
-from openai import OpenAI
+import asyncio
+import functools
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Iterator, List, Tuple, Optional
 from datetime import datetime
+from src.services.llm_cache import llm_cache
+from src.services.llm_gateway import llm_gateway
+from src.services.analysis_batcher import MicroBatcher
+from src.services.prompt_builder import PromptTemplate, PromptBuilder, token_usage
+from src.services.response_parser import json_mode_kwargs, parse_structured_response
+from src.services.response_schemas import CombinedResponse, MessageAnalysis, MessageAnalysisBatch, ProgressInsights
+
+# Prompts normalizados uma única vez na importação; campos variáveis entre chaves
+SYSTEM_PROMPT = PromptTemplate('system', """
+You are an enthusiastic, friendly, and encouraging English conversation partner and teacher.
+Your personality is warm, patient, and genuinely caring about the user's progress. You should:
+
+1. Be conversational and natural, like talking to a good friend
+2. Ask engaging follow-up questions to keep conversations flowing
+3. Gently correct mistakes in a positive, encouraging way
+4. Celebrate small victories and progress
+5. Use humor appropriately to make learning fun
+6. Adapt your language level to match the user's proficiency
+7. Show genuine interest in the user's life, hobbies, and experiences
+8. Provide constructive feedback that builds confidence
+9. Suggest topics based on the user's interests and learning goals
+10. Be patient and never make the user feel judged or embarrassed
+
+Always respond in a way that encourages continued conversation and learning.
+Keep responses natural and conversational, not overly formal or teacher-like.
+""")
+
+MESSAGE_ANALYSIS_PROMPT = PromptTemplate('message_analysis', """
+Analyze this English message from a language learner and provide feedback in JSON format:
+
+Message: "{message}"
+User Level: {user_level}
+
+Please analyze and return a JSON object with:
+{{
+    "grammar_errors": [
+        {{"error": "specific error", "correction": "correct form", "explanation": "brief explanation"}}
+    ],
+    "vocabulary_used": [
+        {{"word": "word", "level": "basic/intermediate/advanced", "usage": "correct/incorrect"}}
+    ],
+    "fluency_indicators": {{
+        "sentence_complexity": "simple/moderate/complex",
+        "coherence": "good/fair/poor",
+        "natural_flow": "natural/somewhat_natural/awkward"
+    }},
+    "confidence_score": 0.0-1.0,
+    "positive_aspects": ["list of things done well"],
+    "suggestions": ["gentle suggestions for improvement"],
+    "topics_mentioned": ["topics discussed in the message"]
+}}
+
+Be encouraging and focus on progress, not just errors.
+""")
+
+MESSAGE_ANALYSIS_BATCH_PROMPT = PromptTemplate('message_analysis_batch', """
+Analyze each of these English messages from language learners and provide feedback in JSON format.
+Each item has an id, the message and the learner's level:
+
+{items}
+
+Return a JSON object with exactly one analysis per item, using the item's id:
+{{
+    "analyses": [
+        {{
+            "id": 0,
+            "grammar_errors": [
+                {{"error": "specific error", "correction": "correct form", "explanation": "brief explanation"}}
+            ],
+            "vocabulary_used": [
+                {{"word": "word", "level": "basic/intermediate/advanced", "usage": "correct/incorrect"}}
+            ],
+            "fluency_indicators": {{
+                "sentence_complexity": "simple/moderate/complex",
+                "coherence": "good/fair/poor",
+                "natural_flow": "natural/somewhat_natural/awkward"
+            }},
+            "confidence_score": 0.0-1.0,
+            "positive_aspects": ["list of things done well"],
+            "suggestions": ["gentle suggestions for improvement"],
+            "topics_mentioned": ["topics discussed in the message"]
+        }}
+    ]
+}}
+
+Analyze every message on its own and match the feedback to that learner's level.
+Be encouraging and focus on progress, not just errors.
+""")
+
+CONVERSATION_SUMMARY_PROMPT = PromptTemplate('conversation_summary', """
+You are keeping a running summary of an English conversation practice session.
+
+Current summary: {previous_summary}
+
+New messages to incorporate:
+{transcript}
+
+Write an updated summary in at most 150 words. Keep the topics discussed, personal
+details the learner shared, questions left open and recurring mistakes worth
+revisiting. Write it as plain prose, without lists or headings.
+""")
+
+CONVERSATION_STARTER_PROMPT = PromptTemplate('conversation_starter', """
+Generate a friendly, engaging conversation starter for an English language learner.
+
+User Level: {level}
+User Interests: {interests}
+Recent Topics Discussed: {recent_topics}
+
+Create a natural, friendly question or comment that:
+1. Matches their English level
+2. Relates to their interests when possible
+3. Avoids recently discussed topics
+4. Encourages them to share and practice English
+5. Sounds like something a friend would ask
+
+Keep it conversational and warm, like greeting a good friend.
+""")
+
+PROGRESS_INSIGHTS_PROMPT = PromptTemplate('progress_insights', """
+Analyze this English learner's progress and provide encouraging insights:
+
+Progress Summary: {progress_summary}
+Knowledge Summary: {knowledge_summary}
+
+Provide a JSON response with:
+{{
+    "overall_progress": "description of overall progress",
+    "strengths": ["list of identified strengths"],
+    "areas_for_improvement": ["gentle suggestions for improvement"],
+    "achievements": ["recent achievements to celebrate"],
+    "next_goals": ["suggested next learning goals"],
+    "motivation_message": "encouraging message",
+    "learning_recommendations": ["specific recommendations"]
+}}
+
+Be very encouraging and focus on progress made, not just areas to improve.
+""")
+
+# Prefixo estático do modo combinado: personalidade + formato da resposta com a análise
+COMBINED_SYSTEM_PROMPT = PromptTemplate('system_combined', SYSTEM_PROMPT.text + """
+
+Besides replying, analyze the learner's latest message. Answer with a single JSON object
+and no text around it, writing the reply first:
+{{
+    "reply": "your natural, conversational reply to the learner",
+    "analysis": {{
+        "grammar_errors": [
+            {{"error": "specific error", "correction": "correct form", "explanation": "brief explanation"}}
+        ],
+        "vocabulary_used": [
+            {{"word": "word", "level": "basic/intermediate/advanced", "usage": "correct/incorrect"}}
+        ],
+        "fluency_indicators": {{
+            "sentence_complexity": "simple/moderate/complex",
+            "coherence": "good/fair/poor",
+            "natural_flow": "natural/somewhat_natural/awkward"
+        }},
+        "confidence_score": 0.0-1.0,
+        "positive_aspects": ["list of things done well"],
+        "suggestions": ["gentle suggestions for improvement"],
+        "topics_mentioned": ["topics discussed in the message"]
+    }}
+}}
+
+The analysis covers only the learner's latest message and is never mentioned in the reply.
+Be encouraging and focus on progress, not just errors.
+""")
+
+# Abertura usada quando o modelo não responde
+DEFAULT_CONVERSATION_STARTER = "Hey there! How's your day going? I'd love to hear what you've been up to!"
+
+# Micro-batching das análises de mensagem (desativado por padrão: muda o prompt enviado)
+# Pedidos que chegam em ANALYSIS_BATCH_WINDOW_MS (ou até ANALYSIS_BATCH_MAX_ITEMS)
+# vão em uma única chamada; o orçamento de resposta cresce com o número de itens
+ANALYSIS_BATCH_ENABLED = os.getenv('ANALYSIS_BATCH_ENABLED', 'false').lower() == 'true'
+ANALYSIS_BATCH_WINDOW_MS = float(os.getenv('ANALYSIS_BATCH_WINDOW_MS', '20'))
+ANALYSIS_BATCH_MAX_ITEMS = int(os.getenv('ANALYSIS_BATCH_MAX_ITEMS', '16'))
+ANALYSIS_BATCH_MAX_PENDING = int(os.getenv('ANALYSIS_BATCH_MAX_PENDING', '256'))
+ANALYSIS_BATCH_MAX_INFLIGHT = int(os.getenv('ANALYSIS_BATCH_MAX_INFLIGHT', '4'))
+ANALYSIS_BATCH_ITEM_TOKENS = int(os.getenv('ANALYSIS_BATCH_ITEM_TOKENS', '350'))
+
+# 'separate': resposta e análise em duas chamadas paralelas
+# 'combined': uma única chamada devolve resposta e análise em JSON
+RESPONSE_MODES = ('separate', 'combined')
 
 class AIConversationService:
-    def __init__(self):
-        self.client = OpenAI(
-            api_key=os.getenv('OPENAI_API_KEY'),
-            base_url=os.getenv('OPENAI_API_BASE')
+    # Versões dos prompts cacheáveis (incrementar ao alterar o texto do prompt)
+    PROMPT_VERSIONS = {
+        'message_analysis': 2
+    }
+    
+    def __init__(self, response_mode: Optional[str] = None, analysis_batching: Optional[bool] = None,
+                 batch_window_ms: Optional[float] = None):
+        # Pool limitado de threads para executar o cliente síncrono sem bloquear o event loop
+        self.executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv('AI_SERVICE_MAX_WORKERS', '8')),
+            thread_name_prefix='ai-service'
         )
         
-        # Personalidade do assistente
-        self.system_prompt = """
-        You are an enthusiastic, friendly, and encouraging English conversation partner and teacher. 
-        Your personality is warm, patient, and genuinely caring about the user's progress. You should:
-        
-        1. Be conversational and natural, like talking to a good friend
-        2. Ask engaging follow-up questions to keep conversations flowing
-        3. Gently correct mistakes in a positive, encouraging way
-        4. Celebrate small victories and progress
-        5. Use humor appropriately to make learning fun
-        6. Adapt your language level to match the user's proficiency
-        7. Show genuine interest in the user's life, hobbies, and experiences
-        8. Provide constructive feedback that builds confidence
-        9. Suggest topics based on the user's interests and learning goals
-        10. Be patient and never make the user feel judged or embarrassed
-        
-        Always respond in a way that encourages continued conversation and learning.
-        Keep responses natural and conversational, not overly formal or teacher-like.
-        """
+        # Resposta usada quando a API não responde
+        self.fallback_reply = "I'm sorry, I'm having some technical difficulties. Could you try again?"
+        
+        # Personalidade do assistente (prefixo estático do prompt de resposta)
+        self.system_prompt = SYSTEM_PROMPT.render()
+        self.prompt_builder = PromptBuilder(SYSTEM_PROMPT)
+        self.combined_prompt_builder = PromptBuilder(COMBINED_SYSTEM_PROMPT)
+        
+        # Modo de geração usado por generate_response (por implantação: AI_RESPONSE_MODE)
+        self.response_mode = response_mode or os.getenv('AI_RESPONSE_MODE', 'separate')
+        if self.response_mode not in RESPONSE_MODES:
+            print(f"Modo de resposta desconhecido '{self.response_mode}', usando 'separate'")
+            self.response_mode = 'separate'
+        
+        # Agrupa análises de mensagens de usuários diferentes em uma chamada
+        if analysis_batching is None:
+            analysis_batching = ANALYSIS_BATCH_ENABLED
+        self.analysis_batcher = MicroBatcher(
+            'message_analysis',
+            self._analyze_batch,
+            window_ms=batch_window_ms if batch_window_ms is not None else ANALYSIS_BATCH_WINDOW_MS,
+            max_items=ANALYSIS_BATCH_MAX_ITEMS,
+            max_pending=ANALYSIS_BATCH_MAX_PENDING,
+            max_inflight=ANALYSIS_BATCH_MAX_INFLIGHT
+        ) if analysis_batching else None
     
     async def generate_response(self, user_message: str, conversation_history: List[Dict], 
-                              user_profile: Dict) -> Tuple[str, Dict]:
+                              user_profile: Dict, conversation_summary: Optional[str] = None) -> Tuple[str, Dict]:
         """
         Gera resposta do assistente baseada na mensagem do usuário e histórico
+        No modo 'separate' a resposta e a análise da mensagem são executadas em paralelo;
+        no modo 'combined' as duas vêm de uma única chamada
         Retorna: (resposta, análise_da_mensagem)
         """
         try:
-            # Prepara o contexto da conversa
-            messages = [{"role": "system", "content": self.system_prompt}]
-            
-            # Adiciona contexto do perfil do usuário
-            profile_context = self._build_profile_context(user_profile)
-            if profile_context:
-                messages.append({"role": "system", "content": profile_context})
-            
-            # Adiciona histórico da conversa (últimas 10 mensagens)
-            for msg in conversation_history[-10:]:
-                messages.append({
-                    "role": "user" if msg["sender"] == "user" else "assistant",
-                    "content": msg["content"]
-                })
+            if self.response_mode == 'combined':
+                return await self._generate_combined_response(
+                    user_message, conversation_history, user_profile, conversation_summary
+                )
             
-            # Adiciona mensagem atual
-            messages.append({"role": "user", "content": user_message})
+            return await self._generate_separate_response(
+                user_message, conversation_history, user_profile, conversation_summary
+            )
             
-            # Gera resposta
-            response = self.client.chat.completions.create(
-                model="gpt-4",
+        except Exception as e:
+            print(f"Erro ao gerar resposta: {e}")
+            return self.fallback_reply, {}
+    
+    async def _generate_separate_response(self, user_message: str, conversation_history: List[Dict], 
+                                          user_profile: Dict, conversation_summary: Optional[str] = None) -> Tuple[str, Dict]:
+        """
+        Resposta e análise em duas chamadas paralelas
+        """
+        assistant_response, analysis = await asyncio.gather(
+            self.generate_reply(user_message, conversation_history, user_profile, conversation_summary),
+            self._analyze_user_message(user_message, user_profile)
+        )
+        
+        return assistant_response, analysis
+    
+    async def _generate_combined_response(self, user_message: str, conversation_history: List[Dict], 
+                                          user_profile: Dict, conversation_summary: Optional[str] = None) -> Tuple[str, Dict]:
+        """
+        Resposta e análise em uma única chamada com saída JSON
+        O prefixo de sistema, o histórico e a mensagem são enviados (e cobrados) uma só vez
+        """
+        # Análise já cacheada: basta gerar a resposta
+        cached = llm_cache.get(self._analysis_cache_key(user_message, user_profile))
+        if cached is not None:
+            reply = await self.generate_reply(
+                user_message, conversation_history, user_profile, conversation_summary
+            )
+            return reply, cached
+        
+        response = await self._run_blocking(
+            self._create_completion,
+            'reply_with_analysis',
+            messages=self.combined_prompt_builder.build(
+                user_message,
+                conversation_history,
+                self._build_profile_context(user_profile),
+                conversation_summary
+            ),
+            temperature=0.7,
+            max_tokens=800,
+            **json_mode_kwargs()
+        )
+        
+        data, _ = parse_structured_response('reply_with_analysis', response, CombinedResponse)
+        if data is None or not data['reply'].strip():
+            # Sem resposta aproveitável: recorre às duas chamadas separadas
+            return await self._generate_separate_response(
+                user_message, conversation_history, user_profile, conversation_summary
+            )
+        
+        return data['reply'], data['analysis']
+    
+    def start_message_analysis(self, user_message: str, user_profile: Dict) -> Future:
+        """
+        Inicia a análise da mensagem no pool de threads e retorna o Future correspondente
+        """
+        return self.executor.submit(self._analyze_user_message_sync, user_message, user_profile)
+    
+    def stream_response(self, user_message: str, conversation_history: List[Dict], 
+                        user_profile: Dict, conversation_summary: Optional[str] = None) -> Iterator[str]:
+        """
+        Gera a resposta do assistente token a token (stream=True)
+        Retorna um iterador com os trechos de texto na ordem em que chegam
+        Se a chamada falha antes do primeiro trecho, retorna a resposta padrão; depois
+        de uma resposta parcial a exceção é propagada (a resposta não pode ser completada)
+        """
+        parts = []
+        try:
+            messages = self._build_reply_messages(
+                user_message, conversation_history, user_profile, conversation_summary
+            )
+            stream = llm_gateway.stream_completion(
+                'reply_stream',
                 messages=messages,
                 temperature=0.8,
-                max_tokens=300
+                max_tokens=300,
+                stream_options={"include_usage": True}
             )
             
-            assistant_response = response.choices[0].message.content
-            
-            # Analisa a mensagem do usuário
-            analysis = await self._analyze_user_message(user_message, user_profile)
-            
-            return assistant_response, analysis
+            # O uso de tokens chega no último chunk (sem choices)
+            usage_chunk = None
+            for chunk in stream:
+                if getattr(chunk, 'usage', None) is not None:
+                    usage_chunk = chunk
+                if not chunk.choices:
+                    continue
+                
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    parts.append(delta)
+                    yield delta
             
+            token_usage.record_response('reply_stream', messages, usage_chunk, ''.join(parts))
+                    
         except Exception as e:
-            print(f"Erro ao gerar resposta: {e}")
-            return "I'm sorry, I'm having some technical difficulties. Could you try again?", {}
+            print(f"Erro ao gerar resposta em streaming: {e}")
+            if parts:
+                raise
+            yield self.fallback_reply
+    
+    async def generate_reply(self, user_message: str, conversation_history: List[Dict], 
+                            user_profile: Dict, conversation_summary: Optional[str] = None) -> str:
+        """
+        Gera apenas a resposta conversacional do assistente
+        """
+        response = await self._run_blocking(
+            self._create_completion,
+            'reply',
+            messages=self._build_reply_messages(
+                user_message, conversation_history, user_profile, conversation_summary
+            ),
+            temperature=0.8,
+            max_tokens=300
+        )
+        
+        return response.choices[0].message.content
+    
+    def _build_reply_messages(self, user_message: str, conversation_history: List[Dict], 
+                              user_profile: Dict, conversation_summary: Optional[str] = None) -> List[Dict]:
+        """
+        Monta a lista de mensagens enviada ao modelo para gerar a resposta
+        """
+        # Prompt de sistema fixo, perfil, resumo, histórico (mensagens ainda não
+        # resumidas, cortado pelo orçamento de tokens) e mensagem atual
+        return self.prompt_builder.build(
+            user_message,
+            conversation_history,
+            self._build_profile_context(user_profile),
+            conversation_summary
+        )
+    
+    def _create_completion(self, method: str, **kwargs):
+        """
+        Chama a API de chat pelo gateway compartilhado (limites, prazo e uso de tokens por método)
+        """
+        return llm_gateway.create_completion(method, **kwargs)
     
-    async def _analyze_user_message(self, message: str, user_profile: Dict) -> Dict:
+    async def _run_blocking(self, func, *args, **kwargs):
+        """
+        Executa uma chamada síncrona (ex: cliente OpenAI) no pool de threads do serviço
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor, functools.partial(func, *args, **kwargs)
+        )
+    
+    async def _analyze_user_message(self, message: str, user_profile: Dict, 
+                                    bypass_cache: bool = False) -> Dict:
         """
         Analisa a mensagem do usuário para identificar padrões, erros e progresso
+        Com micro-batching a espera pelo lote não ocupa uma thread do pool
         """
-        try:
-            analysis_prompt = f"""
-            Analyze this English message from a language learner and provide feedback in JSON format:
-            
-            Message: "{message}"
-            User Level: {user_profile.get('english_level', 'beginner')}
-            
-            Please analyze and return a JSON object with:
-            {{
-                "grammar_errors": [
-                    {{"error": "specific error", "correction": "correct form", "explanation": "brief explanation"}}
-                ],
-                "vocabulary_used": [
-                    {{"word": "word", "level": "basic/intermediate/advanced", "usage": "correct/incorrect"}}
-                ],
-                "fluency_indicators": {{
-                    "sentence_complexity": "simple/moderate/complex",
-                    "coherence": "good/fair/poor",
-                    "natural_flow": "natural/somewhat_natural/awkward"
-                }},
-                "confidence_score": 0.0-1.0,
-                "positive_aspects": ["list of things done well"],
-                "suggestions": ["gentle suggestions for improvement"],
-                "topics_mentioned": ["topics discussed in the message"]
-            }}
-            
-            Be encouraging and focus on progress, not just errors.
-            """
-            
-            response = self.client.chat.completions.create(
-                model="gpt-4",
-                messages=[{"role": "user", "content": analysis_prompt}],
-                temperature=0.3,
-                max_tokens=500
+        if self.analysis_batcher is None:
+            return await self._run_blocking(
+                self._analyze_user_message_sync, message, user_profile, bypass_cache=bypass_cache
             )
+        
+        cache_key = self._analysis_cache_key(message, user_profile)
+        cached = self._get_cached_analysis(cache_key, bypass_cache)
+        if cached is not None:
+            return cached
+        
+        try:
+            return await asyncio.wrap_future(self.analysis_batcher.submit(
+                (message, user_profile.get('english_level', 'beginner'), cache_key)
+            ))
+        except Exception as e:
+            print(f"Erro na análise da mensagem: {e}")
+            return self._default_analysis()
+    
+    def analyze_message(self, message: str, user_profile: Dict, bypass_cache: bool = False) -> Dict:
+        """
+        Analisa a mensagem de forma síncrona propagando erros da API
+        Usado pelas tarefas em segundo plano, que fazem suas próprias novas tentativas
+        """
+        return self._analyze_user_message_sync(
+            message, user_profile, raise_errors=True, bypass_cache=bypass_cache
+        )
+    
+    def _analyze_user_message_sync(self, message: str, user_profile: Dict, 
+                                   raise_errors: bool = False, bypass_cache: bool = False) -> Dict:
+        """
+        Versão síncrona da análise, executada no pool de threads do serviço
+        Resultados são cacheados por (versão do prompt, modelo, temperatura, mensagem, nível)
+        """
+        cache_key = self._analysis_cache_key(message, user_profile)
+        cached = self._get_cached_analysis(cache_key, bypass_cache)
+        if cached is not None:
+            return cached
+        
+        user_level = user_profile.get('english_level', 'beginner')
+        
+        try:
+            if self.analysis_batcher is not None:
+                return self.analysis_batcher.submit((message, user_level, cache_key)).result()
             
-            analysis_text = response.choices[0].message.content
-            
-            # Tenta extrair JSON da resposta
-            try:
-                # Remove markdown code blocks se presentes
-                json_match = re.search(r'```json\s*(.*?)\s*```', analysis_text, re.DOTALL)
-                if json_match:
-                    analysis_text = json_match.group(1)
-                
-                analysis = json.loads(analysis_text)
-                return analysis
-            except json.JSONDecodeError:
-                print(f"Erro ao parsear análise JSON: {analysis_text}")
-                return self._default_analysis()
+            return self._request_analysis(message, user_level, cache_key)
                 
         except Exception as e:
             print(f"Erro na análise da mensagem: {e}")
+            if raise_errors:
+                raise
+            return self._default_analysis()
+    
+    def _get_cached_analysis(self, cache_key: str, bypass_cache: bool) -> Optional[Dict]:
+        """
+        Análise cacheada (None em caso de miss ou se o cache for ignorado)
+        """
+        if bypass_cache:
+            llm_cache.record_bypass()
+            return None
+        
+        return llm_cache.get(cache_key)
+    
+    def _request_analysis(self, message: str, user_level: str, cache_key: str) -> Dict:
+        """
+        Analisa uma única mensagem em uma chamada ao modelo (erros da API são propagados)
+        """
+        analysis_prompt = MESSAGE_ANALYSIS_PROMPT.render(
+            message=message,
+            user_level=user_level
+        )
+        
+        response = self._create_completion(
+            'message_analysis',
+            messages=[{"role": "user", "content": analysis_prompt}],
+            temperature=0.3,
+            max_tokens=500,
+            **json_mode_kwargs()
+        )
+        
+        analysis, repaired = parse_structured_response('message_analysis', response, MessageAnalysis)
+        if analysis is None:
             return self._default_analysis()
+        
+        # Respostas truncadas e reparadas não vão para o cache
+        if not repaired:
+            llm_cache.set(cache_key, analysis)
+        return analysis
+    
+    def _analyze_batch(self, items: List[Tuple[str, str, str]]) -> List:
+        """
+        Analisa um lote de (mensagem, nível, chave do cache) em uma chamada ao modelo
+        Itens ausentes da resposta (ex: truncada) são analisados individualmente
+        """
+        if len(items) == 1:
+            return [self._request_analysis(*items[0])]
+        
+        batch_prompt = MESSAGE_ANALYSIS_BATCH_PROMPT.render(items=json.dumps([
+            {'id': i, 'message': message, 'user_level': user_level}
+            for i, (message, user_level, _) in enumerate(items)
+        ], ensure_ascii=False, indent=2))
+        
+        response = self._create_completion(
+            'message_analysis_batch',
+            messages=[{"role": "user", "content": batch_prompt}],
+            temperature=0.3,
+            max_tokens=ANALYSIS_BATCH_ITEM_TOKENS * len(items),
+            **json_mode_kwargs()
+        )
+        
+        data, repaired = parse_structured_response('message_analysis_batch', response, MessageAnalysisBatch)
+        analyses = (data or {}).get('analyses', [])
+        
+        # Em uma resposta reparada, a última análise da lista pode ter sido cortada
+        incomplete_id = analyses[-1].get('id') if repaired and analyses else None
+        
+        by_id = {}
+        for analysis in analyses:
+            item_id = analysis.pop('id', -1)
+            if 0 <= item_id < len(items) and item_id not in by_id:
+                by_id[item_id] = analysis
+        
+        results = []
+        for i, (message, user_level, cache_key) in enumerate(items):
+            if i not in by_id:
+                try:
+                    results.append(self._request_analysis(message, user_level, cache_key))
+                except Exception as e:
+                    results.append(e)
+                continue
+            
+            if i != incomplete_id:
+                llm_cache.set(cache_key, by_id[i])
+            results.append(by_id[i])
+        
+        return results
+    
+    def _analysis_cache_key(self, message: str, user_profile: Dict) -> str:
+        """
+        Chave do cache da análise de mensagem
+        """
+        return llm_cache.make_key(
+            'message_analysis',
+            self.PROMPT_VERSIONS['message_analysis'],
+            llm_gateway.model_for('message_analysis'),
+            0.3,
+            llm_cache.normalize_text(message),
+            user_profile.get('english_level', 'beginner')
+        )
     
     def _build_profile_context(self, user_profile: Dict) -> str:
         """
@@ -155,7 +571,7 @@ class AIConversationService:
         if user_profile.get('learning_style'):
             style = user_profile['learning_style']
             if style:
-                context_parts.append(f"User's learning preferences: {json.dumps(style)}")
+                context_parts.append(f"User's learning preferences: {json.dumps(style, sort_keys=True)}")
         
         return "\n".join(context_parts) if context_parts else ""
     
@@ -177,6 +593,30 @@ class AIConversationService:
             "topics_mentioned": []
         }
     
+    def summarize_conversation(self, previous_summary: Optional[str], messages: List[Dict]) -> str:
+        """
+        Incorpora mensagens antigas ao resumo acumulado da conversa
+        Propaga erros da API (usado pela tarefa em segundo plano, que faz novas tentativas)
+        """
+        transcript = "\n".join(
+            f"{'Learner' if msg['sender'] == 'user' else 'Assistant'}: {msg['content']}"
+            for msg in messages
+        )
+        
+        prompt = CONVERSATION_SUMMARY_PROMPT.render(
+            previous_summary=previous_summary or 'none yet',
+            transcript=transcript
+        )
+        
+        response = self._create_completion(
+            'conversation_summary',
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0.3,
+            max_tokens=250
+        )
+        
+        return response.choices[0].message.content.strip()
+    
     async def generate_conversation_starter(self, user_profile: Dict, 
                                           recent_topics: List[str] = None) -> str:
         """
@@ -187,25 +627,15 @@ class AIConversationService:
             level = user_profile.get('english_level', 'beginner')
             recent_topics = recent_topics or []
             
-            prompt = f"""
-            Generate a friendly, engaging conversation starter for an English language learner.
-            
-            User Level: {level}
-            User Interests: {', '.join(interests) if interests else 'general topics'}
-            Recent Topics Discussed: {', '.join(recent_topics) if recent_topics else 'none'}
-            
-            Create a natural, friendly question or comment that:
-            1. Matches their English level
-            2. Relates to their interests when possible
-            3. Avoids recently discussed topics
-            4. Encourages them to share and practice English
-            5. Sounds like something a friend would ask
-            
-            Keep it conversational and warm, like greeting a good friend.
-            """
+            prompt = CONVERSATION_STARTER_PROMPT.render(
+                level=level,
+                interests=', '.join(interests) if interests else 'general topics',
+                recent_topics=', '.join(recent_topics) if recent_topics else 'none'
+            )
             
-            response = self.client.chat.completions.create(
-                model="gpt-4",
+            response = await self._run_blocking(
+                self._create_completion,
+                'conversation_starter',
                 messages=[{"role": "user", "content": prompt}],
                 temperature=0.9,
                 max_tokens=150
@@ -215,60 +645,41 @@ class AIConversationService:
             
         except Exception as e:
             print(f"Erro ao gerar starter de conversa: {e}")
-            return "Hey there! How's your day going? I'd love to hear what you've been up to!"
+            return DEFAULT_CONVERSATION_STARTER
     
     async def generate_progress_insights(self, user_progress: List[Dict], 
-                                       knowledge_items: List[Dict]) -> Dict:
+                                       knowledge_summary: Dict) -> Tuple[Dict, bool]:
         """
         Gera insights sobre o progresso do usuário
+        knowledge_summary vem dos agregados mantidos no banco (KnowledgeStats.summarize)
+        Retorna: (insights, ok); ok é False quando a geração falhou e os insights são os padrão
         """
         try:
             # Prepara dados para análise
             progress_summary = self._summarize_progress(user_progress)
-            knowledge_summary = self._summarize_knowledge(knowledge_items)
-            
-            prompt = f"""
-            Analyze this English learner's progress and provide encouraging insights:
-            
-            Progress Summary: {json.dumps(progress_summary)}
-            Knowledge Summary: {json.dumps(knowledge_summary)}
             
-            Provide a JSON response with:
-            {{
-                "overall_progress": "description of overall progress",
-                "strengths": ["list of identified strengths"],
-                "areas_for_improvement": ["gentle suggestions for improvement"],
-                "achievements": ["recent achievements to celebrate"],
-                "next_goals": ["suggested next learning goals"],
-                "motivation_message": "encouraging message",
-                "learning_recommendations": ["specific recommendations"]
-            }}
-            
-            Be very encouraging and focus on progress made, not just areas to improve.
-            """
+            prompt = PROGRESS_INSIGHTS_PROMPT.render(
+                progress_summary=json.dumps(progress_summary),
+                knowledge_summary=json.dumps(knowledge_summary)
+            )
             
-            response = self.client.chat.completions.create(
-                model="gpt-4",
+            response = await self._run_blocking(
+                self._create_completion,
+                'progress_insights',
                 messages=[{"role": "user", "content": prompt}],
                 temperature=0.7,
-                max_tokens=600
+                max_tokens=600,
+                **json_mode_kwargs()
             )
             
-            insights_text = response.choices[0].message.content
-            
-            # Extrai JSON
-            try:
-                json_match = re.search(r'```json\s*(.*?)\s*```', insights_text, re.DOTALL)
-                if json_match:
-                    insights_text = json_match.group(1)
-                
-                return json.loads(insights_text)
-            except json.JSONDecodeError:
-                return self._default_insights()
+            insights, _ = parse_structured_response('progress_insights', response, ProgressInsights)
+            if insights is None:
+                return self._default_insights(), False
+            return insights, True
                 
         except Exception as e:
             print(f"Erro ao gerar insights: {e}")
-            return self._default_insights()
+            return self._default_insights(), False
     
     def _summarize_progress(self, progress_records: List[Dict]) -> Dict:
         """
@@ -297,33 +708,6 @@ class AIConversationService:
             'sessions_count': len(recent_records)
         }
     
-    def _summarize_knowledge(self, knowledge_items: List[Dict]) -> Dict:
-        """
-        Sumariza itens de conhecimento
-        """
-        if not knowledge_items:
-            return {}
-        
-        by_type = {}
-        mastery_levels = []
-        
-        for item in knowledge_items:
-            item_type = item.get('item_type', 'unknown')
-            if item_type not in by_type:
-                by_type[item_type] = 0
-            by_type[item_type] += 1
-            
-            mastery_levels.append(item.get('mastery_level', 0))
-        
-        avg_mastery = sum(mastery_levels) / len(mastery_levels) if mastery_levels else 0
-        
-        return {
-            'total_items': len(knowledge_items),
-            'by_type': by_type,
-            'average_mastery': avg_mastery,
-            'well_mastered': len([m for m in mastery_levels if m >= 0.8])
-        }
-    
     def _default_insights(self) -> Dict:
         """
         Insights padrão em caso de erro
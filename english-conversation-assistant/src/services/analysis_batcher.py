@@ -0,0 +1,174 @@
+"""
+Agrupamento de chamadas aos modelos em pequenos lotes (micro-batching)
+
+Pedidos que chegam dentro de uma janela curta (ex: 20 ms) ou até um número
+máximo de itens são enviados juntos em uma única chamada; cada chamador
+recebe o resultado do seu item por um Future.
+
+Limites de pressão:
+- max_pending: itens aguardando envio; acima disso submit() recusa com BatchQueueFull
+- max_inflight: lotes em execução ao mesmo tempo; enquanto não há vaga os pedidos
+  continuam se acumulando e o próximo lote sai maior
+"""
+
+import time
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List
+
+class BatchQueueFull(Exception):
+    """
+    Fila de itens aguardando lote cheia (o chamador deve degradar ou tentar depois)
+    """
+
+class BatchMetrics:
+    """
+    Lotes enviados, tamanho médio, espera na fila e recusas por nome do batcher
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_name = {}
+
+    def _stats(self, name: str) -> Dict:
+        return self._by_name.setdefault(name, {
+            'items': 0,
+            'batches': 0,
+            'rejected': 0,
+            'failed_batches': 0,
+            'max_batch_size': 0,
+            'queue_wait_total': 0.0,
+            'queue_wait_max': 0.0
+        })
+
+    def record_batch(self, name: str, size: int, waits: List[float], failed: bool = False):
+        with self._lock:
+            stats = self._stats(name)
+            stats['items'] += size
+            stats['batches'] += 1
+            stats['failed_batches'] += int(failed)
+            stats['max_batch_size'] = max(stats['max_batch_size'], size)
+            stats['queue_wait_total'] += sum(waits)
+            stats['queue_wait_max'] = max([stats['queue_wait_max']] + waits)
+
+    def record_rejected(self, name: str):
+        with self._lock:
+            self._stats(name)['rejected'] += 1
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                name: {
+                    'items': stats['items'],
+                    'batches': stats['batches'],
+                    'rejected': stats['rejected'],
+                    'failed_batches': stats['failed_batches'],
+                    'max_batch_size': stats['max_batch_size'],
+                    'average_batch_size': stats['items'] / stats['batches'] if stats['batches'] else 0.0,
+                    'average_queue_wait_ms': (stats['queue_wait_total'] / stats['items'] * 1000
+                                              if stats['items'] else 0.0),
+                    'max_queue_wait_ms': stats['queue_wait_max'] * 1000
+                }
+                for name, stats in self._by_name.items()
+            }
+
+batch_metrics = BatchMetrics()
+
+class MicroBatcher:
+    """
+    Junta itens submetidos por várias threads e os processa em lotes
+
+    dispatch recebe a lista de itens e devolve uma lista do mesmo tamanho com o
+    resultado de cada um (ou uma exceção, que é repassada só àquele chamador).
+    """
+
+    def __init__(self, name: str, dispatch: Callable[[List[Any]], List[Any]], window_ms: float = 20.0,
+                 max_items: int = 16, max_pending: int = 256, max_inflight: int = 4):
+        self.name = name
+        self.dispatch = dispatch
+        self.window = window_ms / 1000
+        self.max_items = max(1, max_items)
+        self.max_pending = max_pending
+        self.max_inflight = max(1, max_inflight)
+
+        self._pending = []  # (item, future, horário de chegada)
+        self._cond = threading.Condition()
+        self._slots = threading.BoundedSemaphore(self.max_inflight)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_inflight, thread_name_prefix=f'{name}-batch')
+        self._thread = None
+
+    def submit(self, item) -> Future:
+        """
+        Adiciona um item ao próximo lote; BatchQueueFull se a fila estiver cheia
+        """
+        future = Future()
+
+        with self._cond:
+            if len(self._pending) >= self.max_pending:
+                batch_metrics.record_rejected(self.name)
+                raise BatchQueueFull(f'{self.name}: {len(self._pending)} items waiting')
+
+            self._pending.append((item, future, time.monotonic()))
+            self._cond.notify()
+
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._collect_loop, name=f'{self.name}-batcher', daemon=True)
+                self._thread.start()
+
+        return future
+
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._pending)
+
+    def _collect_loop(self):
+        """
+        Fecha um lote quando a janela do item mais antigo expira ou o lote enche
+        """
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+
+                deadline = self._pending[0][2] + self.window
+                while len(self._pending) < self.max_items:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+
+            # Sem vaga para outro lote em execução, os itens continuam se acumulando
+            self._slots.acquire()
+
+            with self._cond:
+                batch = self._pending[:self.max_items]
+                del self._pending[:self.max_items]
+
+            self._executor.submit(self._run_batch, batch)
+
+    def _run_batch(self, batch: List):
+        """
+        Executa um lote e entrega a cada Future o resultado do seu item
+        """
+        started = time.monotonic()
+        waits = [started - enqueued_at for _, _, enqueued_at in batch]
+
+        try:
+            results = self.dispatch([item for item, _, _ in batch])
+            if len(results) != len(batch):
+                raise ValueError(f'{self.name}: {len(results)} results for {len(batch)} items')
+        except Exception as e:
+            print(f"Erro ao processar lote de {self.name}: {e}")
+            batch_metrics.record_batch(self.name, len(batch), waits, failed=True)
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+        finally:
+            self._slots.release()
+
+        batch_metrics.record_batch(self.name, len(batch), waits)
+        for (_, future, _), result in zip(batch, results):
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
@@ -0,0 +1,105 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Awaitable, Optional
+
+class AsyncRuntime:
+    """
+    Event loop compartilhado rodando em uma thread dedicada
+
+    As rotas (síncronas, executadas pelas threads do servidor WSGI) submetem
+    corrotinas para este loop em vez de criar um loop por requisição. Assim,
+    várias requisições compartilham o mesmo loop e as chamadas aos modelos
+    disparadas por elas rodam de forma concorrente.
+    """
+
+    def __init__(self, name: str = 'async-runtime'):
+        self.name = name
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        """
+        Retorna o loop compartilhado, iniciando a thread na primeira utilização
+        """
+        if self._loop is None:
+            self.start()
+        return self._loop
+
+    def start(self):
+        """
+        Inicia a thread do event loop (idempotente)
+        """
+        with self._lock:
+            if self._loop is not None:
+                return
+
+            loop = asyncio.new_event_loop()
+            ready = threading.Event()
+
+            def run_loop():
+                asyncio.set_event_loop(loop)
+                loop.call_soon(ready.set)
+                loop.run_forever()
+
+            thread = threading.Thread(target=run_loop, name=self.name, daemon=True)
+            thread.start()
+            ready.wait()
+
+            self._thread = thread
+            self._loop = loop
+
+    def submit(self, coro: Awaitable) -> Future:
+        """
+        Agenda a corrotina no loop compartilhado e retorna um Future thread-safe
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro: Awaitable, timeout: Optional[float] = None):
+        """
+        Executa a corrotina no loop compartilhado e bloqueia até o resultado
+        """
+        if self._thread is not None and threading.current_thread() is self._thread:
+            raise RuntimeError('run() cannot be called from inside the async runtime loop; await the coroutine instead')
+
+        future = self.submit(coro)
+        try:
+            return future.result(timeout)
+        except TimeoutError:
+            future.cancel()
+            raise
+
+    def shutdown(self, timeout: Optional[float] = None):
+        """
+        Para o loop depois que as corrotinas em andamento terminarem
+        """
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            if loop is None:
+                return
+
+            async def drain():
+                current = asyncio.current_task()
+                pending = [task for task in asyncio.all_tasks() if task is not current]
+                if pending:
+                    await asyncio.wait(pending, timeout=timeout)
+
+            try:
+                asyncio.run_coroutine_threadsafe(drain(), loop).result()
+            finally:
+                loop.call_soon_threadsafe(loop.stop)
+                thread.join(timeout)
+                if not thread.is_alive():
+                    loop.close()
+                self._loop = None
+                self._thread = None
+
+async_runtime = AsyncRuntime()
+
+def run_async(coro: Awaitable, timeout: Optional[float] = None):
+    """
+    Executa código assíncrono em contexto síncrono usando o runtime compartilhado
+    """
+    return async_runtime.run(coro, timeout)
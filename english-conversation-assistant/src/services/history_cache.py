@@ -0,0 +1,94 @@
+import os
+import threading
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional
+
+# Mensagens recentes que o resumo da conversa nunca incorpora (vão sempre literalmente no prompt)
+HISTORY_WINDOW = int(os.getenv('HISTORY_WINDOW', '10'))
+
+# Máximo de mensagens recentes lidas como histórico e guardadas por conversa; todas as
+# ainda não resumidas vão no prompt, até o orçamento de tokens
+HISTORY_MAX_MESSAGES = max(int(os.getenv('HISTORY_MAX_MESSAGES', '40')), HISTORY_WINDOW)
+
+class ConversationHistoryCache:
+    """
+    Buffer circular em memória com as últimas mensagens de cada conversa
+
+    Guarda apenas id/sender/content das últimas `window` mensagens, para que os
+    turnos seguintes não precisem ler o conteúdo das mensagens do banco (a consulta
+    dos ids, abaixo, continua a cada turno). As conversas menos usadas são
+    descartadas quando o limite é atingido.
+
+    O cache é por processo e outro worker pode gravar na mesma conversa; por
+    isso get() recebe os ids das últimas mensagens no banco (consulta só no
+    índice) e só devolve o buffer se ele contém exatamente essas mensagens.
+    """
+
+    def __init__(self, window: Optional[int] = None, max_conversations: Optional[int] = None):
+        self.window = window or HISTORY_MAX_MESSAGES
+        if max_conversations is None:
+            max_conversations = int(os.getenv('HISTORY_CACHE_CONVERSATIONS', '1000'))
+        self.max_conversations = max_conversations  # 0 desativa o cache
+
+        self._buffers = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+
+    def get(self, conversation_id: int, latest_ids: List[int]) -> Optional[List[Dict]]:
+        """
+        Retorna uma cópia do histórico em cache (id, sender, content) ou None
+        latest_ids são os ids das últimas mensagens no banco, em ordem cronológica;
+        se o buffer não corresponde a eles, outro processo gravou na conversa e ele é descartado
+        """
+        with self._lock:
+            buffer = self._buffers.get(conversation_id)
+            if buffer is None:
+                self.misses += 1
+                return None
+
+            if [msg['id'] for msg in buffer] != list(latest_ids):
+                del self._buffers[conversation_id]
+                self.stale += 1
+                self.misses += 1
+                return None
+
+            self._buffers.move_to_end(conversation_id)
+            self.hits += 1
+            return [dict(msg) for msg in buffer]
+
+    def set(self, conversation_id: int, messages: List[Dict]):
+        """
+        Substitui o histórico em cache da conversa (mensagens com id, sender e content)
+        """
+        if self.max_conversations <= 0:
+            return
+
+        with self._lock:
+            self._buffers[conversation_id] = deque(
+                ({'id': msg['id'], 'sender': msg['sender'], 'content': msg['content']} for msg in messages),
+                maxlen=self.window
+            )
+            self._buffers.move_to_end(conversation_id)
+
+            while len(self._buffers) > self.max_conversations:
+                self._buffers.popitem(last=False)
+
+    def append(self, conversation_id: int, message_id: int, sender: str, content: str):
+        """
+        Acrescenta uma mensagem já gravada no banco (ignorado se a conversa não está em cache)
+        """
+        with self._lock:
+            buffer = self._buffers.get(conversation_id)
+            if buffer is not None:
+                buffer.append({'id': message_id, 'sender': sender, 'content': content})
+
+    def invalidate(self, conversation_id: int):
+        """
+        Remove a conversa do cache
+        """
+        with self._lock:
+            self._buffers.pop(conversation_id, None)
+
+history_cache = ConversationHistoryCache()
@@ -0,0 +1,317 @@
+import os
+import json
+import queue
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, Dict, Optional
+from src.models.user import db, BackgroundJob
+
+class BackgroundJobQueue:
+    """
+    Fila de tarefas em segundo plano com pool de workers
+
+    Cada tarefa é identificada por (job_type, job_key); enfileirar a mesma chave
+    novamente não duplica o trabalho. Com persistência ativada (PERSISTENT_JOBS=true)
+    o estado das tarefas é gravado na tabela background_job e as pendentes são
+    retomadas quando a aplicação reinicia.
+    """
+
+    def __init__(self, num_workers: Optional[int] = None, max_attempts: Optional[int] = None,
+                 retry_delay: Optional[float] = None, persistent: Optional[bool] = None,
+                 max_tracked_jobs: int = 10000):
+        self.num_workers = num_workers or int(os.getenv('JOB_WORKERS', '2'))
+        self.max_attempts = max_attempts or int(os.getenv('JOB_MAX_ATTEMPTS', '3'))
+        self.retry_delay = retry_delay if retry_delay is not None else float(os.getenv('JOB_RETRY_DELAY', '1.0'))
+        if persistent is None:
+            persistent = os.getenv('PERSISTENT_JOBS', 'false').lower() == 'true'
+        self.persistent = persistent
+        self.max_tracked_jobs = max_tracked_jobs
+
+        self.app = None
+        self.handlers: Dict[str, Callable[[Dict], Optional[Dict]]] = {}
+        self._queue = queue.Queue()
+        self._jobs = OrderedDict()
+        self._reruns: Dict[tuple, Dict] = {}
+        self._lock = threading.Lock()
+        self._workers = []
+
+    def init_app(self, app, start: bool = True):
+        """
+        Associa a fila à aplicação; com start, retoma tarefas persistidas e inicia os workers
+        (com gunicorn --preload os workers são iniciados em cada processo, depois do fork)
+        """
+        self.app = app
+
+        if start:
+            self.start()
+
+    def start(self, recover: bool = True):
+        """
+        Inicia os workers (idempotente); com recover, reenfileira antes as tarefas persistidas
+        """
+        if self._workers:
+            return
+
+        if self.persistent and recover:
+            self._recover_jobs()
+
+        for i in range(self.num_workers):
+            worker = threading.Thread(
+                target=self._worker_loop,
+                name=f'job-worker-{i}',
+                daemon=True
+            )
+            worker.start()
+            self._workers.append(worker)
+
+    def register_handler(self, job_type: str, handler: Callable[[Dict], Optional[Dict]]):
+        """
+        Registra a função que processa um tipo de tarefa
+        O handler recebe o payload e roda dentro do contexto da aplicação
+        """
+        self.handlers[job_type] = handler
+
+    def enqueue(self, job_type: str, job_key, payload: Optional[Dict] = None,
+                rerun_if_done: bool = False) -> Dict:
+        """
+        Enfileira uma tarefa; se já existir uma pendente, em execução ou concluída
+        com a mesma chave, retorna o estado dela sem enfileirar de novo
+        Com rerun_if_done, tarefas concluídas voltam a rodar (útil para atualizações
+        periódicas), mas pedidos enquanto a tarefa está pendente continuam agrupados;
+        um pedido durante a execução marca a tarefa para rodar de novo quando ela terminar
+        (os dados gravados depois que o handler leu as entradas também são processados)
+        """
+        key = (job_type, str(job_key))
+
+        # A consulta ao banco fica fora do lock; o estado em memória é conferido de novo depois
+        loaded = None
+        if self.persistent:
+            with self._lock:
+                known = key in self._jobs
+            if not known:
+                loaded = self._load_job(key)
+
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is None and loaded:
+                job = loaded
+                self._track(key, job)
+
+            if job and rerun_if_done and job['status'] == 'running':
+                self._reruns[key] = payload or job['payload']
+                return dict(job)
+
+            active_statuses = ('pending', 'running') if rerun_if_done else ('pending', 'running', 'done')
+            if job and job['status'] in active_statuses:
+                return dict(job)
+
+            now = datetime.utcnow().isoformat()
+            job = {
+                'job_type': job_type,
+                'job_key': str(job_key),
+                'payload': payload or {},
+                'status': 'pending',
+                'attempts': 0,
+                'error': None,
+                'result': None,
+                'created_at': now,
+                'updated_at': now
+            }
+            self._track(key, job)
+
+        self._save(job)
+        self._queue.put(key)
+        return dict(job)
+
+    def get_status(self, job_type: str, job_key) -> Optional[Dict]:
+        """
+        Retorna o estado atual de uma tarefa ou None se ela não existir
+        """
+        key = (job_type, str(job_key))
+
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None or not self.persistent:
+                return dict(job) if job else None
+
+        loaded = self._load_job(key)
+        with self._lock:
+            job = self._jobs.get(key) or loaded
+            return dict(job) if job else None
+
+    def shutdown(self, wait: bool = True, timeout: Optional[float] = None):
+        """
+        Para os workers depois que as tarefas já enfileiradas terminarem
+        """
+        for _ in self._workers:
+            self._queue.put(None)
+
+        if wait:
+            for worker in self._workers:
+                worker.join(timeout)
+
+        self._workers = []
+
+    def _worker_loop(self):
+        """
+        Loop principal de cada worker
+        """
+        while True:
+            key = self._queue.get()
+            if key is None:
+                break
+
+            try:
+                self._run_job(key)
+            except Exception as e:
+                print(f"Erro inesperado no worker de tarefas: {e}")
+
+    def _run_job(self, key):
+        """
+        Executa uma tarefa e agenda nova tentativa em caso de falha
+        """
+        with self._lock:
+            job = self._jobs.get(key)
+            if not job or job['status'] != 'pending':
+                return
+            job['status'] = 'running'
+            job['attempts'] += 1
+            job['updated_at'] = datetime.utcnow().isoformat()
+
+        handler = self.handlers.get(job['job_type'])
+
+        with self.app.app_context():
+            self._save(job)
+
+            try:
+                if handler is None:
+                    raise RuntimeError(f"No handler registered for job type '{job['job_type']}'")
+
+                result = handler(job['payload'])
+
+                with self._lock:
+                    job['status'] = 'done'
+                    job['result'] = result
+                    job['error'] = None
+                    rerun = self._take_rerun(key, job)
+
+            except Exception as e:
+                db.session.rollback()
+                print(f"Erro na tarefa {job['job_type']}:{job['job_key']} (tentativa {job['attempts']}): {e}")
+
+                with self._lock:
+                    job['error'] = str(e)
+                    if job['attempts'] < self.max_attempts:
+                        # A nova tentativa já lê as entradas de novo
+                        self._reruns.pop(key, None)
+                        rerun = False
+                        job['status'] = 'pending'
+                        delay = self.retry_delay * (2 ** (job['attempts'] - 1))
+                        timer = threading.Timer(delay, self._queue.put, args=(key,))
+                        timer.daemon = True
+                        timer.start()
+                    else:
+                        job['status'] = 'failed'
+                        rerun = self._take_rerun(key, job)
+
+            job['updated_at'] = datetime.utcnow().isoformat()
+            self._save(job)
+
+        if rerun:
+            self._queue.put(key)
+
+    def _take_rerun(self, key, job: Dict) -> bool:
+        """
+        Volta a tarefa finalizada para pendente se ela foi pedida de novo durante a execução
+        (chamado com o lock; o payload passa a ser o do último pedido)
+        """
+        payload = self._reruns.pop(key, None)
+        if payload is None:
+            return False
+
+        job['status'] = 'pending'
+        job['attempts'] = 0
+        job['payload'] = payload
+        return True
+
+    def _track(self, key, job: Dict):
+        """
+        Guarda a tarefa em memória, descartando as mais antigas já finalizadas
+        """
+        self._jobs[key] = job
+        self._jobs.move_to_end(key)
+
+        while len(self._jobs) > self.max_tracked_jobs:
+            oldest_key = next(iter(self._jobs))
+            if self._jobs[oldest_key]['status'] in ('pending', 'running'):
+                break
+            self._jobs.popitem(last=False)
+
+    def _save(self, job: Dict):
+        """
+        Persiste o estado da tarefa na tabela background_job (se ativado)
+        """
+        if not self.persistent or self.app is None:
+            return
+
+        with self.app.app_context():
+            try:
+                record = BackgroundJob.query.filter_by(
+                    job_type=job['job_type'],
+                    job_key=job['job_key']
+                ).first()
+
+                if not record:
+                    record = BackgroundJob(
+                        job_type=job['job_type'],
+                        job_key=job['job_key']
+                    )
+                    db.session.add(record)
+
+                record.payload = json.dumps(job['payload'])
+                record.status = job['status']
+                record.attempts = job['attempts']
+                record.last_error = job['error']
+                record.result = json.dumps(job['result']) if job['result'] is not None else None
+                record.updated_at = datetime.utcnow()
+
+                db.session.commit()
+
+            except Exception as e:
+                db.session.rollback()
+                print(f"Erro ao persistir tarefa {job['job_type']}:{job['job_key']}: {e}")
+
+    def _load_job(self, key) -> Optional[Dict]:
+        """
+        Carrega uma tarefa persistida
+        """
+        if self.app is None:
+            return None
+
+        with self.app.app_context():
+            record = BackgroundJob.query.filter_by(job_type=key[0], job_key=key[1]).first()
+            return record.to_dict() if record else None
+
+    def _recover_jobs(self):
+        """
+        Reenfileira tarefas que ficaram pendentes ou em execução antes de um reinício
+        """
+        with self.app.app_context():
+            records = BackgroundJob.query.filter(
+                BackgroundJob.status.in_(['pending', 'running'])
+            ).all()
+
+            for record in records:
+                job = record.to_dict()
+                job['status'] = 'pending'
+                key = (job['job_type'], job['job_key'])
+
+                with self._lock:
+                    self._track(key, job)
+                self._queue.put(key)
+
+            if records:
+                print(f"✅ {len(records)} background job(s) recovered")
+
+job_queue = BackgroundJobQueue()
@@ -0,0 +1,295 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+class LLMResponseCache:
+    """
+    Cache de respostas de análises determinísticas (temperatura baixa) dos modelos
+
+    A chave é um hash de (template, versão do prompt, modelo, temperatura,
+    entrada normalizada, nível do usuário). Há dois níveis: um LRU em memória
+    e uma tabela SQLite em disco que sobrevive a reinícios. Ambos respeitam
+    TTL e limite de tamanho.
+
+    Só o LRU em memória e os contadores ficam sob o lock; o disco é lido e
+    gravado fora dele, com uma conexão por thread (modo WAL, leituras em paralelo).
+    """
+
+    # Frequência (em gravações) da limpeza do nível em disco
+    PRUNE_INTERVAL = 100
+
+    # Um acerto no disco só regrava last_access (usado para descartar os menos
+    # acessados) se o valor gravado tiver mais que isso, em segundos
+    LAST_ACCESS_RESOLUTION = 3600
+
+    def __init__(self, max_memory_items: Optional[int] = None, max_disk_items: Optional[int] = None,
+                 ttl_seconds: Optional[float] = None, db_path: Optional[str] = None,
+                 enabled: Optional[bool] = None):
+        self.max_memory_items = max_memory_items or int(os.getenv('LLM_CACHE_MEMORY_ITEMS', '1000'))
+        self.max_disk_items = max_disk_items or int(os.getenv('LLM_CACHE_DISK_ITEMS', '50000'))
+        self.ttl_seconds = ttl_seconds or float(os.getenv('LLM_CACHE_TTL', str(7 * 24 * 3600)))
+        if enabled is None:
+            enabled = os.getenv('LLM_CACHE_ENABLED', 'true').lower() == 'true'
+        self.enabled = enabled
+
+        if db_path is None:
+            db_path = os.getenv(
+                'LLM_CACHE_DB',
+                os.path.join(os.path.dirname(os.path.dirname(__file__)), 'database', 'llm_cache.db')
+            )
+        self.db_path = db_path  # string vazia desativa o nível em disco
+
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+        self._counters = {
+            'memory_hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'sets': 0,
+            'bypassed': 0,
+            'expired': 0,
+            'memory_evictions': 0,
+            'disk_evictions': 0
+        }
+
+    @staticmethod
+    def normalize_text(text: str) -> str:
+        """
+        Normaliza a entrada: remove espaços nas pontas e colapsa espaços internos
+        (maiúsculas são preservadas porque fazem parte da análise gramatical)
+        """
+        return re.sub(r'\s+', ' ', (text or '').strip())
+
+    def make_key(self, template: str, version: int, model: str, temperature: float,
+                 normalized_input: str, user_level: str = '') -> str:
+        """
+        Gera a chave de conteúdo (sha256) para uma chamada
+        """
+        raw = json.dumps(
+            [template, version, model, round(float(temperature), 3), normalized_input, user_level or ''],
+            ensure_ascii=False
+        )
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict]:
+        """
+        Busca no LRU em memória e depois no disco; retorna None em caso de miss
+        """
+        if not self.enabled:
+            return None
+
+        now = time.time()
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, created_at = entry
+                if now - created_at <= self.ttl_seconds:
+                    self._memory.move_to_end(key)
+                    self._counters['memory_hits'] += 1
+                    return json.loads(value)
+
+                del self._memory[key]
+                self._counters['expired'] += 1
+
+        row = self._disk_get(key, now)
+        expired = row is not None and now - row[1] > self.ttl_seconds
+        if expired:
+            self._disk_delete(key)
+
+        with self._lock:
+            if row is not None and not expired:
+                value, created_at = row
+                self._memory_set(key, value, created_at)
+                self._counters['disk_hits'] += 1
+                return json.loads(value)
+
+            if expired:
+                self._counters['expired'] += 1
+            self._counters['misses'] += 1
+            return None
+
+    def set(self, key: str, value: Dict):
+        """
+        Armazena o resultado nos dois níveis
+        """
+        if not self.enabled:
+            return
+
+        serialized = json.dumps(value, ensure_ascii=False)
+        now = time.time()
+
+        with self._lock:
+            self._memory_set(key, serialized, now)
+            self._counters['sets'] += 1
+            prune = self._counters['sets'] % self.PRUNE_INTERVAL == 0
+
+        evicted = self._disk_set(key, serialized, now, prune)
+        if evicted:
+            with self._lock:
+                self._counters['disk_evictions'] += evicted
+
+    def record_bypass(self):
+        """
+        Contabiliza uma chamada que ignorou o cache por pedido do chamador
+        """
+        with self._lock:
+            self._counters['bypassed'] += 1
+
+    def stats(self) -> Dict:
+        """
+        Contadores de acertos/erros e tamanho de cada nível
+        """
+        with self._lock:
+            counters = dict(self._counters)
+            memory_items = len(self._memory)
+        disk_items = self._disk_count()
+
+        hits = counters['memory_hits'] + counters['disk_hits']
+        lookups = hits + counters['misses']
+
+        return {
+            'enabled': self.enabled,
+            **counters,
+            'hit_rate': hits / lookups if lookups else 0.0,
+            'memory_items': memory_items,
+            'disk_items': disk_items
+        }
+
+    def clear(self):
+        """
+        Remove todas as entradas dos dois níveis
+        """
+        with self._lock:
+            self._memory.clear()
+
+        conn = self._connection()
+        if conn is not None:
+            conn.execute('DELETE FROM llm_cache')
+            conn.commit()
+
+    def _memory_set(self, key: str, value: str, created_at: float):
+        self._memory[key] = (value, created_at)
+        self._memory.move_to_end(key)
+
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+            self._counters['memory_evictions'] += 1
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        """
+        Conexão desta thread com o banco do cache em disco (a tabela é criada uma vez)
+        """
+        if not self.db_path:
+            return None
+
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            try:
+                conn = sqlite3.connect(self.db_path, timeout=5)
+                conn.execute('PRAGMA journal_mode=WAL')
+                with self._schema_lock:
+                    if not self._schema_ready:
+                        conn.execute('''
+                            CREATE TABLE IF NOT EXISTS llm_cache (
+                                key TEXT PRIMARY KEY,
+                                value TEXT NOT NULL,
+                                created_at REAL NOT NULL,
+                                last_access REAL NOT NULL
+                            )
+                        ''')
+                        conn.execute('CREATE INDEX IF NOT EXISTS ix_llm_cache_last_access ON llm_cache (last_access)')
+                        conn.commit()
+                        self._schema_ready = True
+                self._local.conn = conn
+            except sqlite3.Error as e:
+                print(f"Erro ao abrir cache em disco ({self.db_path}): {e}")
+                self.db_path = ''
+                return None
+
+        return conn
+
+    def _disk_get(self, key: str, now: float):
+        conn = self._connection()
+        if conn is None:
+            return None
+
+        try:
+            row = conn.execute(
+                'SELECT value, created_at, last_access FROM llm_cache WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                return None
+
+            value, created_at, last_access = row
+            if now - last_access >= self.LAST_ACCESS_RESOLUTION:
+                conn.execute('UPDATE llm_cache SET last_access = ? WHERE key = ?', (now, key))
+                conn.commit()
+            return value, created_at
+        except sqlite3.Error as e:
+            print(f"Erro ao ler cache em disco: {e}")
+            return None
+
+    def _disk_set(self, key: str, value: str, created_at: float, prune: bool = False) -> int:
+        """
+        Grava a entrada; com prune remove expirados e, se necessário, os menos acessados
+        Retorna quantas entradas foram descartadas por excesso
+        """
+        conn = self._connection()
+        if conn is None:
+            return 0
+
+        evicted = 0
+        try:
+            conn.execute(
+                'INSERT OR REPLACE INTO llm_cache (key, value, created_at, last_access) VALUES (?, ?, ?, ?)',
+                (key, value, created_at, created_at)
+            )
+
+            if prune:
+                conn.execute('DELETE FROM llm_cache WHERE created_at < ?', (created_at - self.ttl_seconds,))
+                overflow = self._disk_count() - self.max_disk_items
+                if overflow > 0:
+                    conn.execute(
+                        'DELETE FROM llm_cache WHERE key IN '
+                        '(SELECT key FROM llm_cache ORDER BY last_access LIMIT ?)',
+                        (overflow,)
+                    )
+                    evicted = overflow
+
+            conn.commit()
+        except sqlite3.Error as e:
+            print(f"Erro ao gravar cache em disco: {e}")
+        return evicted
+
+    def _disk_delete(self, key: str):
+        conn = self._connection()
+        if conn is None:
+            return
+
+        try:
+            conn.execute('DELETE FROM llm_cache WHERE key = ?', (key,))
+            conn.commit()
+        except sqlite3.Error as e:
+            print(f"Erro ao remover entrada do cache em disco: {e}")
+
+    def _disk_count(self) -> int:
+        conn = self._connection()
+        if conn is None:
+            return 0
+
+        try:
+            return conn.execute('SELECT COUNT(*) FROM llm_cache').fetchone()[0]
+        except sqlite3.Error:
+            return 0
+
+llm_cache = LLMResponseCache()
@@ -0,0 +1,562 @@
+"""
+Gateway único para as chamadas aos modelos (usado pelos serviços de IA e de fala)
+
+- Um cliente OpenAI compartilhado sobre um pool httpx com keep-alive (HTTP/2 opcional)
+- Limite global e por método de chamadas simultâneas; a espera por vaga conta no prazo
+- Prazo por chamada: espera na fila + tentativas + tempo do upstream
+- Novas tentativas com backoff exponencial e jitter para erros transitórios enquanto houver prazo
+- Várias bases de API (OPENAI_API_BASE separado por vírgulas) com circuit breaker por base:
+  erros transitórios em sequência abrem o circuito e a chamada passa à próxima base; com
+  todos os circuitos abertos a chamada falha na hora (LLMCircuitOpen)
+- Pedido duplicado (hedge) opcional por método, enviado após o p95 recente de latência
+  se houver vaga livre no limite de concorrência (cada pedido ocupa a sua)
+- Modelo escolhido por método (model_routing), com fallback para o próximo da cadeia
+- Tempo de espera na fila vs tempo no upstream por método
+- Gravação opcional dos prompts (LLM_RECORD_PROMPTS=arquivo.jsonl) para replay offline
+- openai e httpx só são importados na primeira chamada (a partida do worker não paga por eles)
+"""
+
+import os
+import json
+import time
+import random
+import threading
+import importlib.util
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Tuple
+
+from src.services.circuit_breaker import CircuitBreaker
+from src.services.model_routing import ModelRouter
+from src.services.prompt_builder import token_usage
+
+if TYPE_CHECKING:
+    from openai import OpenAI
+
+def retryable_errors() -> Tuple[type, ...]:
+    """
+    Erros em que vale tentar de novo (rede, tempo esgotado, 429 e 5xx)
+    """
+    from openai import APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
+    return (APIConnectionError, APITimeoutError, InternalServerError, RateLimitError)
+
+class LLMQueueTimeout(TimeoutError):
+    """
+    O prazo da chamada acabou antes de surgir vaga no limite de concorrência
+    """
+
+class LLMDeadlineExceeded(TimeoutError):
+    """
+    O prazo da chamada acabou antes de uma resposta do upstream
+    """
+
+class LLMCircuitOpen(RuntimeError):
+    """
+    Todas as bases de API estão com o circuito aberto (falha imediata, sem esperar o upstream)
+    """
+
+def parse_method_limits(raw: str) -> Dict[str, int]:
+    """
+    Lê limites por método no formato 'metodo=8,outro=4'
+    """
+    limits = {}
+    for part in (raw or '').split(','):
+        if '=' in part:
+            method, value = part.split('=', 1)
+            limits[method.strip()] = int(value)
+    return limits
+
+class LLMGateway:
+    """
+    Cliente compartilhado com limites de concorrência, prazos e métricas por método
+    """
+
+    def __init__(self, max_concurrency: Optional[int] = None, method_limits: Optional[Dict[str, int]] = None,
+                 request_timeout: Optional[float] = None, max_retries: Optional[int] = None,
+                 router: Optional[ModelRouter] = None, record_path: Optional[str] = None):
+        self.max_concurrency = max_concurrency or int(os.getenv('LLM_MAX_CONCURRENCY', '32'))
+        if method_limits is None:
+            method_limits = parse_method_limits(os.getenv('LLM_METHOD_CONCURRENCY', ''))
+        self.method_limits = method_limits
+        self.request_timeout = request_timeout or float(os.getenv('LLM_REQUEST_TIMEOUT', '60'))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv('LLM_MAX_RETRIES', '2'))
+        self.retry_backoff = float(os.getenv('LLM_RETRY_BACKOFF', '0.5'))
+        self.retry_backoff_max = float(os.getenv('LLM_RETRY_BACKOFF_MAX', '8'))
+        self.router = router or ModelRouter.from_env()
+        self.record_path = record_path if record_path is not None else os.getenv('LLM_RECORD_PROMPTS')
+
+        self.breaker_failures = int(os.getenv('LLM_BREAKER_FAILURES', '5'))
+        self.breaker_reset = float(os.getenv('LLM_BREAKER_RESET', '30'))
+        self.hedge_methods = {m.strip() for m in os.getenv('LLM_HEDGE_METHODS', '').split(',') if m.strip()}
+        self.hedge_delay = float(os.getenv('LLM_HEDGE_DELAY', '2.0'))
+        self.hedge_min_samples = int(os.getenv('LLM_HEDGE_MIN_SAMPLES', '20'))
+
+        self._endpoints = None
+        self._hedge_pool = None
+        self._recent = {}
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._global_slots = threading.BoundedSemaphore(self.max_concurrency)
+        self._method_slots = {}
+        self._in_flight = 0
+        self._by_method = {}
+
+    @property
+    def client(self) -> 'OpenAI':
+        """
+        Cliente OpenAI da primeira base de API
+        """
+        return self.endpoints[0]['client']
+
+    @property
+    def endpoints(self) -> List[Dict]:
+        """
+        Bases de API com cliente e circuit breaker próprios, criadas no primeiro uso
+        (lê OPENAI_API_BASE nesse momento; várias bases separadas por vírgula, em ordem de preferência)
+        """
+        if self._endpoints is None:
+            with self._lock:
+                if self._endpoints is None:
+                    urls = [url.strip() for url in os.getenv('OPENAI_API_BASE', '').split(',') if url.strip()]
+                    self._endpoints = [
+                        {
+                            'url': url,
+                            'client': self._create_client(url),
+                            'breaker': CircuitBreaker(url or 'default', self.breaker_failures, self.breaker_reset)
+                        }
+                        for url in urls or [None]
+                    ]
+        return self._endpoints
+
+    def _create_client(self, base_url: Optional[str] = None) -> 'OpenAI':
+        import httpx
+        from openai import OpenAI
+
+        http2 = os.getenv('LLM_HTTP2', 'false').lower() == 'true'
+        if http2 and importlib.util.find_spec('h2') is None:
+            print("LLM_HTTP2 requer o pacote h2 (pip install 'httpx[http2]'), usando HTTP/1.1")
+            http2 = False
+
+        http_client = httpx.Client(
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=int(os.getenv('LLM_MAX_CONNECTIONS', str(max(self.max_concurrency, 20)))),
+                max_keepalive_connections=int(os.getenv('LLM_MAX_KEEPALIVE', '20')),
+                keepalive_expiry=float(os.getenv('LLM_KEEPALIVE_EXPIRY', '30'))
+            ),
+            timeout=httpx.Timeout(self.request_timeout, connect=float(os.getenv('LLM_CONNECT_TIMEOUT', '5')))
+        )
+
+        # As novas tentativas ficam no gateway, que conhece o prazo de cada chamada
+        return OpenAI(
+            api_key=os.getenv('OPENAI_API_KEY'),
+            base_url=base_url,
+            http_client=http_client,
+            max_retries=0
+        )
+
+    def model_for(self, method: str) -> str:
+        """
+        Modelo principal do método segundo a tabela de roteamento
+        """
+        return self.router.model_for(method)
+
+    def create_completion(self, method: str, timeout: Optional[float] = None, **kwargs):
+        """
+        Chamada de chat completa dentro dos limites de concorrência
+        timeout é o prazo total (fila + tentativas); o uso de tokens é registrado por método
+        Sem model explícito, o modelo vem da tabela de roteamento
+        """
+        deadline = time.monotonic() + (timeout or self.request_timeout)
+        self._record_prompt(method, kwargs)
+
+        if self._hedging(method) and not kwargs.get('stream'):
+            # Cada pedido do hedge ocupa a sua própria vaga (ver _hedged_attempt)
+            response = self._call_routed(method, deadline, kwargs)
+        else:
+            with self._slot(method, deadline):
+                response = self._call_routed(method, deadline, kwargs)
+
+        token_usage.record_response(method, kwargs.get('messages', []), response)
+        return response
+
+    def stream_completion(self, method: str, timeout: Optional[float] = None, **kwargs) -> Iterator:
+        """
+        Chamada de chat em streaming; a vaga fica ocupada até o fim do stream
+        timeout limita a fila e o início da resposta (e cada leitura do stream);
+        o tempo de upstream vai até o fim da leitura do stream
+        """
+        deadline = time.monotonic() + (timeout or self.request_timeout)
+        self._record_prompt(method, dict(kwargs, stream=True))
+
+        with self._slot(method, deadline):
+            started = time.monotonic()
+            stream = self._call_routed(method, deadline, dict(kwargs, stream=True), record_success=False)
+            try:
+                yield from stream
+            finally:
+                self._record(method, calls=1, upstream=time.monotonic() - started)
+
+    def _call_routed(self, method: str, deadline: float, kwargs: Dict, record_success: bool = True):
+        """
+        Tenta os modelos da rota em ordem; erros da API passam ao próximo enquanto houver prazo
+        """
+        from openai import APIError
+
+        models = [kwargs['model']] if kwargs.get('model') else self.router.models_for(method)
+
+        for i, model in enumerate(models):
+            try:
+                response = self._call_with_retries(method, deadline, dict(kwargs, model=model), record_success)
+                with self._lock:
+                    models_used = self._stats(method)['models']
+                    models_used[model] = models_used.get(model, 0) + 1
+                return response
+            except APIError as e:
+                if i == len(models) - 1 or time.monotonic() >= deadline:
+                    raise
+                print(f"Erro em {method} com {model} ({e.__class__.__name__}), usando {models[i + 1]}")
+                with self._lock:
+                    self._stats(method)['fallbacks'] += 1
+
+    def _record_prompt(self, method: str, kwargs: Dict):
+        """
+        Acrescenta a chamada ao arquivo de gravação (sem o modelo, que vem do roteamento no replay)
+        """
+        if not self.record_path:
+            return
+
+        params = {key: value for key, value in kwargs.items() if key not in ('model', 'timeout')}
+        line = json.dumps({'method': method, 'params': params}, ensure_ascii=False)
+        try:
+            with self._lock, open(self.record_path, 'a') as f:
+                f.write(line + '\n')
+        except OSError as e:
+            print(f"Erro ao gravar prompt em {self.record_path}: {e}")
+
+    def _call_with_retries(self, method: str, deadline: float, kwargs: Dict, record_success: bool = True):
+        """
+        Tentativas com backoff exponencial e jitter total; cada nova tentativa prefere outra base
+        """
+        retryable = retryable_errors()
+        attempt = 0
+        tried = []
+        while True:
+            if time.monotonic() >= deadline:
+                self._record(method, timeouts=1)
+                raise LLMDeadlineExceeded(f'{method}: deadline exceeded after {attempt} attempts')
+
+            try:
+                if self._hedging(method) and not kwargs.get('stream'):
+                    return self._hedged_attempt(method, deadline, kwargs, tried, record_success)
+                return self._attempt(method, deadline, kwargs, tried, record_success)
+            except retryable:
+                backoff = random.uniform(0, min(self.retry_backoff_max, self.retry_backoff * (2 ** attempt)))
+                if attempt >= self.max_retries or time.monotonic() + backoff >= deadline:
+                    raise
+                attempt += 1
+                self._record(method, retries=1)
+                time.sleep(backoff)
+
+    def _attempt(self, method: str, deadline: float, kwargs: Dict, tried: List[str], record_success: bool = True):
+        """
+        Uma chamada na primeira base com circuito fechado, de preferência uma ainda não tentada
+        """
+        from openai import APITimeoutError
+
+        endpoint = self._pick_endpoint(method, tried)
+        tried.append(endpoint['url'])
+        breaker = endpoint['breaker']
+
+        started = time.monotonic()
+        try:
+            response = endpoint['client'].chat.completions.create(
+                timeout=max(0.001, deadline - time.monotonic()), **kwargs
+            )
+        except retryable_errors() as e:
+            breaker.record_failure()
+            self._record(method, errors=1, upstream=time.monotonic() - started,
+                         timeouts=int(isinstance(e, APITimeoutError)))
+            raise
+        except Exception:
+            # A base respondeu (ex: 400/404): o erro é do pedido, não da disponibilidade
+            breaker.record_success()
+            self._record(method, errors=1, upstream=time.monotonic() - started)
+            raise
+
+        breaker.record_success()
+        if record_success:
+            elapsed = time.monotonic() - started
+            self._record(method, calls=1, upstream=elapsed)
+            with self._lock:
+                self._recent.setdefault(method, deque(maxlen=200)).append(elapsed)
+        return response
+
+    def _pick_endpoint(self, method: str, tried: List[str]) -> Dict:
+        endpoints = sorted(self.endpoints, key=lambda endpoint: endpoint['url'] in tried)
+        for endpoint in endpoints:
+            if endpoint['breaker'].allow():
+                if tried and endpoint['url'] != tried[-1]:
+                    self._record(method, failovers=1)
+                return endpoint
+
+        self._record(method, circuit_rejections=1)
+        raise LLMCircuitOpen(f'{method}: circuit open for all {len(endpoints)} API bases')
+
+    def _hedging(self, method: str) -> bool:
+        return method in self.hedge_methods or '*' in self.hedge_methods
+
+    def _hedge_delay(self, method: str) -> float:
+        """
+        p95 recente de latência do método (LLM_HEDGE_DELAY enquanto houver poucas amostras)
+        """
+        with self._lock:
+            recent = sorted(self._recent.get(method, ()))
+        if len(recent) < self.hedge_min_samples:
+            return self.hedge_delay
+        return recent[int(0.95 * (len(recent) - 1))]
+
+    def _hedged_attempt(self, method: str, deadline: float, kwargs: Dict, tried: List[str],
+                        record_success: bool = True):
+        """
+        Envia um segundo pedido (em outra base, se houver) quando o primeiro passa do p95;
+        fica com a primeira resposta bem-sucedida e a outra é descartada ao terminar
+        Cada pedido usa a sua cópia da lista de bases tentadas (as threads não a compartilham);
+        no fim as bases usadas voltam para tried, para a próxima tentativa preferir outra
+        Cada pedido ocupa uma vaga nos limites de concorrência até terminar, mesmo descartado
+        (drain espera por ele); sem vaga livre no momento o hedge não é enviado
+        """
+        if self._hedge_pool is None:
+            with self._lock:
+                if self._hedge_pool is None:
+                    self._hedge_pool = ThreadPoolExecutor(
+                        max_workers=2 * self.max_concurrency, thread_name_prefix='llm-hedge'
+                    )
+
+        primary_tried = list(tried)
+        primary = self._submit_leg(self._acquire_slot(method, deadline), method, deadline, kwargs,
+                                   primary_tried, record_success)
+        done, _ = wait([primary], timeout=min(self._hedge_delay(method), max(0.0, deadline - time.monotonic())))
+        if done:
+            tried[:] = primary_tried
+            return primary.result()
+
+        hedge_slot = self._acquire_slot(method, deadline, blocking=False)
+        if hedge_slot is None:
+            # Limite de concorrência cheio: um pedido a mais só aumentaria a carga
+            self._record(method, hedges_skipped=1)
+            try:
+                return self._first_hedged_result(method, deadline, primary)
+            finally:
+                tried[:] = primary_tried
+
+        self._record(method, hedges=1)
+        # Cópia tirada agora: inclui a base do primeiro pedido se ele já começou
+        hedge_tried = list(primary_tried)
+        hedge = self._submit_leg(hedge_slot, method, deadline, kwargs, hedge_tried, record_success)
+        try:
+            return self._first_hedged_result(method, deadline, primary, hedge)
+        finally:
+            tried[:] = hedge_tried + [url for url in primary_tried if url not in hedge_tried]
+
+    def _submit_leg(self, acquired: List[threading.BoundedSemaphore], method: str, deadline: float,
+                    kwargs: Dict, tried: List[str], record_success: bool):
+        """
+        Executa um pedido do hedge no pool; a vaga já reservada é liberada quando ele termina
+        """
+        def leg():
+            try:
+                return self._attempt(method, deadline, kwargs, tried, record_success)
+            finally:
+                self._release_slot(method, acquired)
+
+        try:
+            return self._hedge_pool.submit(leg)
+        except Exception:
+            self._release_slot(method, acquired)
+            raise
+
+    def _first_hedged_result(self, method: str, deadline: float, primary, hedge=None):
+        """
+        Primeira resposta bem-sucedida entre o pedido original e o de hedge (se enviado)
+        """
+        pending = {future for future in (primary, hedge) if future is not None}
+        error = None
+
+        while pending:
+            done, pending = wait(pending, timeout=max(0.0, deadline - time.monotonic()) + 1.0,
+                                 return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                try:
+                    response = future.result()
+                except Exception as e:
+                    error = error or e
+                    continue
+                if future is hedge:
+                    self._record(method, hedge_wins=1)
+                return response
+
+        if error is not None:
+            raise error
+        self._record(method, timeouts=1)
+        raise LLMDeadlineExceeded(f'{method}: deadline exceeded waiting for hedged requests')
+
+    def drain(self, timeout: Optional[float] = None) -> bool:
+        """
+        Espera as chamadas em andamento terminarem (usado no desligamento gracioso)
+        Retorna False se ainda havia chamadas quando o tempo acabou
+        """
+        with self._idle:
+            return self._idle.wait_for(lambda: self._in_flight == 0, timeout)
+
+    def _method_semaphore(self, method: str) -> Optional[threading.BoundedSemaphore]:
+        limit = self.method_limits.get(method)
+        if not limit:
+            return None
+
+        with self._lock:
+            if method not in self._method_slots:
+                self._method_slots[method] = threading.BoundedSemaphore(limit)
+            return self._method_slots[method]
+
+    @contextmanager
+    def _slot(self, method: str, deadline: float):
+        """
+        Vaga no limite do método e no global, esperando no máximo até o prazo da chamada
+        """
+        acquired = self._acquire_slot(method, deadline)
+        try:
+            yield
+        finally:
+            self._release_slot(method, acquired)
+
+    def _acquire_slot(self, method: str, deadline: float,
+                      blocking: bool = True) -> Optional[List[threading.BoundedSemaphore]]:
+        """
+        Reserva a vaga e a conta em andamento; sem blocking retorna None se não houver vaga livre
+        Os semáforos reservados devem voltar em _release_slot
+        """
+        acquired = []
+        started = time.monotonic()
+        try:
+            for semaphore in (self._method_semaphore(method), self._global_slots):
+                if semaphore is None:
+                    continue
+                if not blocking:
+                    if not semaphore.acquire(blocking=False):
+                        for held in reversed(acquired):
+                            held.release()
+                        return None
+                elif not semaphore.acquire(timeout=max(0.0, deadline - time.monotonic())):
+                    with self._lock:
+                        self._stats(method)['queue_timeouts'] += 1
+                    raise LLMQueueTimeout(f'{method}: no free slot before the deadline')
+                acquired.append(semaphore)
+        except BaseException:
+            for semaphore in reversed(acquired):
+                semaphore.release()
+            raise
+
+        waited = time.monotonic() - started
+        with self._lock:
+            stats = self._stats(method)
+            stats['acquired'] += 1
+            stats['in_flight'] += 1
+            stats['queue_wait_total'] += waited
+            stats['queue_wait_max'] = max(stats['queue_wait_max'], waited)
+            self._in_flight += 1
+        return acquired
+
+    def _release_slot(self, method: str, acquired: List[threading.BoundedSemaphore]):
+        with self._lock:
+            self._stats(method)['in_flight'] -= 1
+            self._in_flight -= 1
+            if self._in_flight == 0:
+                self._idle.notify_all()
+        for semaphore in reversed(acquired):
+            semaphore.release()
+
+    def _stats(self, method: str) -> Dict:
+        return self._by_method.setdefault(method, {
+            'calls': 0,
+            'errors': 0,
+            'timeouts': 0,
+            'retries': 0,
+            'fallbacks': 0,
+            'failovers': 0,
+            'circuit_rejections': 0,
+            'hedges': 0,
+            'hedges_skipped': 0,
+            'hedge_wins': 0,
+            'models': {},
+            'queue_timeouts': 0,
+            'in_flight': 0,
+            'acquired': 0,
+            'queue_wait_total': 0.0,
+            'queue_wait_max': 0.0,
+            'upstream_total': 0.0,
+            'upstream_max': 0.0,
+            'upstream_samples': 0
+        })
+
+    def _record(self, method: str, calls: int = 0, errors: int = 0, timeouts: int = 0, retries: int = 0,
+                upstream: Optional[float] = None, **counters: int):
+        with self._lock:
+            stats = self._stats(method)
+            stats['calls'] += calls
+            stats['errors'] += errors
+            stats['timeouts'] += timeouts
+            stats['retries'] += retries
+            for name, value in counters.items():
+                stats[name] += value
+            if upstream is not None:
+                stats['upstream_total'] += upstream
+                stats['upstream_max'] = max(stats['upstream_max'], upstream)
+                stats['upstream_samples'] += 1
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            by_method = {}
+            for method, stats in self._by_method.items():
+                acquired = stats['acquired']
+                samples = stats['upstream_samples']
+                by_method[method] = {
+                    'calls': stats['calls'],
+                    'errors': stats['errors'],
+                    'timeouts': stats['timeouts'],
+                    'retries': stats['retries'],
+                    'fallbacks': stats['fallbacks'],
+                    'failovers': stats['failovers'],
+                    'circuit_rejections': stats['circuit_rejections'],
+                    'hedges': stats['hedges'],
+                    'hedges_skipped': stats['hedges_skipped'],
+                    'hedge_wins': stats['hedge_wins'],
+                    'models': dict(stats['models']),
+                    'queue_timeouts': stats['queue_timeouts'],
+                    'in_flight': stats['in_flight'],
+                    'limit': self.method_limits.get(method),
+                    'average_queue_wait_ms': stats['queue_wait_total'] / acquired * 1000 if acquired else 0.0,
+                    'max_queue_wait_ms': stats['queue_wait_max'] * 1000,
+                    'average_upstream_ms': stats['upstream_total'] / samples * 1000 if samples else 0.0,
+                    'max_upstream_ms': stats['upstream_max'] * 1000
+                }
+
+            in_flight = self._in_flight
+
+        return {
+            'max_concurrency': self.max_concurrency,
+            'in_flight': in_flight,
+            'routing': self.router.snapshot(),
+            'endpoints': [endpoint['breaker'].snapshot() for endpoint in self._endpoints or []],
+            'hedging': {
+                'methods': sorted(self.hedge_methods),
+                'delay_ms': {method: self._hedge_delay(method) * 1000 for method in sorted(by_method)
+                             if self._hedging(method)}
+            },
+            'by_method': by_method
+        }
+
+llm_gateway = LLMGateway()
@@ -0,0 +1,113 @@
+"""
+Roteamento de modelos por método do serviço
+
+Cada método (o mesmo nome usado nas métricas: 'reply', 'message_analysis', ...)
+aponta para uma cadeia de níveis; o gateway usa o primeiro modelo e passa ao
+seguinte se a chamada falhar. Níveis são apelidos de modelos.
+
+Configuração (as variáveis de ambiente têm precedência sobre o arquivo):
+    LLM_ROUTING_FILE=routing.json  {"tiers": {...}, "routes": {...}, "default_route": [...]}
+    LLM_MODEL_TIERS="standard=gpt-4,fast=gpt-4o-mini"
+    LLM_MODEL_ROUTES="message_analysis=fast>standard,pronunciation_analysis=fast>standard"
+    LLM_DEFAULT_ROUTE="standard"
+
+Sem configuração todos os métodos usam o nível 'standard' (gpt-4).
+"""
+
+import os
+import json
+from typing import Dict, List, Optional
+
+DEFAULT_MODEL_TIERS = {
+    'standard': 'gpt-4',
+    'fast': 'gpt-4o-mini'
+}
+
+DEFAULT_ROUTE = ['standard']
+
+def parse_tiers(raw: str) -> Dict[str, str]:
+    """
+    Lê níveis no formato 'nivel=modelo,outro=modelo'
+    """
+    tiers = {}
+    for part in (raw or '').split(','):
+        if '=' in part:
+            tier, model = part.split('=', 1)
+            tiers[tier.strip()] = model.strip()
+    return tiers
+
+def parse_chain(raw: str) -> List[str]:
+    """
+    Lê uma cadeia de fallback no formato 'fast>standard'
+    """
+    return [step.strip() for step in (raw or '').split('>') if step.strip()]
+
+def parse_routes(raw: str) -> Dict[str, List[str]]:
+    """
+    Lê rotas no formato 'metodo=fast>standard,outro=standard'
+    """
+    routes = {}
+    for part in (raw or '').split(','):
+        if '=' in part:
+            method, chain = part.split('=', 1)
+            routes[method.strip()] = parse_chain(chain)
+    return routes
+
+class ModelRouter:
+    """
+    Tabela método → cadeia de níveis → modelos
+    """
+
+    def __init__(self, tiers: Optional[Dict[str, str]] = None, routes: Optional[Dict[str, List[str]]] = None,
+                 default_route: Optional[List[str]] = None):
+        self.tiers = dict(DEFAULT_MODEL_TIERS, **(tiers or {}))
+        self.routes = routes or {}
+        self.default_route = default_route or DEFAULT_ROUTE
+
+    @classmethod
+    def from_env(cls) -> 'ModelRouter':
+        """
+        Tabela lida de LLM_ROUTING_FILE e das variáveis LLM_MODEL_TIERS/LLM_MODEL_ROUTES/LLM_DEFAULT_ROUTE
+        """
+        config = {}
+        path = os.getenv('LLM_ROUTING_FILE')
+        if path:
+            try:
+                with open(path) as f:
+                    config = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Erro ao ler roteamento de modelos em {path}: {e}")
+
+        tiers = dict(config.get('tiers', {}), **parse_tiers(os.getenv('LLM_MODEL_TIERS', '')))
+        routes = {
+            method: chain if isinstance(chain, list) else parse_chain(chain)
+            for method, chain in config.get('routes', {}).items()
+        }
+        routes.update(parse_routes(os.getenv('LLM_MODEL_ROUTES', '')))
+        default_route = parse_chain(os.getenv('LLM_DEFAULT_ROUTE', '')) or config.get('default_route')
+
+        return cls(tiers, routes, default_route)
+
+    def models_for(self, method: str) -> List[str]:
+        """
+        Modelos a tentar, em ordem (nomes fora da tabela de níveis são usados como modelo)
+        """
+        models = []
+        for step in self.routes.get(method, self.default_route):
+            model = self.tiers.get(step, step)
+            if model not in models:
+                models.append(model)
+        return models
+
+    def model_for(self, method: str) -> str:
+        """
+        Modelo principal do método (usado também nas chaves de cache)
+        """
+        return self.models_for(method)[0]
+
+    def snapshot(self) -> Dict:
+        return {
+            'tiers': self.tiers,
+            'default_route': self.default_route,
+            'routes': self.routes
+        }
@@ -0,0 +1,210 @@
+import os
+import re
+import math
+import textwrap
+import threading
+from collections import deque
+from typing import Dict, List, Optional
+
+# Orçamento de tokens do prompt de resposta (contexto do modelo menos max_tokens da resposta)
+PROMPT_TOKEN_BUDGET = int(os.getenv('PROMPT_TOKEN_BUDGET', '3000'))
+
+# Orçamento máximo do contexto de perfil do usuário dentro do prompt
+PROFILE_TOKEN_BUDGET = int(os.getenv('PROFILE_TOKEN_BUDGET', '200'))
+
+# Tokens extras que a API adiciona por mensagem e para iniciar a resposta
+TOKENS_PER_MESSAGE = 4
+TOKENS_REPLY_PRIMING = 3
+
+_encoding = None
+_encoding_loaded = False
+
+def _get_encoding():
+    """
+    Carrega o encoding do tokenizer local uma única vez (None se indisponível)
+    tiktoken é importado só aqui, na primeira contagem, e não na importação do módulo
+    """
+    global _encoding, _encoding_loaded
+
+    if not _encoding_loaded:
+        _encoding_loaded = True
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding(os.getenv('TOKENIZER_ENCODING', 'cl100k_base'))
+        except ImportError:
+            print("tiktoken não instalado, usando contagem aproximada de tokens")
+        except Exception as e:
+            print(f"Tokenizer indisponível, usando contagem aproximada: {e}")
+
+    return _encoding
+
+def count_tokens(text: str) -> int:
+    """
+    Conta tokens de um texto com o tokenizer local (ou ~4 caracteres por token)
+    """
+    if not text:
+        return 0
+
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+
+    return math.ceil(len(text) / 4)
+
+def count_message_tokens(messages: List[Dict]) -> int:
+    """
+    Conta os tokens de uma lista de mensagens no formato chat
+    """
+    return sum(TOKENS_PER_MESSAGE + count_tokens(msg.get('content', '')) for msg in messages) + TOKENS_REPLY_PRIMING
+
+def normalize_template(text: str) -> str:
+    """
+    Remove a indentação comum, espaços no fim das linhas e linhas em branco repetidas
+    """
+    text = textwrap.dedent(text).strip()
+    text = re.sub(r'[ \t]+\n', '\n', text)
+    return re.sub(r'\n{3,}', '\n\n', text)
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """
+    Corta o texto (por linhas) até caber no limite de tokens
+    """
+    if count_tokens(text) <= max_tokens:
+        return text
+
+    lines = text.split('\n')
+    while lines and count_tokens('\n'.join(lines)) > max_tokens:
+        lines.pop()
+    return '\n'.join(lines)
+
+class PromptTemplate:
+    """
+    Template de prompt normalizado uma única vez, na importação do módulo
+
+    Os campos variáveis usam a sintaxe de str.format ({campo}); chaves literais
+    (como nos exemplos de JSON) são escritas em dobro.
+    """
+
+    def __init__(self, name: str, text: str):
+        self.name = name
+        self.text = normalize_template(text)
+
+    def render(self, **values) -> str:
+        return self.text.format(**values)
+
+class PromptBuilder:
+    """
+    Monta o prompt de resposta respeitando o orçamento de tokens
+
+    Ordem fixa: prompt de sistema (estático, idêntico byte a byte entre chamadas
+    para aproveitar o cache de prompt do provedor), perfil, resumo, histórico
+    recente e mensagem atual. Quando o orçamento estoura, o perfil é cortado até
+    PROFILE_TOKEN_BUDGET e as mensagens mais antigas do histórico são descartadas.
+    """
+
+    def __init__(self, system_prompt: PromptTemplate, token_budget: Optional[int] = None,
+                 profile_budget: Optional[int] = None):
+        self.system_message = {"role": "system", "content": system_prompt.render()}
+        self.token_budget = token_budget or PROMPT_TOKEN_BUDGET
+        self.profile_budget = profile_budget or PROFILE_TOKEN_BUDGET
+        self.static_tokens = TOKENS_PER_MESSAGE + count_tokens(self.system_message['content'])
+
+    def build(self, user_message: str, history: List[Dict], profile_context: str = '',
+              summary: Optional[str] = None) -> List[Dict]:
+        messages = [self.system_message]
+        used = self.static_tokens + TOKENS_REPLY_PRIMING
+
+        if profile_context:
+            profile_context = truncate_to_tokens(profile_context, self.profile_budget)
+            messages.append({"role": "system", "content": profile_context})
+            used += TOKENS_PER_MESSAGE + count_tokens(profile_context)
+
+        if summary:
+            summary_content = f"Summary of the earlier part of this conversation: {summary}"
+            messages.append({"role": "system", "content": summary_content})
+            used += TOKENS_PER_MESSAGE + count_tokens(summary_content)
+
+        current = {"role": "user", "content": user_message}
+        used += TOKENS_PER_MESSAGE + count_tokens(user_message)
+
+        # Histórico: das mensagens mais recentes para as mais antigas, enquanto couber
+        recent = []
+        for msg in reversed(history):
+            msg_tokens = TOKENS_PER_MESSAGE + count_tokens(msg['content'])
+            if used + msg_tokens > self.token_budget:
+                break
+            recent.append({
+                "role": "user" if msg["sender"] == "user" else "assistant",
+                "content": msg["content"]
+            })
+            used += msg_tokens
+
+        messages.extend(reversed(recent))
+        messages.append(current)
+        return messages
+
+class TokenUsageMetrics:
+    """
+    Contadores de tokens de prompt/resposta por método e as últimas chamadas
+    """
+
+    def __init__(self, recent_calls: int = 100):
+        self._lock = threading.Lock()
+        self._by_method = {}
+        self._recent = deque(maxlen=recent_calls)
+
+    def record(self, method: str, prompt_tokens: int, completion_tokens: int, estimated: bool = False):
+        with self._lock:
+            stats = self._by_method.setdefault(method, {
+                'calls': 0,
+                'prompt_tokens': 0,
+                'completion_tokens': 0,
+                'estimated_calls': 0
+            })
+            stats['calls'] += 1
+            stats['prompt_tokens'] += prompt_tokens
+            stats['completion_tokens'] += completion_tokens
+            if estimated:
+                stats['estimated_calls'] += 1
+
+            self._recent.append({
+                'method': method,
+                'prompt_tokens': prompt_tokens,
+                'completion_tokens': completion_tokens,
+                'estimated': estimated
+            })
+
+    def record_response(self, method: str, messages: List[Dict], response=None, completion_text: str = ''):
+        """
+        Registra o uso informado pela API (response.usage) ou, na falta dele, a contagem local
+        """
+        usage = getattr(response, 'usage', None)
+        if usage is not None and getattr(usage, 'prompt_tokens', None) is not None:
+            self.record(method, usage.prompt_tokens, usage.completion_tokens or 0)
+            return
+
+        if not completion_text and response is not None:
+            try:
+                completion_text = response.choices[0].message.content or ''
+            except (AttributeError, IndexError):
+                completion_text = ''
+
+        self.record(method, count_message_tokens(messages), count_tokens(completion_text), estimated=True)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            by_method = {}
+            for method, stats in self._by_method.items():
+                by_method[method] = {
+                    **stats,
+                    'avg_prompt_tokens': stats['prompt_tokens'] / stats['calls'],
+                    'avg_completion_tokens': stats['completion_tokens'] / stats['calls']
+                }
+
+            return {
+                'tokenizer': 'tiktoken' if _get_encoding() is not None else 'approximate',
+                'by_method': by_method,
+                'recent_calls': list(self._recent)
+            }
+
+token_usage = TokenUsageMetrics()
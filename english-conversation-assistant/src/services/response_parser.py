@@ -0,0 +1,237 @@
+"""
+Leitura das respostas estruturadas (JSON) dos modelos
+
+- Modo JSON (response_format) quando o backend suporta (LLM_JSON_MODE=true)
+- Parser incremental e tolerante que repara respostas truncadas por max_tokens
+- Validação contra os esquemas pydantic de cada tipo de análise
+- Taxa de falhas de parse por método e tokens de resposta desperdiçados
+"""
+
+import os
+import json
+import threading
+from typing import TYPE_CHECKING, Any, Dict, Optional, Tuple, Type
+from src.services.prompt_builder import count_tokens
+
+if TYPE_CHECKING:
+    from pydantic import BaseModel
+
+# response_format={"type": "json_object"} exige um modelo que suporte o modo JSON
+# (ex: gpt-4o, gpt-4-turbo); o gpt-4 original rejeita o parâmetro
+JSON_MODE = os.getenv('LLM_JSON_MODE', 'false').lower() == 'true'
+
+_WHITESPACE = ' \t\r\n'
+_CLOSERS = {'{': '}', '[': ']'}
+
+def json_mode_kwargs() -> Dict:
+    """
+    Parâmetros extras da chamada para pedir JSON puro ao modelo (se ativado)
+    """
+    return {'response_format': {'type': 'json_object'}} if JSON_MODE else {}
+
+class IncrementalJSONParser:
+    """
+    Parser de JSON tolerante alimentado em pedaços (ex: chunks de streaming)
+
+    Ignora texto antes do primeiro { ou [ (prosa, ```json) e depois do fim do
+    documento. Guarda o último ponto em que o texto lido forma um valor completo;
+    se a resposta for cortada, result() fecha os objetos/listas abertos a partir
+    desse ponto. Strings e números incompletos no fim e objetos/listas internos
+    ainda vazios são descartados.
+    """
+
+    def __init__(self):
+        self._parts = []
+        self._length = 0
+        self._start = None
+        self._stack = []  # [abertura, esperado] para cada objeto/lista aberto
+        self._in_string = False
+        self._string_is_key = False
+        self._escape = False
+        self._unicode_left = 0
+        self._in_scalar = False
+        self._checkpoint = None  # (posição final, fechamentos pendentes)
+        self.done = False
+
+    def feed(self, chunk: str):
+        if not chunk or self.done:
+            return
+
+        offset = self._length
+        self._parts.append(chunk)
+        self._length += len(chunk)
+
+        for i, c in enumerate(chunk):
+            self._consume(c, offset + i)
+            if self.done:
+                break
+
+    def _consume(self, c: str, pos: int):
+        if self._start is None:
+            if c in _CLOSERS:
+                self._start = pos
+                self._open(c, pos)
+            return
+
+        if self._in_string:
+            if self._escape:
+                self._escape = False
+                if c == 'u':
+                    self._unicode_left = 4
+            elif self._unicode_left:
+                self._unicode_left -= 1
+            elif c == '\\':
+                self._escape = True
+            elif c == '"':
+                self._in_string = False
+                if self._string_is_key:
+                    self._stack[-1][1] = 'colon'
+                else:
+                    self._value_done(pos + 1)
+            return
+
+        if self._in_scalar:
+            if c not in _WHITESPACE and c not in ',}]':
+                return
+            self._in_scalar = False
+            self._value_done(pos)
+
+        if c in _WHITESPACE:
+            return
+
+        top = self._stack[-1]
+        if c == '"':
+            self._in_string = True
+            self._string_is_key = top[0] == '{' and top[1] == 'key'
+        elif c in _CLOSERS:
+            self._open(c, pos)
+        elif c in '}]':
+            self._stack.pop()
+            if self._stack:
+                self._value_done(pos + 1)
+            else:
+                self._checkpoint = (pos + 1, '')
+                self.done = True
+        elif c == ':':
+            top[1] = 'value'
+        elif c == ',':
+            top[1] = 'key' if top[0] == '{' else 'value'
+        else:
+            self._in_scalar = True
+
+    def _open(self, c: str, pos: int):
+        self._stack.append([c, 'key' if c == '{' else 'value'])
+        # Objetos/listas internos só entram no resultado depois do primeiro valor
+        if len(self._stack) == 1:
+            self._save_checkpoint(pos + 1)
+
+    def _value_done(self, end: int):
+        self._stack[-1][1] = 'comma'
+        self._save_checkpoint(end)
+
+    def _save_checkpoint(self, end: int):
+        self._checkpoint = (end, ''.join(_CLOSERS[entry[0]] for entry in reversed(self._stack)))
+
+    @property
+    def repaired(self) -> bool:
+        return not self.done
+
+    def result(self) -> Any:
+        """
+        Valor lido até agora (reparado se incompleto); ValueError se não houver JSON
+        """
+        if self._checkpoint is None:
+            raise ValueError('no JSON value found')
+
+        end, closers = self._checkpoint
+        text = ''.join(self._parts)
+        return json.loads(text[self._start:end] + closers)
+
+def parse_json_text(text: str) -> Tuple[Any, bool]:
+    """
+    Lê o JSON de uma resposta do modelo
+    Retorna (valor, reparado); ValueError se nada puder ser aproveitado
+    """
+    text = text or ''
+    starts = [i for i in (text.find('{'), text.find('[')) if i >= 0]
+    if not starts:
+        raise ValueError('no JSON value found')
+
+    # Caminho rápido (decoder em C): documento completo, com ou sem texto ao redor
+    try:
+        value, _ = json.JSONDecoder().raw_decode(text, min(starts))
+        return value, False
+    except json.JSONDecodeError:
+        pass
+
+    parser = IncrementalJSONParser()
+    parser.feed(text)
+    return parser.result(), parser.repaired
+
+class ParseMetrics:
+    """
+    Resultado do parse das respostas estruturadas por método
+    """
+
+    OUTCOMES = ('parsed', 'repaired', 'invalid_json', 'schema_error')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_method = {}
+
+    def record(self, method: str, outcome: str, completion_tokens: int = 0):
+        with self._lock:
+            stats = self._by_method.setdefault(method, {
+                'responses': 0,
+                **{name: 0 for name in self.OUTCOMES},
+                'wasted_completion_tokens': 0
+            })
+            stats['responses'] += 1
+            stats[outcome] += 1
+            if outcome in ('invalid_json', 'schema_error'):
+                stats['wasted_completion_tokens'] += completion_tokens
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                method: {
+                    **stats,
+                    'failure_rate': (stats['invalid_json'] + stats['schema_error']) / stats['responses']
+                }
+                for method, stats in self._by_method.items()
+            }
+
+parse_metrics = ParseMetrics()
+
+def parse_structured_response(method: str, response, schema: Type['BaseModel']) -> Tuple[Optional[Dict], bool]:
+    """
+    Extrai, repara e valida o JSON de uma resposta da API de chat
+    Retorna (dados, reparado); dados é None quando a resposta não pôde ser aproveitada
+    """
+    text = response.choices[0].message.content or ''
+
+    usage = getattr(response, 'usage', None)
+    completion_tokens = getattr(usage, 'completion_tokens', None)
+    if completion_tokens is None:
+        completion_tokens = count_tokens(text)
+
+    try:
+        value, repaired = parse_json_text(text)
+        if not isinstance(value, dict):
+            raise ValueError(f'expected a JSON object, got {type(value).__name__}')
+    except ValueError as e:
+        parse_metrics.record(method, 'invalid_json', completion_tokens)
+        print(f"Erro ao parsear JSON de {method}: {e}: {text[:200]}")
+        return None, False
+
+    from pydantic import ValidationError  # já carregado junto com o esquema
+
+    try:
+        data = schema.model_validate(value).model_dump()
+    except ValidationError as e:
+        parse_metrics.record(method, 'schema_error', completion_tokens)
+        print(f"Resposta de {method} fora do esquema: {e}")
+        return None, False
+
+    parse_metrics.record(method, 'repaired' if repaired else 'parsed')
+    return data, repaired
@@ -0,0 +1,109 @@
+"""
+Esquemas (pydantic) das respostas estruturadas dos modelos
+
+Todos os campos têm valor padrão para que respostas truncadas e reparadas ainda
+validem; campos extras devolvidos pelo modelo são preservados.
+"""
+
+from typing import Dict, List, Optional
+from pydantic import BaseModel, ConfigDict, Field
+
+class LenientModel(BaseModel):
+    model_config = ConfigDict(extra='allow')
+
+# Análise de mensagem (AIConversationService._analyze_user_message_sync)
+
+class GrammarError(LenientModel):
+    error: str = ''
+    correction: str = ''
+    explanation: str = ''
+
+class VocabularyUsage(LenientModel):
+    word: str = ''
+    level: Optional[str] = None
+    usage: Optional[str] = None
+
+class FluencyIndicators(LenientModel):
+    sentence_complexity: Optional[str] = None
+    coherence: Optional[str] = None
+    natural_flow: Optional[str] = None
+
+class MessageAnalysis(LenientModel):
+    grammar_errors: List[GrammarError] = Field(default_factory=list)
+    vocabulary_used: List[VocabularyUsage] = Field(default_factory=list)
+    fluency_indicators: FluencyIndicators = Field(default_factory=FluencyIndicators)
+    confidence_score: float = Field(default=0.7, ge=0.0, le=1.0)
+    positive_aspects: List[str] = Field(default_factory=list)
+    suggestions: List[str] = Field(default_factory=list)
+    topics_mentioned: List[str] = Field(default_factory=list)
+
+# Análises de várias mensagens em uma chamada (AIConversationService, micro-batching)
+
+class BatchAnalysisItem(MessageAnalysis):
+    id: int = -1
+
+class MessageAnalysisBatch(LenientModel):
+    analyses: List[BatchAnalysisItem] = Field(default_factory=list)
+
+# Resposta + análise em uma chamada (AIConversationService, modo 'combined')
+
+class CombinedResponse(LenientModel):
+    reply: str = ''
+    analysis: MessageAnalysis = Field(default_factory=MessageAnalysis)
+
+# Insights de progresso (AIConversationService.generate_progress_insights)
+
+class ProgressInsights(LenientModel):
+    overall_progress: str = ''
+    strengths: List[str] = Field(default_factory=list)
+    areas_for_improvement: List[str] = Field(default_factory=list)
+    achievements: List[str] = Field(default_factory=list)
+    next_goals: List[str] = Field(default_factory=list)
+    motivation_message: str = ''
+    learning_recommendations: List[str] = Field(default_factory=list)
+
+# Análise de pronúncia (SpeechAnalysisService.analyze_pronunciation)
+
+class DifficultWord(LenientModel):
+    word: str = ''
+    phonetic: Optional[str] = None
+    difficulty: Optional[str] = None
+    common_mistakes: List[str] = Field(default_factory=list)
+    tips: Optional[str] = None
+
+class SoundFocusArea(LenientModel):
+    sound: str = ''
+    description: Optional[str] = None
+    practice_words: List[str] = Field(default_factory=list)
+    tip: Optional[str] = None
+
+class RhythmAndStress(LenientModel):
+    sentence_stress: Optional[str] = None
+    word_stress: List[str] = Field(default_factory=list)
+    intonation_tips: Optional[str] = None
+
+class PronunciationAnalysis(LenientModel):
+    overall_score: float = Field(default=0.7, ge=0.0, le=1.0)
+    difficult_words: List[DifficultWord] = Field(default_factory=list)
+    sound_focus_areas: List[SoundFocusArea] = Field(default_factory=list)
+    rhythm_and_stress: RhythmAndStress = Field(default_factory=RhythmAndStress)
+    encouragement: str = ''
+
+# Padrões de fala (SpeechAnalysisService.analyze_speech_patterns)
+
+class SpeechPatterns(LenientModel):
+    fluency_indicators: Dict = Field(default_factory=dict)
+    pronunciation_progress: Dict = Field(default_factory=dict)
+    vocabulary_usage: Dict = Field(default_factory=dict)
+    grammar_patterns: Dict = Field(default_factory=dict)
+    recommendations: List[str] = Field(default_factory=list)
+    encouragement: str = ''
+
+# Exercícios de pronúncia (SpeechAnalysisService.generate_pronunciation_exercises)
+
+class PronunciationExercises(LenientModel):
+    warm_up_exercises: List[Dict] = Field(default_factory=list)
+    sound_specific_drills: List[Dict] = Field(default_factory=list)
+    rhythm_exercises: List[Dict] = Field(default_factory=list)
+    daily_practice_plan: Dict = Field(default_factory=dict)
+    motivation: str = ''
@@ -1,222 +1,359 @@
 import os
 import json
-import re
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Tuple, Optional
-from openai import OpenAI
+from src.services.llm_cache import llm_cache
+from src.services.llm_gateway import llm_gateway
+from src.services.prompt_builder import PromptTemplate
+from src.services.response_parser import json_mode_kwargs, parse_structured_response
+from src.services.response_schemas import PronunciationAnalysis, SpeechPatterns, PronunciationExercises
+
+# Prompts normalizados uma única vez na importação; campos variáveis entre chaves
+PRONUNCIATION_ANALYSIS_PROMPT = PromptTemplate('pronunciation_analysis', """
+Analyze the pronunciation challenges for this English text based on common pronunciation issues.
+
+Text: "{text}"
+User Level: {user_level}
+
+Provide a JSON response with pronunciation analysis:
+{{
+    "overall_score": 0.0-1.0,
+    "difficult_words": [
+        {{
+            "word": "word",
+            "phonetic": "phonetic transcription",
+            "difficulty": "easy/medium/hard",
+            "common_mistakes": ["list of common pronunciation errors"],
+            "tips": "pronunciation tip"
+        }}
+    ],
+    "sound_focus_areas": [
+        {{
+            "sound": "phonetic sound like /θ/ or /r/",
+            "description": "description of the sound",
+            "practice_words": ["word1", "word2", "word3"],
+            "tip": "how to practice this sound"
+        }}
+    ],
+    "rhythm_and_stress": {{
+        "sentence_stress": "analysis of sentence stress patterns",
+        "word_stress": ["words with stress pattern issues"],
+        "intonation_tips": "tips for better intonation"
+    }},
+    "encouragement": "positive, encouraging message about pronunciation progress"
+}}
+
+Focus on the most relevant pronunciation challenges for a {user_level} level learner.
+Be encouraging and constructive in your feedback.
+""")
+
+SPEECH_PATTERNS_PROMPT = PromptTemplate('speech_patterns', """
+Analyze speech patterns and pronunciation development from these recent messages:
+
+Messages: "{combined_text}"
+
+Provide a JSON analysis of speech patterns:
+{{
+    "fluency_indicators": {{
+        "sentence_length_avg": "average sentence length",
+        "complexity_level": "simple/moderate/complex",
+        "hesitation_markers": ["um", "uh", "like", "you know"],
+        "confidence_indicators": ["phrases that show confidence or hesitation"]
+    }},
+    "pronunciation_progress": {{
+        "improved_sounds": ["sounds that seem to be improving"],
+        "challenging_sounds": ["sounds that need more work"],
+        "consistency": "how consistent pronunciation appears to be"
+    }},
+    "vocabulary_usage": {{
+        "advanced_words": ["more sophisticated vocabulary used"],
+        "repetitive_patterns": ["words or phrases used frequently"],
+        "variety_score": 0.0-1.0
+    }},
+    "grammar_patterns": {{
+        "common_structures": ["grammatical structures frequently used"],
+        "error_patterns": ["types of errors that appear consistently"],
+        "improvement_areas": ["grammar areas showing improvement"]
+    }},
+    "recommendations": [
+        "specific recommendations for pronunciation practice",
+        "suggestions for vocabulary expansion",
+        "grammar focus areas"
+    ],
+    "encouragement": "motivational message about progress observed"
+}}
+""")
+
+PRONUNCIATION_EXERCISES_PROMPT = PromptTemplate('pronunciation_exercises', """
+Create personalized pronunciation exercises for these challenging sounds: {sounds_text}
+User Level: {user_level}
+
+Generate a JSON response with pronunciation exercises:
+{{
+    "warm_up_exercises": [
+        {{
+            "title": "exercise name",
+            "description": "what to do",
+            "examples": ["example1", "example2", "example3"]
+        }}
+    ],
+    "sound_specific_drills": [
+        {{
+            "target_sound": "phonetic sound",
+            "minimal_pairs": [["word1", "word2"], ["word3", "word4"]],
+            "practice_sentences": ["sentence with target sound"],
+            "tongue_twisters": ["fun tongue twister for practice"]
+        }}
+    ],
+    "rhythm_exercises": [
+        {{
+            "type": "stress pattern practice",
+            "sentences": ["sentences with marked stress"],
+            "instructions": "how to practice rhythm and stress"
+        }}
+    ],
+    "daily_practice_plan": {{
+        "duration": "recommended daily practice time",
+        "sequence": ["step 1", "step 2", "step 3"],
+        "progress_tracking": "how to track improvement"
+    }},
+    "motivation": "encouraging message about pronunciation practice"
+}}
+
+Make exercises appropriate for {user_level} level and engaging to practice.
+""")
 
 class SpeechAnalysisService:
+    # Versões dos prompts cacheáveis (incrementar ao alterar o texto do prompt)
+    PROMPT_VERSIONS = {
+        'pronunciation_analysis': 2,
+        'pronunciation_exercises': 2,
+        'speech_patterns': 1
+    }
+    
     def __init__(self):
-        self.client = OpenAI(
-            api_key=os.getenv('OPENAI_API_KEY'),
-            base_url=os.getenv('OPENAI_API_BASE')
+        # Pool limitado de threads para as variantes assíncronas das análises
+        self.executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv('SPEECH_SERVICE_MAX_WORKERS', '8')),
+            thread_name_prefix='speech-service'
+        )
+        
+        # Tempo máximo (segundos) de cada análise no feedback de fala combinado
+        self.analysis_timeout = float(os.getenv('SPEECH_ANALYSIS_TIMEOUT', '20'))
+    
+    async def _run_blocking(self, func, *args, **kwargs):
+        """
+        Executa uma chamada síncrona (ex: cliente OpenAI) no pool de threads do serviço
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor, functools.partial(func, *args, **kwargs)
         )
     
-    def analyze_pronunciation(self, text: str, user_level: str = 'intermediate') -> Dict:
+    async def analyze_pronunciation_async(self, text: str, user_level: str = 'intermediate', 
+                                          bypass_cache: bool = False) -> Dict:
+        """
+        Variante assíncrona de analyze_pronunciation
+        """
+        return await self._run_blocking(
+            self.analyze_pronunciation, text, user_level, bypass_cache=bypass_cache
+        )
+    
+    async def analyze_speech_patterns_async(self, conversation_history: List[Dict]) -> Dict:
+        """
+        Variante assíncrona de analyze_speech_patterns
+        """
+        return await self._run_blocking(self.analyze_speech_patterns, conversation_history)
+    
+    async def analyze_speech_feedback(self, text: str, user_level: str, conversation_history: List[Dict], 
+                                      timeout: Optional[float] = None) -> Tuple[Dict, Dict, List[str]]:
+        """
+        Executa a análise de pronúncia e a de padrões de fala em paralelo
+        A análise que passar do tempo limite é substituída pela análise padrão,
+        sem derrubar a outra
+        Retorna: (pronúncia, padrões_de_fala, análises_que_expiraram)
+        """
+        timeout = timeout if timeout is not None else self.analysis_timeout
+        timed_out = []
+        
+        async def with_timeout(name: str, coro, default):
+            try:
+                return await asyncio.wait_for(coro, timeout)
+            except asyncio.TimeoutError:
+                print(f"Tempo esgotado na análise {name} ({timeout}s), usando análise padrão")
+                timed_out.append(name)
+                return default()
+        
+        pronunciation, speech_patterns = await asyncio.gather(
+            with_timeout(
+                'pronunciation',
+                self.analyze_pronunciation_async(text, user_level),
+                self._default_pronunciation_analysis
+            ),
+            with_timeout(
+                'speech_patterns',
+                self.analyze_speech_patterns_async(conversation_history),
+                self._default_speech_patterns
+            )
+        )
+        
+        return pronunciation, speech_patterns, timed_out
+    
+    def _create_completion(self, method: str, **kwargs):
+        """
+        Chama a API de chat pelo gateway compartilhado (limites, prazo e uso de tokens por método)
+        """
+        return llm_gateway.create_completion(method, **kwargs)
+    
+    def analyze_pronunciation(self, text: str, user_level: str = 'intermediate', 
+                              bypass_cache: bool = False) -> Dict:
         """
         Analisa a pronúncia baseada no texto transcrito e nível do usuário
         """
+        cache_key = llm_cache.make_key(
+            'pronunciation_analysis',
+            self.PROMPT_VERSIONS['pronunciation_analysis'],
+            llm_gateway.model_for('pronunciation_analysis'),
+            0.3,
+            llm_cache.normalize_text(text),
+            user_level
+        )
+        
+        if bypass_cache:
+            llm_cache.record_bypass()
+        else:
+            cached = llm_cache.get(cache_key)
+            if cached is not None:
+                return cached
+        
         try:
-            analysis_prompt = f"""
-            Analyze the pronunciation challenges for this English text based on common pronunciation issues.
-            
-            Text: "{text}"
-            User Level: {user_level}
-            
-            Provide a JSON response with pronunciation analysis:
-            {{
-                "overall_score": 0.0-1.0,
-                "difficult_words": [
-                    {{
-                        "word": "word",
-                        "phonetic": "phonetic transcription",
-                        "difficulty": "easy/medium/hard",
-                        "common_mistakes": ["list of common pronunciation errors"],
-                        "tips": "pronunciation tip"
-                    }}
-                ],
-                "sound_focus_areas": [
-                    {{
-                        "sound": "phonetic sound like /θ/ or /r/",
-                        "description": "description of the sound",
-                        "practice_words": ["word1", "word2", "word3"],
-                        "tip": "how to practice this sound"
-                    }}
-                ],
-                "rhythm_and_stress": {{
-                    "sentence_stress": "analysis of sentence stress patterns",
-                    "word_stress": ["words with stress pattern issues"],
-                    "intonation_tips": "tips for better intonation"
-                }},
-                "encouragement": "positive, encouraging message about pronunciation progress"
-            }}
+            analysis_prompt = PRONUNCIATION_ANALYSIS_PROMPT.render(text=text, user_level=user_level)
             
-            Focus on the most relevant pronunciation challenges for a {user_level} level learner.
-            Be encouraging and constructive in your feedback.
-            """
-            
-            response = self.client.chat.completions.create(
-                model="gpt-4",
+            response = self._create_completion(
+                'pronunciation_analysis',
                 messages=[{"role": "user", "content": analysis_prompt}],
                 temperature=0.3,
-                max_tokens=800
+                max_tokens=800,
+                **json_mode_kwargs()
             )
             
-            analysis_text = response.choices[0].message.content
-            
-            # Extrai JSON da resposta
-            try:
-                json_match = re.search(r'```json\s*(.*?)\s*```', analysis_text, re.DOTALL)
-                if json_match:
-                    analysis_text = json_match.group(1)
-                
-                analysis = json.loads(analysis_text)
-                return analysis
-            except json.JSONDecodeError:
-                print(f"Erro ao parsear análise de pronúncia JSON: {analysis_text}")
+            analysis, repaired = parse_structured_response(
+                'pronunciation_analysis', response, PronunciationAnalysis
+            )
+            if analysis is None:
                 return self._default_pronunciation_analysis()
+            
+            # Respostas truncadas e reparadas não vão para o cache
+            if not repaired:
+                llm_cache.set(cache_key, analysis)
+            return analysis
                 
         except Exception as e:
             print(f"Erro na análise de pronúncia: {e}")
             return self._default_pronunciation_analysis()
     
-    def analyze_speech_patterns(self, conversation_history: List[Dict]) -> Dict:
+    def analyze_speech_patterns(self, conversation_history: List[Dict], bypass_cache: bool = False) -> Dict:
         """
         Analisa padrões de fala ao longo de múltiplas conversas
+        O cache é chaveado pelas últimas mensagens do usuário: uma mensagem nova
+        muda a chave e invalida o resultado anterior
         """
+        # Extrai apenas mensagens do usuário
+        user_messages = [msg for msg in conversation_history if msg.get('sender') == 'user']
+        
+        if not user_messages:
+            return self._default_speech_patterns()
+        
+        # Combina mensagens recentes para análise
+        recent_messages = user_messages[-10:]  # Últimas 10 mensagens
+        combined_text = " ".join([msg.get('content', '') for msg in recent_messages])
+        
+        cache_key = llm_cache.make_key(
+            'speech_patterns',
+            self.PROMPT_VERSIONS['speech_patterns'],
+            llm_gateway.model_for('speech_patterns'),
+            0.4,
+            llm_cache.normalize_text(combined_text)
+        )
+        
+        if bypass_cache:
+            llm_cache.record_bypass()
+        else:
+            cached = llm_cache.get(cache_key)
+            if cached is not None:
+                return cached
+        
         try:
-            # Extrai apenas mensagens do usuário
-            user_messages = [msg for msg in conversation_history if msg.get('sender') == 'user']
-            
-            if not user_messages:
-                return self._default_speech_patterns()
-            
-            # Combina mensagens recentes para análise
-            recent_messages = user_messages[-10:]  # Últimas 10 mensagens
-            combined_text = " ".join([msg.get('content', '') for msg in recent_messages])
+            analysis_prompt = SPEECH_PATTERNS_PROMPT.render(combined_text=combined_text)
             
-            analysis_prompt = f"""
-            Analyze speech patterns and pronunciation development from these recent messages:
-            
-            Messages: "{combined_text}"
-            
-            Provide a JSON analysis of speech patterns:
-            {{
-                "fluency_indicators": {{
-                    "sentence_length_avg": "average sentence length",
-                    "complexity_level": "simple/moderate/complex",
-                    "hesitation_markers": ["um", "uh", "like", "you know"],
-                    "confidence_indicators": ["phrases that show confidence or hesitation"]
-                }},
-                "pronunciation_progress": {{
-                    "improved_sounds": ["sounds that seem to be improving"],
-                    "challenging_sounds": ["sounds that need more work"],
-                    "consistency": "how consistent pronunciation appears to be"
-                }},
-                "vocabulary_usage": {{
-                    "advanced_words": ["more sophisticated vocabulary used"],
-                    "repetitive_patterns": ["words or phrases used frequently"],
-                    "variety_score": 0.0-1.0
-                }},
-                "grammar_patterns": {{
-                    "common_structures": ["grammatical structures frequently used"],
-                    "error_patterns": ["types of errors that appear consistently"],
-                    "improvement_areas": ["grammar areas showing improvement"]
-                }},
-                "recommendations": [
-                    "specific recommendations for pronunciation practice",
-                    "suggestions for vocabulary expansion",
-                    "grammar focus areas"
-                ],
-                "encouragement": "motivational message about progress observed"
-            }}
-            """
-            
-            response = self.client.chat.completions.create(
-                model="gpt-4",
+            response = self._create_completion(
+                'speech_patterns',
                 messages=[{"role": "user", "content": analysis_prompt}],
                 temperature=0.4,
-                max_tokens=700
+                max_tokens=700,
+                **json_mode_kwargs()
             )
             
-            analysis_text = response.choices[0].message.content
-            
-            try:
-                json_match = re.search(r'```json\s*(.*?)\s*```', analysis_text, re.DOTALL)
-                if json_match:
-                    analysis_text = json_match.group(1)
-                
-                return json.loads(analysis_text)
-            except json.JSONDecodeError:
+            patterns, repaired = parse_structured_response('speech_patterns', response, SpeechPatterns)
+            if patterns is None:
                 return self._default_speech_patterns()
+            
+            if not repaired:
+                llm_cache.set(cache_key, patterns)
+            return patterns
                 
         except Exception as e:
             print(f"Erro na análise de padrões de fala: {e}")
             return self._default_speech_patterns()
     
     def generate_pronunciation_exercises(self, difficult_sounds: List[str], 
-                                       user_level: str = 'intermediate') -> Dict:
+                                       user_level: str = 'intermediate', 
+                                       bypass_cache: bool = False) -> Dict:
         """
         Gera exercícios personalizados de pronúncia
         """
+        # A ordem e repetição dos sons não alteram os exercícios gerados
+        normalized_sounds = sorted({llm_cache.normalize_text(sound) for sound in difficult_sounds or []} - {''})
+        cache_key = llm_cache.make_key(
+            'pronunciation_exercises',
+            self.PROMPT_VERSIONS['pronunciation_exercises'],
+            llm_gateway.model_for('pronunciation_exercises'),
+            0.6,
+            json.dumps(normalized_sounds, ensure_ascii=False),
+            user_level
+        )
+        
+        if bypass_cache:
+            llm_cache.record_bypass()
+        else:
+            cached = llm_cache.get(cache_key)
+            if cached is not None:
+                return cached
+        
         try:
-            sounds_text = ", ".join(difficult_sounds) if difficult_sounds else "general pronunciation"
+            sounds_text = ", ".join(normalized_sounds) if normalized_sounds else "general pronunciation"
             
-            exercise_prompt = f"""
-            Create personalized pronunciation exercises for these challenging sounds: {sounds_text}
-            User Level: {user_level}
+            exercise_prompt = PRONUNCIATION_EXERCISES_PROMPT.render(sounds_text=sounds_text, user_level=user_level)
             
-            Generate a JSON response with pronunciation exercises:
-            {{
-                "warm_up_exercises": [
-                    {{
-                        "title": "exercise name",
-                        "description": "what to do",
-                        "examples": ["example1", "example2", "example3"]
-                    }}
-                ],
-                "sound_specific_drills": [
-                    {{
-                        "target_sound": "phonetic sound",
-                        "minimal_pairs": [["word1", "word2"], ["word3", "word4"]],
-                        "practice_sentences": ["sentence with target sound"],
-                        "tongue_twisters": ["fun tongue twister for practice"]
-                    }}
-                ],
-                "rhythm_exercises": [
-                    {{
-                        "type": "stress pattern practice",
-                        "sentences": ["sentences with marked stress"],
-                        "instructions": "how to practice rhythm and stress"
-                    }}
-                ],
-                "daily_practice_plan": {{
-                    "duration": "recommended daily practice time",
-                    "sequence": ["step 1", "step 2", "step 3"],
-                    "progress_tracking": "how to track improvement"
-                }},
-                "motivation": "encouraging message about pronunciation practice"
-            }}
-            
-            Make exercises appropriate for {user_level} level and engaging to practice.
-            """
-            
-            response = self.client.chat.completions.create(
-                model="gpt-4",
+            response = self._create_completion(
+                'pronunciation_exercises',
                 messages=[{"role": "user", "content": exercise_prompt}],
                 temperature=0.6,
-                max_tokens=800
+                max_tokens=800,
+                **json_mode_kwargs()
             )
             
-            exercise_text = response.choices[0].message.content
-            
-            try:
-                json_match = re.search(r'```json\s*(.*?)\s*```', exercise_text, re.DOTALL)
-                if json_match:
-                    exercise_text = json_match.group(1)
-                
-                return json.loads(exercise_text)
-            except json.JSONDecodeError:
+            exercises, repaired = parse_structured_response(
+                'pronunciation_exercises', response, PronunciationExercises
+            )
+            if exercises is None:
                 return self._default_pronunciation_exercises()
+            
+            if not repaired:
+                llm_cache.set(cache_key, exercises)
+            return exercises
                 
         except Exception as e:
             print(f"Erro ao gerar exercícios de pronúncia: {e}")
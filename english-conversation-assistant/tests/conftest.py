@@ -0,0 +1,38 @@
+"""
+Fixtures compartilhadas dos testes
+
+Uso (na pasta english-conversation-assistant):
+    python -m pytest -q tests
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('OPENAI_API_KEY', 'test')
+# Cache de respostas só em memória: os testes não gravam em src/database
+os.environ.setdefault('LLM_CACHE_DB', '')
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """
+    Aplicação com um banco SQLite temporário já migrado, dentro do contexto da aplicação
+    """
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'app.db'}")
+
+    from src.main import create_app
+
+    app = create_app(start_background=False, init_schema=True)
+    with app.app_context():
+        yield app
+
+@pytest.fixture
+def user(app):
+    from src.models.user import db, User
+
+    user = User(username='learner', email='learner@example.com')
+    db.session.add(user)
+    db.session.commit()
+    return user
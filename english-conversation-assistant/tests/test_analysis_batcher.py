@@ -0,0 +1,118 @@
+import json
+import time
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from src.services.ai_service import AIConversationService
+from src.services.analysis_batcher import BatchQueueFull, MicroBatcher
+
+def test_each_caller_gets_the_result_of_its_own_item():
+    batches = []
+    batcher = MicroBatcher('test_fan_out', lambda items: batches.append(items) or [item * 10 for item in items],
+                           window_ms=50, max_items=8)
+
+    futures = [batcher.submit(i) for i in range(5)]
+
+    assert [future.result(timeout=5) for future in futures] == [0, 10, 20, 30, 40]
+    assert batches == [[0, 1, 2, 3, 4]]
+
+def test_batch_closes_when_it_reaches_max_items():
+    batches = []
+    batcher = MicroBatcher('test_max_items', lambda items: batches.append(list(items)) or items,
+                           window_ms=10000, max_items=3)
+
+    futures = [batcher.submit(i) for i in range(3)]
+
+    assert [future.result(timeout=5) for future in futures] == [0, 1, 2]
+    assert batches == [[0, 1, 2]]
+
+def test_item_errors_only_reach_their_caller():
+    def dispatch(items):
+        return [ValueError(f'bad item {item}') if item == 'bad' else item.upper() for item in items]
+
+    batcher = MicroBatcher('test_item_errors', dispatch, window_ms=50)
+    good, bad = batcher.submit('good'), batcher.submit('bad')
+
+    assert good.result(timeout=5) == 'GOOD'
+    with pytest.raises(ValueError, match='bad item bad'):
+        bad.result(timeout=5)
+
+def upstream_down(items):
+    raise RuntimeError('upstream down')
+
+def missing_results(items):
+    return items[:-1]
+
+@pytest.mark.parametrize('dispatch', [upstream_down, missing_results])
+def test_failed_batch_fails_every_caller(dispatch):
+    batcher = MicroBatcher('test_failed_batch', dispatch, window_ms=50)
+    futures = [batcher.submit(i) for i in range(3)]
+
+    for future in futures:
+        with pytest.raises(Exception):
+            future.result(timeout=5)
+
+def test_full_queue_rejects_new_items():
+    release = threading.Event()
+
+    def slow(items):
+        release.wait(5)
+        return items
+
+    batcher = MicroBatcher('test_full_queue', slow, window_ms=0, max_items=1, max_pending=1, max_inflight=1)
+    running = batcher.submit('running')
+    # O lote em execução ocupa a única vaga; o próximo item espera e enche a fila
+    while batcher.pending():
+        time.sleep(0.001)
+    waiting = batcher.submit('waiting')
+
+    with pytest.raises(BatchQueueFull):
+        batcher.submit('rejected')
+
+    release.set()
+    assert running.result(timeout=5) == 'running'
+    assert waiting.result(timeout=5) == 'waiting'
+
+def completion(payload):
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=json.dumps(payload)))],
+        usage=SimpleNamespace(completion_tokens=10)
+    )
+
+def test_items_missing_from_the_batch_response_are_analyzed_individually():
+    service = AIConversationService(analysis_batching=False)
+    calls = []
+
+    def create_completion(method, **kwargs):
+        calls.append(method)
+        if method == 'message_analysis_batch':
+            # O modelo devolveu só os itens 0 e 2
+            return completion({'analyses': [
+                {'id': 2, 'topics_mentioned': ['second']},
+                {'id': 0, 'topics_mentioned': ['zero']}
+            ]})
+        return completion({'topics_mentioned': ['individual']})
+
+    service._create_completion = create_completion
+    items = [(f'message {i}', 'beginner', f'test-batch-key-{i}') for i in range(3)]
+
+    results = service._analyze_batch(items)
+
+    assert [result['topics_mentioned'] for result in results] == [['zero'], ['individual'], ['second']]
+    assert calls == ['message_analysis_batch', 'message_analysis']
+
+def test_individual_failure_is_returned_for_that_item_only():
+    service = AIConversationService(analysis_batching=False)
+
+    def create_completion(method, **kwargs):
+        if method == 'message_analysis_batch':
+            return completion({'analyses': [{'id': 0, 'topics_mentioned': ['zero']}]})
+        raise RuntimeError('upstream down')
+
+    service._create_completion = create_completion
+    results = service._analyze_batch([('a', 'beginner', 'test-fail-key-0'), ('b', 'beginner', 'test-fail-key-1')])
+
+    assert results[0]['topics_mentioned'] == ['zero']
+    assert isinstance(results[1], RuntimeError)
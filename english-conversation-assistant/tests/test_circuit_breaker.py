@@ -0,0 +1,62 @@
+import time
+
+from src.services.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+def open_breaker(reset_timeout=0.05):
+    breaker = CircuitBreaker('test', failure_threshold=3, reset_timeout=reset_timeout)
+    for _ in range(3):
+        assert breaker.allow()
+        breaker.record_failure()
+    return breaker
+
+def test_failures_below_the_threshold_keep_the_circuit_closed():
+    breaker = CircuitBreaker('test', failure_threshold=3)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+
+    assert breaker.state == CLOSED
+    assert breaker.allow()
+    assert breaker.snapshot()['consecutive_failures'] == 2
+
+def test_consecutive_failures_open_the_circuit_and_calls_are_rejected():
+    breaker = open_breaker(reset_timeout=30)
+
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+    assert not breaker.allow()
+    snapshot = breaker.snapshot()
+    assert (snapshot['failures'], snapshot['rejected'], snapshot['opened']) == (3, 2, 1)
+    assert 0 < snapshot['retry_in_s'] <= 30
+
+def test_half_open_allows_a_single_trial_call():
+    breaker = open_breaker()
+    time.sleep(0.1)
+
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()
+    assert breaker.snapshot()['rejected'] == 1
+
+def test_successful_trial_closes_the_circuit():
+    breaker = open_breaker()
+    time.sleep(0.1)
+    assert breaker.allow()
+    breaker.record_success()
+
+    assert breaker.state == CLOSED
+    assert breaker.allow() and breaker.allow()
+    snapshot = breaker.snapshot()
+    assert (snapshot['consecutive_failures'], snapshot['successes'], snapshot['retry_in_s']) == (0, 1, 0.0)
+
+def test_failed_trial_opens_the_circuit_again():
+    breaker = open_breaker()
+    time.sleep(0.1)
+    assert breaker.allow()
+    breaker.record_failure()
+
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+    assert breaker.snapshot()['opened'] == 2
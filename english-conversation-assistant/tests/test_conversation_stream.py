@@ -0,0 +1,69 @@
+import json
+from concurrent.futures import Future
+
+import pytest
+
+import src.routes.conversation as conversation_routes
+from src.models.user import db, Conversation, Message
+from src.services.job_queue import job_queue
+
+ANALYSIS = {'grammar_errors': [], 'vocabulary_used': [{'word': 'park', 'usage': 'correct', 'level': 'basic'}],
+            'topics_mentioned': [], 'confidence_score': 0.9}
+
+class StubService:
+    """
+    Serviço de IA falso: resposta em dois trechos e análise já resolvida ou que nunca termina
+    """
+
+    def __init__(self, analysis_done: bool):
+        self.analysis = Future()
+        if analysis_done:
+            self.analysis.set_result(ANALYSIS)
+
+    def start_message_analysis(self, user_message, user_profile):
+        return self.analysis
+
+    def stream_response(self, user_message, conversation_history, user_profile, conversation_summary=None):
+        yield 'Hello '
+        yield 'there!'
+
+def events(response):
+    parsed = []
+    for block in response.get_data(as_text=True).strip().split('\n\n'):
+        event, data = block.split('\n', 1)
+        parsed.append((event[len('event: '):], json.loads(data[len('data: '):])))
+    return parsed
+
+@pytest.fixture
+def conversation(user):
+    conversation = Conversation(user_id=user.id, title='Test')
+    db.session.add(conversation)
+    db.session.commit()
+    return conversation
+
+def stream(app, conversation, monkeypatch, analysis_done):
+    monkeypatch.setattr(conversation_routes, 'get_ai_service', lambda: StubService(analysis_done))
+    monkeypatch.setattr(conversation_routes, 'STREAM_ANALYSIS_TIMEOUT', 0.05)
+    with app.test_client() as client:
+        response = client.post(f'/api/conversations/{conversation.id}/messages/stream',
+                               json={'content': 'I went to the park'})
+        return events(response)
+
+def test_stream_sends_the_analysis_before_done(app, conversation, monkeypatch):
+    sent = stream(app, conversation, monkeypatch, analysis_done=True)
+
+    assert [event for event, _ in sent] == ['user_message', 'token', 'token', 'message', 'analysis', 'done']
+    assert sent[3][1]['content'] == 'Hello there!'
+    assert sent[4][1] == ANALYSIS
+
+def test_stuck_analysis_finishes_the_stream_and_goes_to_the_queue(app, conversation, monkeypatch):
+    sent = stream(app, conversation, monkeypatch, analysis_done=False)
+
+    assert [event for event, _ in sent] == ['user_message', 'token', 'token', 'message', 'done']
+    assert sent[-1][1] == {'analysis_status': 'pending'}
+
+    # A resposta foi salva e a análise ficou para a tarefa em segundo plano
+    user_message_id = sent[0][1]['id']
+    assert db.session.get(Message, sent[3][1]['id']).content == 'Hello there!'
+    job = job_queue.get_status(conversation_routes.MESSAGE_ANALYSIS_JOB, user_message_id)
+    assert job['payload'] == {'message_id': user_message_id, 'user_id': conversation.user_id}
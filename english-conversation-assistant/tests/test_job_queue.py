@@ -0,0 +1,153 @@
+import time
+import threading
+
+import pytest
+
+from src.models.user import BackgroundJob
+from src.services.job_queue import BackgroundJobQueue
+
+def wait_for_status(queue, job_type, job_key, statuses=('done', 'failed'), timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = queue.get_status(job_type, job_key)
+        if job and job['status'] in statuses:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f'job {job_type}:{job_key} did not finish')
+
+@pytest.fixture
+def make_queue(app):
+    queues = []
+
+    def make(**kwargs):
+        queue = BackgroundJobQueue(num_workers=1, retry_delay=0.01, **kwargs)
+        queue.init_app(app)
+        queues.append(queue)
+        return queue
+
+    yield make
+    for queue in queues:
+        queue.shutdown(timeout=5)
+
+def test_failed_job_is_retried_until_it_succeeds(make_queue):
+    queue = make_queue(max_attempts=3, persistent=False)
+    calls = []
+
+    def flaky(payload):
+        calls.append(payload)
+        if len(calls) < 3:
+            raise RuntimeError('upstream unavailable')
+        return {'ok': True}
+
+    queue.register_handler('flaky', flaky)
+    queue.enqueue('flaky', 1, {'n': 1})
+
+    job = wait_for_status(queue, 'flaky', 1)
+    assert job['status'] == 'done'
+    assert job['attempts'] == 3
+    assert job['result'] == {'ok': True}
+    assert job['error'] is None
+    assert len(calls) == 3
+
+def test_job_fails_after_max_attempts(make_queue):
+    queue = make_queue(max_attempts=2, persistent=False)
+
+    def broken(payload):
+        raise RuntimeError('always fails')
+
+    queue.register_handler('broken', broken)
+    queue.enqueue('broken', 'a')
+
+    job = wait_for_status(queue, 'broken', 'a')
+    assert job['status'] == 'failed'
+    assert job['attempts'] == 2
+    assert job['error'] == 'always fails'
+
+def test_same_key_is_not_enqueued_twice(make_queue):
+    queue = make_queue(persistent=False)
+    calls = []
+    queue.register_handler('once', lambda payload: calls.append(payload) or len(calls))
+
+    first = queue.enqueue('once', 7, {'n': 1})
+    second = queue.enqueue('once', 7, {'n': 2})
+    wait_for_status(queue, 'once', 7)
+    third = queue.enqueue('once', 7, {'n': 3})
+
+    assert first['status'] == 'pending'
+    assert second['status'] in ('pending', 'running')
+    assert third['status'] == 'done'
+    assert calls == [{'n': 1}]
+
+def test_rerun_if_done_runs_a_finished_job_again(make_queue):
+    queue = make_queue(persistent=False)
+    calls = []
+    queue.register_handler('refresh', lambda payload: calls.append(payload) or len(calls))
+
+    queue.enqueue('refresh', 1, rerun_if_done=True)
+    wait_for_status(queue, 'refresh', 1)
+    assert queue.enqueue('refresh', 1, rerun_if_done=True)['status'] == 'pending'
+
+    assert wait_for_status(queue, 'refresh', 1)['result'] == 2
+    assert len(calls) == 2
+
+def test_persistent_job_state_survives_a_new_queue(app, make_queue):
+    queue = make_queue(persistent=True)
+    queue.register_handler('stored', lambda payload: {'echo': payload['value']})
+    queue.enqueue('stored', 42, {'value': 'hello'})
+    wait_for_status(queue, 'stored', 42)
+
+    record = BackgroundJob.query.filter_by(job_type='stored', job_key='42').one()
+    assert record.status == 'done'
+
+    # Outro processo (fila nova, sem estado em memória) enxerga a tarefa concluída e não a repete
+    other = make_queue(persistent=True)
+    other.register_handler('stored', lambda payload: pytest.fail('job ran twice'))
+    assert other.get_status('stored', 42)['result'] == {'echo': 'hello'}
+    assert other.enqueue('stored', 42, {'value': 'hello'})['status'] == 'done'
+
+def test_request_while_running_runs_the_job_again_after_it_finishes(make_queue):
+    queue = make_queue(persistent=False)
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def refresh(payload):
+        calls.append(payload)
+        started.set()
+        release.wait(5)
+        return len(calls)
+
+    queue.register_handler('refresh', refresh)
+    queue.enqueue('refresh', 1, {'n': 1}, rerun_if_done=True)
+    assert started.wait(5)
+
+    # Dados novos chegaram depois que o handler leu as entradas: os pedidos se juntam em uma nova execução
+    assert queue.enqueue('refresh', 1, {'n': 2}, rerun_if_done=True)['status'] == 'running'
+    queue.enqueue('refresh', 1, {'n': 3}, rerun_if_done=True)
+    release.set()
+
+    deadline = time.monotonic() + 5
+    while len(calls) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    job = wait_for_status(queue, 'refresh', 1)
+    assert calls == [{'n': 1}, {'n': 3}]
+    assert (job['result'], job['attempts']) == (2, 1)
+
+def test_running_job_without_rerun_if_done_is_not_repeated(make_queue):
+    queue = make_queue(persistent=False)
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def analyze(payload):
+        calls.append(payload)
+        started.set()
+        release.wait(5)
+
+    queue.register_handler('analyze', analyze)
+    queue.enqueue('analyze', 1)
+    assert started.wait(5)
+    queue.enqueue('analyze', 1)
+    release.set()
+
+    wait_for_status(queue, 'analyze', 1)
+    time.sleep(0.05)
+    assert len(calls) == 1
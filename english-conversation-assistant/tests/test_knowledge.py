@@ -0,0 +1,120 @@
+import pytest
+
+from src.models.user import db, KnowledgeItem, KnowledgeStats
+from src.models.migrations import MIGRATIONS, apply_migrations, migration_status
+from src.routes.conversation import update_knowledge_items
+
+def analysis(*words, topics=()):
+    return {
+        'vocabulary_used': [{'word': word, 'usage': usage, 'level': 'basic'} for word, usage in words],
+        'topics_mentioned': list(topics)
+    }
+
+def items_by_content(user_id):
+    return {
+        item.content: item
+        for item in KnowledgeItem.query.filter_by(user_id=user_id).order_by(KnowledgeItem.id)
+    }
+
+def test_new_items_start_from_the_initial_mastery(user):
+    update_knowledge_items(user.id, analysis(('Travel', 'correct'), ('went', 'incorrect'), topics=['Holidays']))
+    db.session.commit()
+
+    items = items_by_content(user.id)
+    assert set(items) == {'travel', 'went', 'holidays'}
+    assert (items['travel'].mastery_level, items['travel'].times_used_correctly) == (0.8, 1)
+    assert (items['went'].mastery_level, items['went'].times_used_correctly) == (0.3, 0)
+    assert (items['holidays'].item_type, items['holidays'].mastery_level) == ('topic', 0.5)
+
+def test_existing_items_are_incremented_in_sql(user):
+    update_knowledge_items(user.id, analysis(('went', 'incorrect'), topics=['holidays']))
+    db.session.commit()
+    update_knowledge_items(user.id, analysis(('went', 'correct'), ('went', 'correct'), topics=['holidays']))
+    db.session.commit()
+
+    items = items_by_content(user.id)
+    went = items['went']
+    assert (went.times_encountered, went.times_used_correctly) == (3, 2)
+    assert went.mastery_level == pytest.approx(min(2 / 3 * 1.2, 1.0))
+    assert items['holidays'].times_encountered == 2
+    assert items['holidays'].mastery_level == pytest.approx(0.6)
+
+def test_upsert_adds_to_counters_written_by_another_analysis(user):
+    update_knowledge_items(user.id, analysis(('went', 'correct')))
+    db.session.commit()
+
+    # Outra análise (outro worker) grava depois que esta já começou: nada se perde
+    db.session.execute(
+        db.update(KnowledgeItem).where(KnowledgeItem.content == 'went').values(
+            times_encountered=KnowledgeItem.times_encountered + 5,
+            times_used_correctly=KnowledgeItem.times_used_correctly + 5
+        )
+    )
+    update_knowledge_items(user.id, analysis(('went', 'incorrect')))
+    db.session.commit()
+
+    went = items_by_content(user.id)['went']
+    assert (went.times_encountered, went.times_used_correctly) == (7, 6)
+
+def test_knowledge_stats_match_the_items(user):
+    update_knowledge_items(user.id, analysis(('travel', 'correct'), ('went', 'incorrect'), topics=['holidays']))
+    update_knowledge_items(user.id, analysis(('went', 'correct'), ('go', 'correct')))
+    db.session.commit()
+
+    items = KnowledgeItem.query.filter_by(user_id=user.id).all()
+    summary = KnowledgeStats.summarize(user.id)
+    assert summary['total_items'] == len(items) == 4
+    assert summary['by_type'] == {'word': 3, 'topic': 1}
+    assert summary['average_mastery'] == pytest.approx(sum(item.mastery_level for item in items) / len(items))
+    assert summary['well_mastered'] == sum(item.mastery_level >= KnowledgeStats.WELL_MASTERED for item in items)
+
+def test_knowledge_stats_are_recomputed_not_accumulated(user):
+    update_knowledge_items(user.id, analysis(('went', 'incorrect')))
+    db.session.commit()
+
+    # Linha de agregados divergente (ex: deltas de duas análises simultâneas somados em dobro)
+    db.session.execute(db.update(KnowledgeStats).values(item_count=10, mastery_sum=9.0, well_mastered=3))
+    update_knowledge_items(user.id, analysis(('went', 'correct')))
+    db.session.commit()
+
+    stats = db.session.get(KnowledgeStats, (user.id, 'word'))
+    went = items_by_content(user.id)['went']
+    assert (stats.item_count, stats.well_mastered) == (1, 0)
+    assert stats.mastery_sum == pytest.approx(went.mastery_level)
+
+def test_migrations_upgrade_an_existing_database(app, user):
+    # Banco criado antes do índice único: itens duplicados e nenhuma migração registrada
+    db.session.execute(db.text('DROP INDEX uq_knowledge_item_user_type_content'))
+    db.session.execute(db.text('DELETE FROM schema_migrations'))
+    db.session.execute(db.text('DROP TABLE knowledge_stats'))
+    db.session.add_all([
+        KnowledgeItem(user_id=user.id, item_type='word', content='went', mastery_level=0.3,
+                      times_encountered=2, times_used_correctly=0),
+        KnowledgeItem(user_id=user.id, item_type='word', content='went', mastery_level=0.9,
+                      times_encountered=3, times_used_correctly=3),
+        KnowledgeItem(user_id=user.id, item_type='topic', content='travel', mastery_level=0.5,
+                      times_encountered=1, times_used_correctly=0)
+    ])
+    db.session.commit()
+    first_id = KnowledgeItem.query.filter_by(content='went').order_by(KnowledgeItem.id).first().id
+
+    applied = apply_migrations()
+
+    assert [migration['version'] for migration in applied] == [version for version, _, _ in MIGRATIONS]
+    assert all(status['applied'] for status in migration_status())
+    assert apply_migrations() == []
+
+    # Duplicatas unidas na linha mais antiga, com os contadores somados
+    went = KnowledgeItem.query.filter_by(user_id=user.id, content='went').one()
+    assert went.id == first_id
+    assert (went.times_encountered, went.times_used_correctly, went.mastery_level) == (5, 3, 0.9)
+
+    # Agregados criados a partir dos itens existentes
+    summary = KnowledgeStats.summarize(user.id)
+    assert summary['by_type'] == {'word': 1, 'topic': 1}
+    assert summary['well_mastered'] == 1
+
+    # O upsert em lote funciona sobre o índice recriado
+    update_knowledge_items(user.id, analysis(('went', 'correct')))
+    db.session.commit()
+    assert KnowledgeItem.query.filter_by(user_id=user.id, content='went').one().times_encountered == 6
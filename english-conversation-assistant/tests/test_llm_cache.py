@@ -0,0 +1,84 @@
+import time
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+from src.services.llm_cache import LLMResponseCache
+
+def make_cache(tmp_path, **kwargs):
+    return LLMResponseCache(db_path=str(tmp_path / 'llm_cache.db'), enabled=True, **kwargs)
+
+def test_key_depends_on_normalized_input_and_call_parameters(tmp_path):
+    cache = make_cache(tmp_path)
+    text = cache.normalize_text('  I  goed\tto the   park ')
+    key = cache.make_key('analysis', 1, 'gpt-4o-mini', 0.3, text, 'beginner')
+
+    assert text == 'I goed to the park'
+    assert key == cache.make_key('analysis', 1, 'gpt-4o-mini', 0.3, cache.normalize_text('I goed to the park'), 'beginner')
+    assert key != cache.make_key('analysis', 2, 'gpt-4o-mini', 0.3, text, 'beginner')
+    assert key != cache.make_key('analysis', 1, 'gpt-4o', 0.3, text, 'beginner')
+    assert key != cache.make_key('analysis', 1, 'gpt-4o-mini', 0.3, text, 'advanced')
+    assert key != cache.make_key('analysis', 1, 'gpt-4o-mini', 0.3, 'i goed to the park', 'beginner')
+
+def test_disk_level_survives_a_new_instance(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.set('k', {'grammar_errors': []})
+    assert cache.get('k') == {'grammar_errors': []}
+    assert cache.stats()['memory_hits'] == 1
+
+    restarted = make_cache(tmp_path)
+    assert restarted.get('k') == {'grammar_errors': []}
+    assert restarted.get('k') == {'grammar_errors': []}
+    stats = restarted.stats()
+    assert (stats['disk_hits'], stats['memory_hits'], stats['misses']) == (1, 1, 0)
+
+def test_expired_entries_are_misses(tmp_path):
+    cache = make_cache(tmp_path, ttl_seconds=0.05)
+    cache.set('k', {'value': 1})
+    time.sleep(0.1)
+
+    assert cache.get('k') is None
+    assert cache.stats()['misses'] == 1
+    assert make_cache(tmp_path, ttl_seconds=0.05).get('k') is None
+
+def test_memory_level_evicts_least_recently_used(tmp_path):
+    cache = LLMResponseCache(max_memory_items=2, db_path='', enabled=True)
+    cache.set('a', {'v': 'a'})
+    cache.set('b', {'v': 'b'})
+    cache.get('a')
+    cache.set('c', {'v': 'c'})
+
+    assert cache.get('b') is None
+    assert cache.get('a') == {'v': 'a'}
+    assert cache.stats()['memory_evictions'] == 1
+
+def test_disabled_cache_stores_nothing(tmp_path):
+    cache = LLMResponseCache(db_path=str(tmp_path / 'llm_cache.db'), enabled=False)
+    cache.set('k', {'value': 1})
+    assert cache.get('k') is None
+
+def last_access(tmp_path, key):
+    with sqlite3.connect(str(tmp_path / 'llm_cache.db')) as conn:
+        return conn.execute('SELECT last_access FROM llm_cache WHERE key = ?', (key,)).fetchone()[0]
+
+def test_disk_hits_only_rewrite_an_old_last_access(tmp_path):
+    make_cache(tmp_path).set('k', {'value': 1})
+    written = last_access(tmp_path, 'k')
+
+    assert make_cache(tmp_path).get('k') == {'value': 1}
+    assert last_access(tmp_path, 'k') == written
+
+    with sqlite3.connect(str(tmp_path / 'llm_cache.db')) as conn:
+        conn.execute('UPDATE llm_cache SET last_access = ?', (written - 2 * LLMResponseCache.LAST_ACCESS_RESOLUTION,))
+    assert make_cache(tmp_path).get('k') == {'value': 1}
+    assert last_access(tmp_path, 'k') >= written
+
+def test_disk_level_is_shared_between_threads(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.set('k', {'value': 1})
+    cache._memory.clear()
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        results = list(pool.map(lambda _: cache.get('k'), range(4)))
+
+    assert results == [{'value': 1}] * 4
+    assert cache.stats()['disk_hits'] >= 1
@@ -0,0 +1,61 @@
+import time
+import threading
+from types import SimpleNamespace
+
+from src.services.circuit_breaker import CircuitBreaker
+from src.services.llm_gateway import LLMGateway
+from src.services.model_routing import ModelRouter
+
+class SlowClient:
+    """
+    Cliente falso: cada chamada espera o próximo atraso da lista e registra a concorrência máxima
+    """
+
+    def __init__(self, delays):
+        self.delays = list(delays)
+        self.lock = threading.Lock()
+        self.running = 0
+        self.max_running = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, timeout=None, **kwargs):
+        with self.lock:
+            delay = self.delays.pop(0)
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(delay)
+        with self.lock:
+            self.running -= 1
+        return SimpleNamespace(delay=delay, usage=None)
+
+def make_gateway(client, max_concurrency):
+    gateway = LLMGateway(max_concurrency=max_concurrency, method_limits={}, request_timeout=5,
+                         max_retries=0, router=ModelRouter(default_route=['test-model']), record_path='')
+    gateway.hedge_methods = {'test_hedge'}
+    gateway.hedge_delay = 0.05
+    gateway._endpoints = [{'url': None, 'client': client, 'breaker': CircuitBreaker('test')}]
+    return gateway
+
+def test_losing_hedged_request_keeps_its_slot_until_it_finishes():
+    client = SlowClient([0.5, 0.0])
+    gateway = make_gateway(client, max_concurrency=2)
+
+    response = gateway.create_completion('test_hedge', messages=[])
+
+    assert response.delay == 0.0
+    assert gateway.snapshot()['in_flight'] == 1
+    assert not gateway.drain(timeout=0.01)
+    assert gateway.drain(timeout=5)
+    stats = gateway.snapshot()['by_method']['test_hedge']
+    assert (stats['hedges'], stats['hedge_wins'], stats['in_flight']) == (1, 1, 0)
+
+def test_hedge_is_skipped_when_the_concurrency_limit_is_full():
+    client = SlowClient([0.2])
+    gateway = make_gateway(client, max_concurrency=1)
+
+    response = gateway.create_completion('test_hedge', messages=[])
+
+    assert response.delay == 0.2
+    assert client.max_running == 1
+    stats = gateway.snapshot()['by_method']['test_hedge']
+    assert (stats['hedges'], stats['hedges_skipped'], stats['in_flight']) == (0, 1, 0)
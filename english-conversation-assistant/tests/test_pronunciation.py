@@ -0,0 +1,78 @@
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from src.models.user import db, Conversation, Message, PronunciationScore, PronunciationStats
+
+START = datetime(2026, 1, 1, 9, 0)
+
+@pytest.fixture
+def add_scores(user):
+    conversation = Conversation(user_id=user.id, title='Speaking')
+    db.session.add(conversation)
+    db.session.commit()
+
+    def add(*scores):
+        """
+        Grava uma nota por dia, depois das já gravadas, e recalcula os agregados
+        """
+        offset = PronunciationScore.query.filter_by(user_id=user.id).count()
+        for i, score in enumerate(scores, start=offset):
+            message = Message(conversation_id=conversation.id, sender='user', content=f'message {i}',
+                              timestamp=START + timedelta(days=i))
+            db.session.add(message)
+            db.session.flush()
+            db.session.add(PronunciationScore(user_id=user.id, message_id=message.id,
+                                              recorded_at=message.timestamp, overall_score=score))
+        db.session.flush()
+        db.session.execute(PronunciationStats.refresh_statement(user.id))
+        db.session.commit()
+        db.session.expire_all()
+        return db.session.get(PronunciationStats, user.id)
+
+    return add
+
+def window_scores(column):
+    return [score for _, score in json.loads(column)]
+
+def test_windows_hold_the_first_and_last_scores_in_chronological_order(add_scores):
+    scores = [0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8]
+    stats = add_scores(*scores)
+
+    assert stats.total_sessions == len(scores)
+    assert stats.score_sum == pytest.approx(sum(scores))
+    assert window_scores(stats.early_scores) == scores[:PronunciationStats.WINDOW]
+    assert window_scores(stats.recent_scores) == scores[-PronunciationStats.WINDOW:]
+    assert stats.summary()['trend'] == 'improving'
+
+def test_fewer_scores_than_the_window(add_scores):
+    stats = add_scores(0.9)
+    assert window_scores(stats.early_scores) == window_scores(stats.recent_scores) == [0.9]
+    assert stats.summary() == {'total_sessions': 1, 'trend': 'starting', 'average_score': 0.9}
+
+    stats = add_scores(0.5, 0.4)
+    assert window_scores(stats.early_scores) == window_scores(stats.recent_scores) == [0.9, 0.5, 0.4]
+    assert stats.summary()['trend'] == 'stable'
+
+def test_refresh_recomputes_an_existing_row(add_scores):
+    add_scores(0.5, 0.6)
+    db.session.execute(db.update(PronunciationStats).values(total_sessions=99, score_sum=0.0))
+    db.session.commit()
+
+    stats = add_scores(0.7)
+
+    assert (stats.total_sessions, stats.score_sum) == (3, pytest.approx(1.8))
+
+def test_progress_pages_go_back_in_time_and_each_page_is_chronological(app, add_scores, user):
+    add_scores(0.1, 0.2, 0.3, 0.4, 0.5)
+
+    with app.test_client() as client:
+        first = client.get(f'/api/users/{user.id}/pronunciation-progress?per_page=3').get_json()
+        second = client.get(f'/api/users/{user.id}/pronunciation-progress?per_page=3&page=2').get_json()
+
+    assert [item['overall_score'] for item in first['progress_data']] == [0.3, 0.4, 0.5]
+    assert first['pagination']['has_more']
+    assert [item['overall_score'] for item in second['progress_data']] == [0.1, 0.2]
+    assert not second['pagination']['has_more']
+    assert first['summary']['total_sessions'] == 5
@@ -0,0 +1,81 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from src.services.response_parser import IncrementalJSONParser, parse_json_text, parse_structured_response
+from src.services.response_schemas import MessageAnalysis
+
+DOCUMENT = {
+    'grammar_errors': [{'error': 'goed', 'correction': 'went', 'explanation': 'irregular verb'}],
+    'vocabulary_used': [{'word': 'park', 'level': 'basic', 'usage': 'correct'}],
+    'confidence_score': 0.75,
+    'note': 'quotes " and braces { ] inside strings'
+}
+
+def parse(text):
+    parser = IncrementalJSONParser()
+    parser.feed(text)
+    return parser.result(), parser.repaired
+
+def test_complete_document_fed_in_chunks():
+    text = json.dumps(DOCUMENT)
+    parser = IncrementalJSONParser()
+    for i in range(0, len(text), 7):
+        parser.feed(text[i:i + 7])
+
+    assert parser.done
+    assert not parser.repaired
+    assert parser.result() == DOCUMENT
+
+def test_text_around_the_document_is_ignored():
+    text = 'Here is the analysis:\n```json\n' + json.dumps(DOCUMENT) + '\n```\nHope it helps {'
+    assert parse(text) == (DOCUMENT, False)
+
+def test_truncated_document_is_closed_at_the_last_complete_value():
+    text = '{"grammar_errors": [], "confidence_score": 0.8, "vocabulary_used": [{"word": "park", "lev'
+
+    value, repaired = parse(text)
+
+    assert repaired
+    assert value == {'grammar_errors': [], 'confidence_score': 0.8, 'vocabulary_used': [{'word': 'park'}]}
+
+@pytest.mark.parametrize('text, expected', [
+    ('{"a": "unterminated str', {}),
+    ('{"a": 1, "b": 12', {'a': 1}),
+    ('{"a": [1, 2, {"b": ', {'a': [1, 2]}),
+    ('{"a": "escaped \\" quote", "b', {'a': 'escaped " quote'}),
+    ('{"a": "\\u00e9", "b": tr', {'a': 'é'}),
+    ('[1, 2, 3', [1, 2]),
+    ('{"a": {"b": ', {}),
+])
+def test_incomplete_trailing_values_are_dropped(text, expected):
+    assert parse(text) == (expected, True)
+
+def test_no_json_value_raises():
+    with pytest.raises(ValueError):
+        parse('I cannot analyze this message.')
+    with pytest.raises(ValueError):
+        parse_json_text('')
+
+def test_parse_json_text_uses_the_repair_parser_only_when_needed():
+    assert parse_json_text('ok: {"a": [1, 2]} done') == ({'a': [1, 2]}, False)
+    assert parse_json_text('{"a": [1, 2, 3') == ({'a': [1, 2]}, True)
+
+def completion(text):
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=text))],
+        usage=SimpleNamespace(completion_tokens=10)
+    )
+
+def test_structured_response_is_repaired_and_validated():
+    text = json.dumps(DOCUMENT)[:-1]
+    data, repaired = parse_structured_response('test_analysis', completion(text), MessageAnalysis)
+
+    assert repaired
+    assert data['vocabulary_used'][0]['word'] == 'park'
+    assert data['confidence_score'] == 0.75
+
+def test_structured_response_rejects_invalid_output():
+    assert parse_structured_response('test_analysis', completion('no json here'), MessageAnalysis) == (None, False)
+    assert parse_structured_response('test_analysis', completion('[1, 2]'), MessageAnalysis) == (None, False)